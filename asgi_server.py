@@ -0,0 +1,274 @@
+"""
+Асинхронний (ASGI) режим сервера для великої кількості SSE-з'єднань
+Запуск: python asgi_server.py (або uvicorn asgi_server:app)
+
+Ті самі маршрути, що й у sensor_api_server.py, але SSE-клієнти та запис
+у Firebase виконується фоновою чергою. Решта маршрутів обслуговується
+Flask-застосунком через WSGI-адаптер.
+"""
+
+import contextlib
+import logging
+import os
+import time
+
+try:
+    from a2wsgi import WSGIMiddleware
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import JSONResponse, Response, StreamingResponse
+    from starlette.routing import Match, Route, WebSocketRoute
+except ImportError as e:
+    # Режим необов'язковий: основний сервер (sensor_api_server.py) ці пакети не потребує
+    raise ImportError(f"ASGI mode needs extra packages ({e.name}): pip install -e .[asgi]") from e
+
+import sensor_api_server as server
+from device_registry import DeviceValidationError
+from sensor_codec import negotiate as negotiate_encoding
+
+logger = logging.getLogger(__name__)
+
+def negotiated_response(request, payload, status_code=200):
+    """Як api_response у Flask: формат з Accept, стиснення з Accept-Encoding"""
+    media_type = server.negotiate_media_type(request.headers.get('accept'))
+    body, content_encoding = server.compress_body(
+        server.serialize(payload, media_type, server.json_body), request.headers.get('accept-encoding')
+    )
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    if content_encoding is not None:
+        headers['Content-Encoding'] = content_encoding
+    return Response(body, status_code=status_code, headers=headers, media_type=media_type)
+
+
+def sensor_encoding(request):
+    return negotiate_encoding(request.query_params.get('encoding'), request.headers.get('accept'))
+
+
+async def get_sensor_data(request):
+    """Endpoint для отримання поточних даних сенсорів (?encoding=json|bitmap)"""
+    try:
+        encoding = sensor_encoding(request)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    # Генерація - синхронна робота numpy під блокуванням стану: не на циклі подій
+    data = await run_in_threadpool(server.generate_sensor_data)
+    return negotiated_response(request, server.encode_sensor_data(data, encoding))
+
+
+async def stream_sensor_data(request):
+    """Endpoint для потокової передачі даних (SSE, ?encoding=json|bitmap|delta&events=stats,anomaly)"""
+    try:
+        encoding = sensor_encoding(request)
+        events = server.parse_sse_events(request.query_params.get('events'))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    last_event_id = request.headers.get('last-event-id') or request.query_params.get('lastEventId')
+    logger.info("🌊 SSE stream підключено (Last-Event-ID: %s, encoding: %s)", last_event_id, encoding)
+    return StreamingResponse(
+        server.sensor_hub.subscribe_async(last_event_id, encoding, events),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def get_all_devices(request):
+    """Отримати стан всіх пристроїв (фільтри: ?type=VENTILATION&enabled=true, long-poll: ?wait_for_version=N)"""
+    params = request.query_params
+    try:
+        wait_for, timeout = server.long_poll_params(params)
+        if wait_for is not None:
+            await server.device_cache.wait_async(wait_for, timeout=timeout)
+        status, body, headers = server.device_get_response(
+            None, request.headers.get('if-none-match'), params.get('type'), params.get('enabled'),
+            request.headers.get('accept'), request.headers.get('accept-encoding')
+        )
+    except DeviceValidationError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    return Response(body, status_code=status, headers=headers)
+
+
+async def stream_devices(request):
+    """Зміни пристроїв (SSE): перша подія - усі пристрої, далі - лише змінені"""
+    last_version = server.device_cache.parse_event_id(
+        request.headers.get('last-event-id') or request.query_params.get('lastEventId')
+    )
+    logger.info("🌊 Потік пристроїв підключено (версія: %s)", last_version)
+    return StreamingResponse(
+        server.device_cache.subscribe_async(last_version, server.DEVICE_STREAM_KEEPALIVE),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def get_device(request):
+    """Отримати стан конкретного пристрою (long-poll: ?wait_for_version=N)"""
+    device_id = request.path_params['device_id']
+    if device_id not in server.device_states:
+        return JSONResponse({'error': 'Device not found'}, status_code=404)
+    try:
+        wait_for, timeout = server.long_poll_params(request.query_params)
+    except DeviceValidationError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    if wait_for is not None:
+        await server.device_cache.wait_async(wait_for, device_id, timeout)
+    status, body, headers = server.device_get_response(
+        device_id, request.headers.get('if-none-match'),
+        accept=request.headers.get('accept'), accept_encoding=request.headers.get('accept-encoding')
+    )
+    return Response(body, status_code=status, headers=headers)
+
+
+def apply_and_sync(device, data):
+    """Оновлення пристрою і постановка в чергу Firebase (запис виконує фонова черга, PUT не чекає)"""
+    server.apply_device_update(device, data)
+    return server.sync_device_to_firebase(device)
+
+
+async def update_device(request):
+    """Змінити стан пристрою"""
+    device_id = request.path_params['device_id']
+    device = server.device_states.get(device_id)
+    if device is None:
+        logger.warning(f"❌ Пристрій не знайдено: {device_id}")
+        return JSONResponse({'error': 'Device not found'}, status_code=404)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        logger.warning(f"❌ Некоректний JSON для {device_id}")
+        return JSONResponse({'error': 'Request body must be valid JSON'}, status_code=400)
+    try:
+        # Блокування стану і спільної послідовності синхронізації - не на циклі подій
+        sync_seq = await run_in_threadpool(apply_and_sync, device, data)
+    except DeviceValidationError as e:
+        logger.warning(f"❌ Некоректні дані для {device_id}: {e}")
+        return JSONResponse({'error': str(e)}, status_code=400)
+    logger.debug("✅ Пристрій оновлено: %s, Firebase sync seq: %s", device_id, sync_seq)
+    return JSONResponse(server.device_update_response(device, sync_seq))
+
+
+async def websocket_endpoint(websocket):
+    """Мультиплексований WebSocket (протокол описано в ws_gateway.py)"""
+    await websocket.accept()
+    logger.info("🔌 WebSocket підключено")
+
+    async def receive():
+        message = await websocket.receive()
+        if message['type'] == 'websocket.disconnect':
+            return None
+        return message.get('text') or message.get('bytes')
+
+    await server.ws_gateway.session().run_async(receive, websocket.send_text)
+
+
+async def health(request):
+    """Перевірка стану сервера"""
+    body, status = server.health_status()
+    return JSONResponse(body, status_code=status)
+
+
+class RequestLogMiddleware:
+    """Логує і рахує в метриках кожен HTTP-запит так само, як Flask-застосунок"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        # Як і у Flask: спершу зміни пристроїв з інших воркерів (блокування файлу - не на циклі подій)
+        if server.state_backend.refresh_needed():
+            await run_in_threadpool(server.state_backend.refresh_devices)
+        sampled = server.VERBOSE_LOGGING or server.sample_request()
+        if server.VERBOSE_LOGGING:
+            logger.info("📥 %s %s", scope['method'], scope['path'])
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                client = scope.get('client')
+                duration = time.perf_counter() - started
+                if server.METRICS_ENABLED:
+                    # Роутер Starlette записує знайдений маршрут у той самий scope
+                    route = scope.get('route')
+                    server.record_request_metrics(
+                        scope['method'],
+                        route.path.replace('{', '<').replace('}', '>') if route is not None else 'unmatched',
+                        message['status'], duration
+                    )
+                server.log_request_line(
+                    scope['method'], scope['path'], message['status'],
+                    duration * 1000, client[0] if client else None, sampled=sampled
+                )
+            await send(message)
+
+        if server.METRICS_ENABLED:
+            server.http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if server.METRICS_ENABLED:
+                server.http_requests_in_flight.dec()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Firebase підключається у фоні ще при імпорті sensor_api_server
+    server.sensor_hub.start()
+    yield
+
+
+routes = [
+    Route('/api/sensor-data', get_sensor_data, methods=['GET']),
+    Route('/api/sensor-data/stream', stream_sensor_data, methods=['GET']),
+    Route('/api/devices', get_all_devices, methods=['GET']),
+    Route('/api/devices/stream', stream_devices, methods=['GET']),
+    Route('/api/devices/{device_id}', get_device, methods=['GET']),
+    Route('/api/devices/{device_id}', update_device, methods=['PUT']),
+    Route('/api/health', health, methods=['GET']),
+    WebSocketRoute('/api/ws', websocket_endpoint),
+]
+
+native_app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*']),
+        Middleware(RequestLogMiddleware),
+    ],
+    lifespan=lifespan,
+)
+
+# Flask-застосунок має власні CORS (включно з preflight OPTIONS) і логування
+flask_app = WSGIMiddleware(server.app)
+
+
+async def app(scope, receive, send):
+    """Асинхронні маршрути обробляються напряму, решта - Flask-застосунком"""
+    if scope['type'] == 'http' and not any(
+        route.matches(scope)[0] == Match.FULL for route in routes
+    ):
+        return await flask_app(scope, receive, send)
+    return await native_app(scope, receive, send)
+
+
+def main():
+    """Точка входу: замінює `python sensor_api_server.py` у Procfile"""
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5000))
+    logger.info(f"🚀 ASGI сервер запущено на http://0.0.0.0:{port}")
+    uvicorn.run(
+        app,
+        host='0.0.0.0',
+        port=port,
+        log_level='warning',
+        # Тисячі простоюючих SSE-з'єднань
+        limit_concurrency=int(os.environ.get('ASGI_LIMIT_CONCURRENCY', 10000)),
+        timeout_keep_alive=int(os.environ.get('ASGI_KEEP_ALIVE', 75)),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+"""
+Бенчмарки та навантажувальні сценарії сервера (працюють офлайн)
+
+Запуск: python -m benchmarks [--scenario NAME ...] [--save-baseline] [--compare]
+
+Мікробенчмарки generate_sensor_data і серіалізації JSON, кожен маршрут через
+Flask test client, N одночасних SSE-підписників і PUT/PATCH із локальним
+Firestore у пам'яті з налаштовуваною затримкою. Для кожного сценарію
+звітуються req/s, p50/p99 затримки та RSS; базовий файл дозволяє помітити регресії.
+"""
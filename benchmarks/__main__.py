@@ -0,0 +1,157 @@
+"""
+python -m benchmarks - запуск сценаріїв і порівняння з базовим файлом
+
+Приклади:
+    python -m benchmarks --save-baseline          # записати базові результати цієї машини
+    python -m benchmarks                          # усі сценарії + порівняння з базовими
+    python -m benchmarks --scenario GET --quick   # лише маршрути GET, у 10 разів менше ітерацій
+
+Базові результати залежать від машини, тому не зберігаються в репозиторії:
+їх записує --save-baseline локально (BENCH_BASELINE або кеш користувача),
+а порівняння з файлом, записаним на іншій машині, пропускається.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from .harness import compare, format_table, load_baseline, machine_info, save_baseline
+
+DEFAULT_BASELINE = os.environ.get('BENCH_BASELINE') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'smart-parking', 'benchmark-baseline.json'
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Бенчмарки Smart Parking Sensor API')
+    parser.add_argument('--scenario', action='append', default=[],
+                        help='запускати лише сценарії, назва яких починається з NAME (можна повторювати)')
+    parser.add_argument('--list', action='store_true', help='показати сценарії і вийти')
+    parser.add_argument('--quick', action='store_true', help='у 10 разів менше ітерацій')
+    parser.add_argument('--sse-clients', type=int, default=100, help='кількість SSE-підписників')
+    parser.add_argument('--sse-events', type=int, default=20, help='подій на підписника')
+    parser.add_argument('--sse-interval', type=float, default=0.05, help='інтервал генерації SSE, с')
+    parser.add_argument('--firestore-latency', type=float, default=0.05,
+                        help='затримка одного запиту до Firestore у пам\'яті, с')
+    parser.add_argument('--devices', type=int, default=300, help='пристроїв кожного типу')
+    parser.add_argument('--lots', type=int, default=100, help='кількість паркінгів')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='шлях до базового файлу')
+    parser.add_argument('--save-baseline', action='store_true', help='записати результати як базові')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='допустиме погіршення відносно базового файлу (частка)')
+    parser.add_argument('--json', dest='json_path', help='зберегти результати у JSON')
+    parser.add_argument('--show-logs', action='store_true', help='не приглушувати вивід логів сервера')
+    args = parser.parse_args(argv)
+    args.scale = 0.1 if args.quick else 1.0
+    return args
+
+
+def configure_environment(args):
+    """Змінні середовища сервера; мають бути задані до імпорту sensor_api_server"""
+    inventory = {'DIRECTION_PANELS': args.devices, 'VENTILATION': args.devices, 'HEATING': args.devices}
+    inventory_file = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+    with inventory_file:
+        json.dump(inventory, inventory_file)
+    os.environ['DEVICE_INVENTORY'] = inventory_file.name
+    os.environ['SSE_INTERVAL'] = str(args.sse_interval)
+    os.environ['PARKING_LOTS'] = str(args.lots)
+    # Власний файл спільного стану, щоб не змішуватися із запущеним сервером
+    os.environ['STATE_PATH'] = os.path.join(tempfile.gettempdir(), f"smart-parking-bench-{os.getpid()}.state")
+    # Без файлу історії і без справжнього Firebase - бенчмарки працюють офлайн
+    os.environ.pop('SENSOR_HISTORY_PATH', None)
+    os.environ.pop('FIREBASE_CREDENTIALS', None)
+    return [inventory_file.name, os.environ['STATE_PATH']]
+
+
+def silence_console_logs(server):
+    """
+    Перенаправляє вивід логів у /dev/null.
+
+    Форматування і черга логування лишаються у вимірюваннях, відкидається
+    лише запис у термінал, який інакше домінує і засмічує звіт.
+    """
+    devnull = open(os.devnull, 'w')
+    handlers = list(logging.getLogger().handlers)
+    listener = getattr(server, 'log_listener', None)
+    if listener is not None:
+        handlers += list(listener.handlers)
+    for handler in handlers:
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            handler.setStream(devnull)
+
+
+def build_context(args):
+    import sensor_api_server as server
+    from firestore_memory import InMemoryFirestore
+
+    if not args.show_logs:
+        silence_console_logs(server)
+    server.db = InMemoryFirestore(latency=args.firestore_latency)
+    server.FIREBASE_ENABLED = True
+    return SimpleNamespace(server=server, client=server.app.test_client(), args=args)
+
+
+def selected(args, scenarios):
+    if not args.scenario:
+        return scenarios
+    return [(name, func) for name, func in scenarios if any(name.startswith(p) for p in args.scenario)]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from .scenarios import SCENARIOS
+
+    scenarios = selected(args, SCENARIOS)
+    if args.list:
+        print('\n'.join(name for name, _ in scenarios))
+        return 0
+    if not scenarios:
+        print(f"❌ Немає сценаріїв для {args.scenario}", file=sys.stderr)
+        return 2
+
+    temp_paths = configure_environment(args)
+    try:
+        ctx = build_context(args)
+        results = []
+        for name, func in scenarios:
+            print(f"⏱️  {name}...", file=sys.stderr, flush=True)
+            results.append(func(ctx))
+    finally:
+        for path in temp_paths:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    regressions = []
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+    elif os.path.exists(args.baseline):
+        baseline = load_baseline(args.baseline)
+        if baseline.get('machine') != machine_info():
+            print(f"⚠️  {args.baseline} записано на іншій машині або Python - порівняння пропущено "
+                  f"(оновіть: --save-baseline)", file=sys.stderr)
+        else:
+            regressions = compare(results, baseline['results'], args.threshold)
+    else:
+        print(f"ℹ️  Базових результатів немає ({args.baseline}); запишіть їх: --save-baseline", file=sys.stderr)
+
+    print(format_table(results, regressions))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump([r._asdict() for r in results], f, indent=2)
+    if args.save_baseline:
+        print(f"\n💾 Базові результати збережено: {args.baseline}")
+    elif regressions:
+        print(f"\n⚠️  Регресії відносно {args.baseline} (поріг {args.threshold:.0%}):")
+        for name, detail in regressions:
+            print(f"   {name}: {detail}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
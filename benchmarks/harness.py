@@ -0,0 +1,115 @@
+"""
+Вимірювання: затримки операцій, req/s, перцентилі та RSS процесу
+"""
+
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from collections import namedtuple
+
+Result = namedtuple('Result', ['name', 'ops', 'seconds', 'req_s', 'p50_ms', 'p99_ms', 'rss_mb'])
+
+
+def rss_mb():
+    """Поточний RSS процесу (МБ); без /proc - пікове значення з getrusage"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS повертає байти, Linux - кілобайти
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(name, latencies, seconds):
+    """Result з латентностей окремих операцій (секунди) і загального часу"""
+    latencies = sorted(latencies)
+    ops = len(latencies)
+    return Result(
+        name=name,
+        ops=ops,
+        seconds=round(seconds, 4),
+        req_s=round(ops / seconds, 1) if seconds > 0 else 0.0,
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 4),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 4),
+        rss_mb=round(rss_mb(), 1),
+    )
+
+
+def measure(name, operation, iterations, warmup=None):
+    """Викликає operation() iterations разів і вимірює кожен виклик"""
+    for _ in range(warmup if warmup is not None else max(1, iterations // 10)):
+        operation()
+    latencies = []
+    clock = time.perf_counter
+    started = clock()
+    for _ in range(iterations):
+        t0 = clock()
+        operation()
+        latencies.append(clock() - t0)
+    return summarize(name, latencies, clock() - started)
+
+
+def format_table(results, regressions=()):
+    header = f"{'scenario':<32} {'ops':>8} {'req/s':>12} {'p50 ms':>10} {'p99 ms':>10} {'RSS MB':>8}"
+    lines = [header, '-' * len(header)]
+    flagged = {name for name, _ in regressions}
+    for r in results:
+        mark = '  ⚠️' if r.name in flagged else ''
+        lines.append(f"{r.name:<32} {r.ops:>8} {r.req_s:>12.1f} {r.p50_ms:>10.3f} {r.p99_ms:>10.3f} {r.rss_mb:>8.1f}{mark}")
+    return '\n'.join(lines)
+
+
+def machine_info():
+    """Відбиток машини: базові результати порівнянні лише на тій самій машині і Python"""
+    return {
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+    }
+
+
+def save_baseline(path, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'machine': machine_info(), 'results': {r.name: r._asdict() for r in results}},
+                  f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Регресії відносно базового файлу: (scenario, опис).
+
+    Регресія - req/s нижче базового більш ніж на threshold або p99 вище
+    більш ніж на threshold (частка, 0.25 = 25%).
+    """
+    regressions = []
+    for r in results:
+        base = baseline.get(r.name)
+        if not base:
+            continue
+        if base['req_s'] and r.req_s < base['req_s'] * (1 - threshold):
+            regressions.append((r.name, f"req/s {r.req_s:.1f} < {base['req_s']:.1f}"))
+        elif base['p99_ms'] and r.p99_ms > base['p99_ms'] * (1 + threshold):
+            regressions.append((r.name, f"p99 {r.p99_ms:.3f} ms > {base['p99_ms']:.3f} ms"))
+    return regressions
@@ -0,0 +1,236 @@
+"""
+Сценарії бенчмарків
+
+Кожен сценарій - функція scenario(ctx), що повертає Result. ctx містить
+імпортований модуль сервера (server), Flask test client (client) і аргументи
+командного рядка (args). Сценарії реєструються декоратором @scenario у
+порядку запуску.
+"""
+
+import json
+import threading
+import time
+
+from .harness import measure, summarize
+
+SCENARIOS = []
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS.append((name, func))
+        return func
+    return register
+
+
+def scaled(ctx, iterations):
+    return max(1, int(iterations * ctx.args.scale))
+
+
+def get_ok(ctx, path, headers=None, expected=200):
+    """Операція GET для measure(); перевіряє статус відповіді"""
+    client = ctx.client
+
+    def operation():
+        response = client.get(path, headers=headers)
+        if response.status_code != expected:
+            raise RuntimeError(f"GET {path}: {response.status_code}, очікувався {expected}")
+    return operation
+
+
+# --- Мікробенчмарки -------------------------------------------------------
+
+@scenario('micro.generate_sensor_data')
+def micro_generate(ctx):
+    return measure('micro.generate_sensor_data', ctx.server.generate_sensor_data, scaled(ctx, 20000))
+
+
+@scenario('micro.json.dumps')
+def micro_json_dumps(ctx):
+    snapshot = ctx.server.generate_sensor_data()
+    return measure('micro.json.dumps', lambda: json.dumps(snapshot), scaled(ctx, 20000))
+
+
+@scenario('micro.flask.jsonify')
+def micro_jsonify(ctx):
+    snapshot = ctx.server.generate_sensor_data()
+    with ctx.server.app.app_context():
+        return measure('micro.flask.jsonify', lambda: ctx.server.jsonify(snapshot), scaled(ctx, 20000))
+
+
+# --- Маршрути через Flask test client ---------------------------------------
+
+@scenario('GET /api/sensor-data')
+def route_sensor_data(ctx):
+    return measure('GET /api/sensor-data', get_ok(ctx, '/api/sensor-data'), scaled(ctx, 5000))
+
+
+@scenario('GET /api/sensor-data/history')
+def route_history(ctx):
+    # Наповнюємо історію, щоб запит агрегував реальні дані
+    for _ in range(2000):
+        ctx.server.generate_sensor_data()
+    path = '/api/sensor-data/history?step=60'
+    return measure('GET /api/sensor-data/history', get_ok(ctx, path), scaled(ctx, 2000))
+
+
+@scenario('GET /api/spots/free')
+def route_free_spots(ctx):
+    return measure('GET /api/spots/free', get_ok(ctx, '/api/spots/free?limit=100'), scaled(ctx, 5000))
+
+
+@scenario('GET /api/lots/{id}/sensor-data')
+def route_lot(ctx):
+    lot_id = ctx.server.lot_engine.lot_ids[0]
+    path = f'/api/lots/{lot_id}/sensor-data'
+    return measure('GET /api/lots/{id}/sensor-data', get_ok(ctx, path), scaled(ctx, 5000))
+
+
+@scenario('GET /api/sensor-data/batch')
+def route_batch(ctx):
+    lots = ','.join(ctx.server.lot_engine.lot_ids[:50])
+    path = f'/api/sensor-data/batch?lots={lots}'
+    return measure('GET /api/sensor-data/batch', get_ok(ctx, path), scaled(ctx, 2000))
+
+
+@scenario('GET /api/simulate')
+def route_simulate(ctx):
+    path = '/api/simulate?ticks=1000&seed=42'
+    return measure('GET /api/simulate', get_ok(ctx, path), scaled(ctx, 100), warmup=2)
+
+
+@scenario('GET /api/devices')
+def route_devices(ctx):
+    return measure('GET /api/devices', get_ok(ctx, '/api/devices'), scaled(ctx, 3000))
+
+
+@scenario('GET /api/devices (br)')
+def route_devices_compressed(ctx):
+    operation = get_ok(ctx, '/api/devices', headers={'Accept-Encoding': 'br, gzip'})
+    return measure('GET /api/devices (br)', operation, scaled(ctx, 3000))
+
+
+@scenario('GET /api/devices (304)')
+def route_devices_not_modified(ctx):
+    etag = ctx.client.get('/api/devices').headers['ETag']
+    operation = get_ok(ctx, '/api/devices', headers={'If-None-Match': etag}, expected=304)
+    return measure('GET /api/devices (304)', operation, scaled(ctx, 5000))
+
+
+@scenario('GET /api/devices/{id}')
+def route_device(ctx):
+    device_id = next(iter(ctx.server.device_states))
+    path = f'/api/devices/{device_id}'
+    return measure('GET /api/devices/{id}', get_ok(ctx, path), scaled(ctx, 5000))
+
+
+@scenario('GET /api/health')
+def route_health(ctx):
+    return measure('GET /api/health', get_ok(ctx, '/api/health'), scaled(ctx, 5000))
+
+
+@scenario('GET /api/metrics')
+def route_metrics(ctx):
+    if not ctx.server.METRICS_ENABLED:
+        return measure('GET /api/metrics', get_ok(ctx, '/api/metrics', expected=404), scaled(ctx, 1000))
+    return measure('GET /api/metrics', get_ok(ctx, '/api/metrics'), scaled(ctx, 1000))
+
+
+# --- Оновлення пристроїв (Firestore у пам'яті із затримкою) -----------------
+
+def ventilation_id(ctx):
+    return next(d['device_id'] for d in ctx.server.device_states.values()
+                if d['device_type'] == 'VENTILATION')
+
+
+@scenario('PUT /api/devices/{id}')
+def route_put(ctx):
+    client = ctx.client
+    path = f'/api/devices/{ventilation_id(ctx)}'
+    counter = iter(range(10 ** 9))
+
+    def operation():
+        response = client.put(path, json={'enabled': True, 'fan_speed': next(counter) % 3 + 1})
+        if response.status_code != 200:
+            raise RuntimeError(f"PUT {path}: {response.status_code}")
+    return measure('PUT /api/devices/{id}', operation, scaled(ctx, 3000))
+
+
+@scenario('PUT + Firebase commit')
+def route_put_committed(ctx):
+    """Повний шлях оновлення: PUT і очікування коміту в Firestore"""
+    client = ctx.client
+    queue = ctx.server.firebase_sync_queue
+    path = f'/api/devices/{ventilation_id(ctx)}'
+
+    def operation():
+        response = client.put(path, json={'enabled': True})
+        seq = response.get_json()['sync_seq']
+        if seq is not None and not queue.wait(seq, timeout=30):
+            raise RuntimeError(f"seq {seq} не закомічено за 30 с")
+    return measure('PUT + Firebase commit', operation, scaled(ctx, 20), warmup=1)
+
+
+@scenario('PATCH /api/devices')
+def route_patch(ctx):
+    client = ctx.client
+    counter = iter(range(10 ** 9))
+
+    def operation():
+        body = {'filter': {'type': 'DIRECTION_PANELS'}, 'set': {'brightness': next(counter) % 101}}
+        response = client.patch('/api/devices', json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"PATCH /api/devices: {response.status_code}")
+    return measure('PATCH /api/devices', operation, scaled(ctx, 200))
+
+
+# --- SSE -------------------------------------------------------------------
+
+@scenario('SSE fan-out')
+def sse_fanout(ctx):
+    """
+    N одночасних підписників /api/sensor-data/stream.
+
+    Операція - доставка однієї події одному підписнику; затримка - від
+    генерації знімка (timestamp) до отримання клієнтом.
+    """
+    server = ctx.server
+    clients, events = ctx.args.sse_clients, ctx.args.sse_events
+    server.sensor_hub.start()
+    latencies = []
+    lock = threading.Lock()
+    errors = []
+    ready = threading.Barrier(clients + 1)
+
+    def subscriber():
+        client = server.app.test_client()
+        response = client.get('/api/sensor-data/stream', buffered=False)
+        received = []
+        try:
+            ready.wait()
+            for chunk in response.response:
+                now = time.time() * 1000
+                for line in chunk.decode().splitlines():
+                    if line.startswith('data: '):
+                        received.append((now - json.loads(line[6:])['timestamp']) / 1000)
+                if len(received) > events:
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            response.close()
+        # Перша подія - останній знімок з буфера, він старший за підключення
+        with lock:
+            latencies.extend(received[1:events + 1])
+
+    threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(f"SSE: {len(errors)} помилок підписників, перша: {errors[0]!r}")
+    return summarize('SSE fan-out', latencies, elapsed)
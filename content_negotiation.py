@@ -0,0 +1,131 @@
+"""
+Узгодження формату і стиснення відповідей
+
+Формат тіла - за заголовком Accept: JSON (за замовчуванням), MessagePack
+(application/msgpack) або CBOR (application/cbor). Стиснення - за
+Accept-Encoding: br (якщо встановлено brotli) або gzip. Тіла, менші за
+поріг, не стискаються: заголовки і робота CPU коштують більше за виграш.
+
+msgpack, cbor2 і brotli - необов'язкові залежності: без них відповідний
+формат просто не пропонується.
+"""
+
+import gzip
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+
+# Синоніми з Accept → канонічний тип
+_MEDIA_ALIASES = {
+    JSON: JSON,
+    'application/*': JSON,
+    '*/*': JSON,
+    MSGPACK: MSGPACK,
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+    CBOR: CBOR,
+}
+
+# Короткі назви для ETag варіанта
+MEDIA_SUFFIXES = {JSON: None, MSGPACK: 'msgpack', CBOR: 'cbor'}
+
+# Рівні стиснення: швидкі, бо стискається кожна некешована відповідь
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def available_media_types():
+    types = [JSON]
+    if MSGPACK_AVAILABLE:
+        types.append(MSGPACK)
+    if CBOR_AVAILABLE:
+        types.append(CBOR)
+    return types
+
+
+def _parse_header(value):
+    """Елементи заголовка Accept/Accept-Encoding як [(назва, q)] у порядку переваги"""
+    items = []
+    for position, part in enumerate((value or '').split(',')):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, raw = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(raw)
+                except ValueError:
+                    q = 0.0
+        items.append((name, q, position))
+    # Вища якість першою, за рівності - порядок у заголовку
+    items.sort(key=lambda item: (-item[1], item[2]))
+    return [(name, q) for name, q, _ in items]
+
+
+def negotiate_media_type(accept):
+    """Формат тіла для Accept (JSON, якщо нічого з підтримуваного не запитано)"""
+    available = available_media_types()
+    for name, q in _parse_header(accept):
+        media_type = _MEDIA_ALIASES.get(name)
+        if q > 0 and media_type in available:
+            return media_type
+    return JSON
+
+
+def negotiate_content_encoding(accept_encoding):
+    """br, gzip або None для Accept-Encoding"""
+    supported = ['br', 'gzip'] if BROTLI_AVAILABLE else ['gzip']
+    accepted = {name: q for name, q in _parse_header(accept_encoding)}
+    for encoding in supported:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > 0:
+            return encoding
+    return None
+
+
+def serialize(payload, media_type, dumps_json):
+    """Тіло відповіді (bytes); dumps_json - серіалізатор JSON застосунку"""
+    if media_type == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    if media_type == CBOR:
+        return cbor2.dumps(payload)
+    return dumps_json(payload).encode('utf-8')
+
+
+def compress(body, content_encoding):
+    if content_encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if content_encoding == 'gzip':
+        # mtime=0: однакове тіло дає однакові байти (кешування, ETag)
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def variant_etag(etag, media_type=JSON, content_encoding=None):
+    """ETag конкретного варіанта: різні формати і стиснення мають різні ETag"""
+    parts = [part for part in (MEDIA_SUFFIXES.get(media_type), content_encoding) if part]
+    if not parts:
+        return etag
+    return f'{etag[:-1]}-{".".join(parts)}"'
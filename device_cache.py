@@ -0,0 +1,265 @@
+"""
+Версії станів пристроїв і кеш серіалізованих відповідей
+
+Кожна зміна пристрою збільшує глобальну версію колекції і записує її як
+версію пристрою. Серіалізовані тіла GET /api/devices і /api/devices/<id>
+(окремо для кожного формату і стиснення) кешуються до наступної зміни,
+версії використовуються як ETag, а клієнти можуть чекати нової версії
+(long-poll) замість частого опитування.
+
+Журнал змін (версія → змінені пристрої) живить SSE-потік /api/devices/stream:
+подія зі зміненими пристроями серіалізується один раз для всіх клієнтів.
+
+Зі спільним станом воркерів версії й мітку запуску задає файл стану (adopt()
+і bump(version=...)), тож ETag і версії однакові в усіх воркерах.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+from sse_hub import format_sse_event
+
+# Скільки останніх змін пам'ятає журнал (старіший Last-Event-ID - повний знімок)
+CHANGE_LOG_SIZE = 1024
+
+
+class DeviceStateCache:
+    """Версії пристроїв, кеш тіл відповідей і очікування змін"""
+
+    def __init__(self, device_states, serialize, compress=None):
+        self._devices = device_states
+        # serialize(payload, media_type) -> bytes; compress(body, content_encoding) -> bytes
+        self._serialize = serialize
+        self._compress = compress
+        self.version = 1
+        # Мітка запуску в ETag не дає збігтися ETag-ам до і після перезапуску
+        self.epoch = format(int(time.time() * 1000), 'x')
+        self._versions = dict.fromkeys(device_states, 1)
+        # (id, media_type, content_encoding) -> (версія, bytes); id None - уся колекція
+        self._bodies = {}
+        self._cond = threading.Condition()
+        # Очікувачі asyncio: {asyncio.Event: loop}
+        self._async_waiters = {}
+        # Функції без аргументів, що викликаються після кожної зміни (WebSocket-сесії)
+        self._listeners = set()
+        # (попередня версія, версія, tuple id або None - усі пристрої); версії можуть
+        # мати пропуски - зміни інших воркерів, підтягнуті разом
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)
+        # (версія від, версія до) -> bytes події SSE
+        self._events = {}
+
+    def adopt(self, epoch, versions=None):
+        """Мітка запуску і (версія колекції, {id: версія}) зі сховища стану до першого запиту"""
+        with self._cond:
+            self.epoch = epoch
+            if versions is not None:
+                self.version, device_versions = versions
+                self._versions.update(device_versions)
+            self._bodies.clear()
+            self._changes.clear()
+            self._events.clear()
+
+    def bump(self, device_ids=None, version=None, device_versions=None):
+        """
+        Позначає пристрої зміненими (None - усі, наприклад після завантаження з Firebase).
+
+        version - версія зі спільного стану (без неї - наступна локальна),
+        device_versions - {id: версія}, якщо зміни кількох версій підтягнуто разом.
+        """
+        with self._cond:
+            previous = self.version
+            self.version = previous + 1 if version is None else max(previous, version)
+            ids = self._devices.keys() if device_ids is None else device_ids
+            for device_id in ids:
+                self._versions[device_id] = self.version
+            if device_versions:
+                self._versions.update(device_versions)
+            self._changes.append((previous, self.version, None if device_ids is None else tuple(device_ids)))
+            self._cond.notify_all()
+            waiters = list(self._async_waiters.items())
+            listeners = list(self._listeners)
+        for waiter, loop in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # Цикл подій уже закрито
+                pass
+        for listener in listeners:
+            listener()
+        return self.version
+
+    def add_listener(self, callback):
+        """callback() після кожної зміни (з потоку, що змінив пристрій; має бути швидким)"""
+        with self._cond:
+            self._listeners.add(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.discard(callback)
+
+    def device_version(self, device_id):
+        return self._versions.get(device_id, 0)
+
+    def current_version(self, device_id=None):
+        return self.version if device_id is None else self.device_version(device_id)
+
+    def etag(self, device_id=None):
+        if device_id is None:
+            return f'"{self.epoch}-c{self.version}"'
+        return f'"{self.epoch}-d{self.device_version(device_id)}-{device_id}"'
+
+    def body(self, device_id=None, media_type='application/json', content_encoding=None):
+        """
+        Серіалізоване тіло колекції або пристрою; перебудовується лише після змін.
+
+        Стиснений варіант будується з кешованого нестисненого, тож після зміни
+        кожен варіант серіалізується і стискається один раз.
+        """
+        version = self.current_version(device_id)
+        key = (device_id, media_type, content_encoding)
+        cached = self._bodies.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if content_encoding is not None:
+            body = self._compress(self.body(device_id, media_type), content_encoding)
+        else:
+            if device_id is None:
+                payload = {'devices': list(self._devices.values())}
+            else:
+                payload = self._devices[device_id]
+            body = self._serialize(payload, media_type)
+        # Зберігаємо, лише якщо за час серіалізації не було змін
+        with self._cond:
+            if self.current_version(device_id) == version:
+                self._bodies[key] = (version, body)
+        return body
+
+    def changes_since(self, version):
+        """(поточна версія, id змінених після version або None - потрібен повний знімок)"""
+        with self._cond:
+            current = self.version
+            if version >= current:
+                return current, []
+            if not self._changes or self._changes[0][0] > version:
+                return current, None
+            changed = set()
+            for _, change_version, device_ids in reversed(self._changes):
+                if change_version <= version:
+                    break
+                if device_ids is None:
+                    return current, None
+                changed.update(device_ids)
+            return current, [device_id for device_id in self._devices if device_id in changed]
+
+    def change_event(self, version):
+        """
+        (нова версія, bytes події SSE) зі змінами після version або (version, None).
+
+        Клієнти на однаковій версії отримують ті самі байти (серіалізація один раз).
+        """
+        current, device_ids = self.changes_since(version)
+        if device_ids == []:
+            return version, None
+        key = (version if device_ids is not None else None, current)
+        event = self._events.get(key)
+        if event is None:
+            if device_ids is None:
+                payload = {'version': current, 'full': True, 'devices': list(self._devices.values())}
+            else:
+                payload = {'version': current, 'full': False,
+                           'devices': [self._devices[device_id] for device_id in device_ids]}
+            data = self._serialize(payload, 'application/json').decode('utf-8').rstrip('\n')
+            event = format_sse_event(f"{self.epoch}-{current}", data, 'devices')
+            with self._cond:
+                if len(self._events) >= 64:
+                    self._events.clear()
+                self._events[key] = event
+        return current, event
+
+    def parse_event_id(self, value):
+        """Версія з Last-Event-ID ("<epoch>-<версія>"); None - новий клієнт або інший запуск"""
+        epoch, _, version = (value or '').partition('-')
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
+
+    def _initial_version(self, last_version):
+        # Новий клієнт (або версія, якої ще не було) - повний знімок; -1 нижче
+        # будь-якої версії, зокрема 0 у щойно створеному спільному стані
+        if last_version is None or last_version > self.version:
+            return -1
+        return last_version
+
+    def subscribe(self, last_version=None, keepalive=15.0):
+        """Генератор SSE-байтів змін пристроїв для одного клієнта"""
+        version = self._initial_version(last_version)
+        while True:
+            version, event = self.change_event(version)
+            if event is not None:
+                yield event
+                continue
+            if not self.wait(version + 1, timeout=keepalive):
+                yield b": keepalive\n\n"
+
+    async def subscribe_async(self, last_version=None, keepalive=15.0):
+        """Асинхронний варіант subscribe() для ASGI-режиму"""
+        version = self._initial_version(last_version)
+        while True:
+            version, event = self.change_event(version)
+            if event is not None:
+                yield event
+                continue
+            if not await self.wait_async(version + 1, timeout=keepalive):
+                yield b": keepalive\n\n"
+
+    def wait(self, min_version, device_id=None, timeout=30.0):
+        """Блокує, поки версія не стане >= min_version (або до timeout)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.current_version(device_id) < min_version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    async def wait_async(self, min_version, device_id=None, timeout=30.0):
+        """Асинхронний варіант wait() для ASGI-режиму"""
+        if self.current_version(device_id) >= min_version:
+            return True
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.Event()
+        with self._cond:
+            self._async_waiters[waiter] = loop
+        deadline = loop.time() + timeout
+        try:
+            while self.current_version(device_id) < min_version:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                waiter.clear()
+                if self.current_version(device_id) >= min_version:
+                    break
+                try:
+                    await asyncio.wait_for(waiter.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return False
+            return True
+        finally:
+            with self._cond:
+                self._async_waiters.pop(waiter, None)
+
+
+def etag_matches(if_none_match, etag):
+    """Перевірка заголовка If-None-Match (включно з W/ і *)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag or candidate == '*':
+            return True
+    return False
@@ -0,0 +1,161 @@
+"""
+Декларативний реєстр типів пристроїв
+
+Кожен тип описує свої числові поля (діапазон і значення за замовчуванням).
+Валідація, обмеження діапазонів, документи Firebase і завантаження стану
+будуються з реєстру, тому новий тип додається одним записом у DEVICE_TYPES.
+"""
+
+import json
+import time
+from collections import namedtuple
+
+DeviceField = namedtuple('DeviceField', ['min', 'max', 'default'])
+
+DEVICE_TYPES = {
+    'DIRECTION_PANELS': {'brightness': DeviceField(0, 100, 50)},
+    'VENTILATION': {'fan_speed': DeviceField(1, 3, 1)},
+    'HEATING': {'heating_power': DeviceField(1, 2, 1)},
+}
+
+# Інвентар за замовчуванням: по одному пристрою кожного типу
+DEFAULT_INVENTORY = {'DIRECTION_PANELS': 1, 'VENTILATION': 1, 'HEATING': 1}
+
+
+class DeviceValidationError(ValueError):
+    """Некоректні дані оновлення пристрою"""
+
+
+def device_fields(device_type):
+    return DEVICE_TYPES[device_type]
+
+
+def new_device(device_id, device_type):
+    """Пристрій зі значеннями за замовчуванням"""
+    device = {
+        'device_id': device_id,
+        'device_type': device_type,
+        'enabled': False,
+    }
+    for name, field in device_fields(device_type).items():
+        device[name] = field.default
+    device['last_updated'] = int(time.time() * 1000)
+    return device
+
+
+def build_inventory(spec=None):
+    """
+    Створює словник пристроїв з опису інвентаря.
+
+    spec - {"VENTILATION": 500, ...} (id генеруються як ventilation_1..500)
+    або список [{"device_id": "...", "device_type": "..."}].
+    """
+    spec = DEFAULT_INVENTORY if spec is None else spec
+    if isinstance(spec, dict):
+        items = [(f"{device_type.lower()}_{i}", device_type)
+                 for device_type, count in spec.items() for i in range(1, int(count) + 1)]
+    else:
+        items = [(item['device_id'], item['device_type']) for item in spec]
+    # Перевірка до створення пристроїв: new_device() не знає невідомих типів
+    unknown = {device_type for _, device_type in items} - set(DEVICE_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown device types: {sorted(unknown)}")
+    return {device_id: new_device(device_id, device_type) for device_id, device_type in items}
+
+
+def load_inventory(path=None):
+    """Інвентар з JSON-файлу (DEVICE_INVENTORY) або за замовчуванням"""
+    if not path:
+        return build_inventory()
+    with open(path, 'r') as f:
+        return build_inventory(json.load(f))
+
+
+def validate_changes(device_type, data):
+    """
+    Перевіряє і нормалізує зміни для типу пристрою.
+
+    Числові поля обмежуються діапазоном з реєстру; невідомі поля ігноруються,
+    як і раніше в update_device. Повертає словник {поле: значення}.
+    """
+    if not isinstance(data, dict):
+        raise DeviceValidationError('Request body must be a JSON object')
+    changes = {}
+    if 'enabled' in data:
+        changes['enabled'] = bool(data['enabled'])
+    for name, field in device_fields(device_type).items():
+        if name not in data:
+            continue
+        try:
+            value = int(data[name])
+        except (TypeError, ValueError, OverflowError):
+            raise DeviceValidationError(f"'{name}' must be an integer")
+        changes[name] = max(field.min, min(field.max, value))
+    return changes
+
+
+def apply_changes(device, changes, timestamp=None):
+    """Застосовує нормалізовані зміни; повертає попередні значення змінених полів"""
+    old = {name: device[name] for name in changes}
+    device.update(changes)
+    device['last_updated'] = int(time.time() * 1000) if timestamp is None else timestamp
+    return old
+
+
+def firebase_document(device):
+    """Документ пристрою для Firebase"""
+    document = {
+        'device_id': device['device_id'],
+        'device_type': device['device_type'],
+        'enabled': device['enabled'],
+        'last_updated': device['last_updated'],
+        'synced': True
+    }
+    for name in device_fields(device['device_type']):
+        document[name] = device[name]
+    return document
+
+
+def apply_firebase_document(device, data):
+    """Оновлює локальний стан пристрою з документа Firebase"""
+    device['enabled'] = data.get('enabled', False)
+    device['last_updated'] = data.get('last_updated', int(time.time() * 1000))
+    for name, field in device_fields(device['device_type']).items():
+        device[name] = data.get(name, field.default)
+    return device
+
+
+def remote_document_applies(device, data):
+    """
+    Чи змінює документ Firestore локальний стан пристрою.
+
+    Документи, що збігаються з локальним станом (зокрема відлуння власних
+    записів), і документи, старші за локальний стан, пропускаються.
+    """
+    if data.get('device_type') != device['device_type']:
+        return False
+    if data.get('last_updated', device['last_updated']) < device['last_updated']:
+        return False
+    current = firebase_document(device)
+    return any(data.get(key, current[key]) != value for key, value in current.items() if key != 'synced')
+
+
+def matches_filter(device, device_type=None, enabled=None):
+    """Фільтр для списку пристроїв (?type=VENTILATION&enabled=true)"""
+    if device_type is not None and device['device_type'] != device_type:
+        return False
+    if enabled is not None and device['enabled'] != enabled:
+        return False
+    return True
+
+
+def parse_bool(value):
+    """'true'/'false'/'1'/'0' (або bool з JSON) → bool; None для відсутнього значення"""
+    if value is None or isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ('true', '1', 'yes'):
+        return True
+    if value in ('false', '0', 'no'):
+        return False
+    raise DeviceValidationError(f"Invalid boolean value: {value}")
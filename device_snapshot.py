@@ -0,0 +1,88 @@
+"""
+Локальний знімок станів пристроїв для швидкого (warm) старту
+
+При старті пристрої відновлюються з файлу ще до підключення до Firebase.
+Фоновий потік перезаписує файл після змін не частіше ніж раз на interval
+(атомарно, через тимчасовий файл) і при завершенні процесу.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from device_registry import apply_firebase_document, firebase_document
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def load_snapshot(path, device_states):
+    """Відновлює стани пристроїв зі знімка; повертає множину відновлених id"""
+    if not path or not os.path.exists(path):
+        return set()
+    try:
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Не вдалося прочитати знімок пристроїв {path}: {e}")
+        return set()
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        return set()
+    restored = set()
+    for device_id, document in snapshot.get('devices', {}).items():
+        device = device_states.get(device_id)
+        # Пристрої, яких немає в інвентарі або які змінили тип, пропускаємо
+        if device is None or document.get('device_type') != device['device_type']:
+            continue
+        apply_firebase_document(device, document)
+        restored.add(device_id)
+    return restored
+
+
+class DeviceSnapshotWriter:
+    """Фоновий запис знімка після змін (не частіше ніж раз на interval)"""
+
+    def __init__(self, path, device_states, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self._devices = device_states
+        self._dirty = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def mark_dirty(self):
+        self._dirty.set()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='device-snapshot', daemon=True)
+            self._thread.start()
+
+    def flush(self):
+        """Записує знімок, якщо були зміни (atexit)"""
+        if self._dirty.is_set():
+            self._dirty.clear()
+            self._write()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.interval)
+            self._dirty.clear()
+            try:
+                self._write()
+            except OSError as e:
+                logger.error(f"❌ Не вдалося записати знімок пристроїв: {e}")
+
+    def _write(self):
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'saved_at': int(time.time() * 1000),
+            'devices': {device_id: firebase_document(device) for device_id, device in list(self._devices.items())},
+        }
+        with self._write_lock:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
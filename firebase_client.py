@@ -0,0 +1,160 @@
+"""
+Фонове підключення до Firebase
+
+Імпорт firebase_admin, розбір credentials і створення клієнта Firestore
+займають секунди, тому виконуються у фоновому потоці: сервер стартує
+одразу, а стан пристроїв узгоджується з Firestore після підключення.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_CREDENTIALS_FILE = 'firebase-credentials.json'
+
+
+def credentials_source(env_value=None, path=FIREBASE_CREDENTIALS_FILE):
+    """
+    Джерело credentials без імпорту SDK.
+
+    ('env', json) - змінна FIREBASE_CREDENTIALS (для Railway/деплою),
+    ('file', path) - файл для локальної розробки, None - Firebase не налаштовано.
+    """
+    if env_value:
+        return ('env', env_value)
+    if path and os.path.exists(path):
+        return ('file', path)
+    return None
+
+
+def create_client(source):
+    """Імпортує Firebase Admin SDK і створює клієнт Firestore"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    kind, value = source
+    if kind == 'env':
+        cred_data = json.loads(value)
+    else:
+        with open(value, 'r') as f:
+            cred_data = json.load(f)
+    if cred_data.get('type') != 'service_account':
+        raise ValueError("credentials не є Service Account key (type != 'service_account'); "
+                         "отримайте його з Firebase Console → Project Settings → Service accounts")
+    # Застосунок на процес: після fork клієнт батьківського процесу (і його gRPC-канали)
+    # непридатний, а firestore.client() повертає клієнт, закешований у застосунку
+    name = f"smart-parking-{os.getpid()}"
+    try:
+        app = firebase_admin.get_app(name)
+    except ValueError:
+        # Certificate приймає словник - тимчасовий файл не потрібен
+        app = firebase_admin.initialize_app(credentials.Certificate(cred_data), name=name)
+    return firestore.client(app)
+
+
+class FirebaseConnector:
+    """
+    Підключення до Firestore у фоновому потоці.
+
+    state: disabled (немає credentials) → connecting → connected | failed.
+    failed - помилка конфігурації (немає SDK, некоректні credentials), яку
+    повтор не виправить; інші помилки повторюються з експоненційною затримкою
+    (state лишається connecting, остання помилка - в error).
+    on_connect(client) викликається у тому ж потоці після підключення.
+    """
+
+    def __init__(self, source, on_connect=None, connect=create_client, retry_base=1.0, retry_max=60.0):
+        self.source = source
+        self.state = 'disabled' if source is None else 'pending'
+        self.client = None
+        self.error = None
+        self.attempts = 0
+        self.connect_seconds = None
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._on_connect = on_connect
+        self._connect = connect
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        if source is None:
+            self._done.set()
+
+    @property
+    def configured(self):
+        return self.source is not None
+
+    def start(self):
+        """Запускає підключення (повторний виклик нічого не робить; після fork - перезапускає)"""
+        with self._lock:
+            if self.state in ('disabled', 'connected', 'failed'):
+                return
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.state = 'connecting'
+            self._done.clear()
+            self._thread = threading.Thread(target=self._run, name='firebase-connect', daemon=True)
+            self._thread.start()
+
+    def reset(self):
+        """
+        Скидання після fork: клієнт, слухачі й потік батьківського процесу
+        у воркері непридатні. Помилка конфігурації (failed) лишається.
+        """
+        self._lock = threading.Lock()
+        self._thread = None
+        self.client = None
+        self.attempts = 0
+        if self.source is not None and self.state != 'failed':
+            self.state = 'pending'
+            self.error = None
+            self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Чекає завершення підключення (і on_connect) або остаточної помилки"""
+        return self._done.wait(timeout)
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            client = self._connect_with_retry()
+        except ImportError:
+            self.state = 'failed'
+            self.error = 'Firebase Admin SDK не встановлено'
+            logger.warning("⚠️  Firebase Admin SDK не встановлено. Встановіть: pip install firebase-admin")
+        except ValueError as e:
+            # Некоректний JSON або не Service Account key - повтор не допоможе
+            self.state = 'failed'
+            self.error = str(e)
+            logger.error(f"⚠️  Помилка конфігурації Firebase ({self.source[0]}): {e}")
+        else:
+            self.client = client
+            self.error = None
+            self.connect_seconds = time.perf_counter() - started
+            self.state = 'connected'
+            logger.info(f"✅ Firebase підключено ({self.source[0]}) за {self.connect_seconds:.2f} с")
+            if self._on_connect is not None:
+                self._on_connect(client)
+        finally:
+            self._done.set()
+
+    def _connect_with_retry(self):
+        delay = self.retry_base
+        while True:
+            self.attempts += 1
+            try:
+                return self._connect(self.source)
+            except (ImportError, ValueError):
+                raise
+            except Exception as e:
+                self.error = str(e)
+                pause = delay * random.uniform(0.5, 1.0)
+                logger.error(f"⚠️  Помилка ініціалізації Firebase ({self.source[0]}, спроба {self.attempts}): {e}; "
+                             f"повтор через {pause:.1f} с")
+                time.sleep(pause)
+                delay = min(self.retry_max, delay * 2)
@@ -0,0 +1,210 @@
+"""
+Фонова (write-behind) синхронізація станів пристроїв з Firebase
+
+PUT лише ставить документ у чергу і одразу отримує номер синхронізації.
+Фоновий потік об'єднує оновлення одного device_id (записується тільки
+останній стан), комітить їх пакетами Firestore і повторює з експоненційною
+затримкою при помилках.
+
+Номери видає sequence: LocalSyncSequence у межах процесу або спільна для
+воркерів послідовність (state_backend.SharedSyncSequence), щоб статус
+номера можна було запитати в будь-якого воркера.
+"""
+
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Ліміт операцій в одному пакетному записі Firestore
+FIRESTORE_BATCH_LIMIT = 500
+
+
+class LocalSyncSequence:
+    """Номери синхронізації одного процесу"""
+
+    def __init__(self):
+        self.last = 0
+
+    def allocate(self, count):
+        """Резервує count номерів поспіль; повертає останній"""
+        self.last += count
+        return self.last
+
+    def report(self, outstanding):
+        pass
+
+    def committed(self, local_committed):
+        return local_committed
+
+
+class FirebaseSyncQueue:
+    """Черга синхронізації з об'єднанням оновлень по device_id"""
+
+    def __init__(self, get_db, collection='device_states', flush_interval=0.2,
+                 batch_size=FIRESTORE_BATCH_LIMIT, backoff_base=0.5, backoff_max=30.0,
+                 on_commit=None, is_enabled=None, sequence=None):
+        # get_db() повертає клієнт Firestore або None (вимкнено чи ще підключається)
+        self._get_db = get_db
+        # is_enabled() - чи приймати оновлення; під час підключення get_db() ще None,
+        # але оновлення мають накопичуватися в черзі, а не губитися
+        self._is_enabled = is_enabled or (lambda: get_db() is not None)
+        # on_commit(seconds, documents, error) після кожного пакетного запису (метрики)
+        self._on_commit = on_commit
+        self._sequence = sequence or LocalSyncSequence()
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.batch_size = min(batch_size, FIRESTORE_BATCH_LIMIT)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._cond = threading.Condition()
+        # device_id -> [document, first_seq, last_seq]
+        self._pending = {}
+        self._in_flight = {}
+        # Останній номер, виданий цьому процесу, і номер, до якого записано його оновлення
+        self._seq = 0
+        self._committed_seq = 0
+        self._thread = None
+        self.failures = 0
+        self.last_error = None
+
+    @property
+    def committed_seq(self):
+        return self._committed_seq
+
+    def enqueue(self, device_id, document):
+        """Ставить документ у чергу; повертає номер синхронізації (None без Firebase)"""
+        return self.enqueue_many({device_id: document})
+
+    def enqueue_many(self, documents):
+        """Ставить у чергу документи {device_id: document}; повертає останній seq"""
+        if not documents or not self._is_enabled():
+            return None
+        with self._cond:
+            last = self._sequence.allocate(len(documents))
+            for seq, (device_id, document) in enumerate(documents.items(), last - len(documents) + 1):
+                entry = self._pending.get(device_id)
+                if entry is None:
+                    self._pending[device_id] = [document, seq, seq]
+                else:
+                    # Об'єднуємо: лишається останній документ, але не найменший seq
+                    entry[0] = document
+                    entry[2] = seq
+            self._seq = last
+            self._ensure_worker()
+            self._cond.notify()
+            return self._seq
+
+    @property
+    def pending(self):
+        """Кількість пристроїв, що очікують запису"""
+        return len(self._pending) + len(self._in_flight)
+
+    def status(self, seq):
+        """Статус номера; committed_seq - спільний для всіх воркерів, pending і last_error - цього"""
+        committed = self._sequence.committed(self._committed_seq)
+        with self._cond:
+            return {
+                'seq': seq,
+                'committed_seq': committed,
+                'synced': seq <= committed,
+                'pending': self.pending,
+                'last_error': self.last_error
+            }
+
+    def wait(self, seq, timeout=None):
+        """Чекає, поки seq цього процесу буде закомічено (для тестів і завершення роботи)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._committed_seq < seq:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='firebase-sync', daemon=True)
+            self._thread.start()
+
+    def _update_watermark(self):
+        # Усе з seq нижче найстарішого незакоміченого запису вже у Firestore
+        outstanding = [entry[1] for entry in self._pending.values()]
+        outstanding += [entry[1] for entry in self._in_flight.values()]
+        lowest = min(outstanding) if outstanding else 0
+        self._committed_seq = (lowest - 1) if outstanding else self._seq
+        self._sequence.report(lowest)
+        self._cond.notify_all()
+
+    def _run(self):
+        attempt = 0
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Даємо оновленням накопичитися (слайдер шле десятки PUT за секунду)
+            time.sleep(self.flush_interval)
+            if self._get_db() is None:
+                # Firebase ще підключається: оновлення лишаються в черзі
+                continue
+            with self._cond:
+                self._in_flight, self._pending = self._pending, {}
+
+            try:
+                self._commit(self._in_flight)
+            except Exception as e:
+                attempt += 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)
+                with self._cond:
+                    self.failures += 1
+                    self.last_error = str(e)
+                    # Повертаємо в чергу все, що не перезаписано новішими оновленнями
+                    for device_id, entry in self._in_flight.items():
+                        newer = self._pending.get(device_id)
+                        if newer is None:
+                            self._pending[device_id] = entry
+                        else:
+                            newer[1] = entry[1]
+                    self._in_flight = {}
+                    self._update_watermark()
+                logger.error(f"❌ Помилка синхронізації з Firebase (спроба {attempt}): {e}; повтор через {delay:.1f} с")
+                time.sleep(delay)
+                continue
+
+            attempt = 0
+            with self._cond:
+                self.last_error = None
+                self._in_flight = {}
+                self._update_watermark()
+
+    def _commit(self, entries):
+        db = self._get_db()
+        if db is None:
+            raise RuntimeError("Firebase is not available")
+        collection = db.collection(self.collection)
+        items = list(entries.items())
+        for i in range(0, len(items), self.batch_size):
+            chunk = items[i:i + self.batch_size]
+            batch = db.batch()
+            for device_id, (document, _, _) in chunk:
+                batch.set(collection.document(device_id), document)
+            started = time.perf_counter()
+            try:
+                batch.commit()
+            except Exception as e:
+                if self._on_commit is not None:
+                    self._on_commit(time.perf_counter() - started, len(chunk), e)
+                raise
+            if self._on_commit is not None:
+                self._on_commit(time.perf_counter() - started, len(chunk), None)
+            # Закомічені частини не повторюємо при помилці наступних
+            with self._cond:
+                for device_id, _ in chunk:
+                    del entries[device_id]
+                self._update_watermark()
+        logger.info(f"☁️  Синхронізовано з Firebase: {len(items)} пристроїв, пакетів: {(len(items) - 1) // self.batch_size + 1}")
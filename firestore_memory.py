@@ -0,0 +1,188 @@
+"""
+Локальна заміна клієнта Firestore в пам'яті
+
+Підтримує ту частину API, яку використовує сервер: collection().document()
+.set()/.get()/.delete(), collection().stream(), пакетні записи db.batch() і слухачі
+змін collection().on_snapshot() (виклик - у потоці, що записує).
+Можна задати штучну затримку та помилки, щоб перевіряти черги й бенчмарки
+без мережі.
+"""
+
+import copy
+import enum
+import threading
+import time
+
+
+class ChangeType(enum.Enum):
+    ADDED = 1
+    MODIFIED = 2
+    REMOVED = 3
+
+
+class _DocumentChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class _Watch:
+    """Підписка on_snapshot; unsubscribe() зупиняє виклики"""
+
+    def __init__(self, store, collection, callback):
+        self._store = store
+        self.collection_name = collection
+        self.callback = callback
+
+    def unsubscribe(self):
+        with self._store._lock:
+            if self in self._store._watches:
+                self._store._watches.remove(self)
+
+
+class _Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class _DocumentRef:
+    def __init__(self, store, collection, doc_id):
+        self._store = store
+        self.collection_name = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self._store._round_trip()
+        self._store._write([(self.collection_name, self.id, data, merge)])
+
+    def delete(self):
+        self._store._round_trip()
+        self._store._write([(self.collection_name, self.id, None, False)])
+
+    def get(self):
+        self._store._round_trip()
+        with self._store._lock:
+            data = self._store._collections.get(self.collection_name, {}).get(self.id)
+            return _Snapshot(self.id, copy.deepcopy(data))
+
+
+class _CollectionRef:
+    def __init__(self, store, name):
+        self._store = store
+        self.name = name
+
+    def document(self, doc_id):
+        return _DocumentRef(self._store, self.name, doc_id)
+
+    def on_snapshot(self, callback):
+        """
+        Слухач змін як у Firestore: callback(docs, changes, read_time).
+
+        Перший виклик - усі документи колекції як ADDED, далі - лише змінені
+        (docs тут - змінені документи, у Firestore - уся колекція).
+        """
+        return self._store._watch(self.name, callback)
+
+    def stream(self):
+        self._store._round_trip()
+        with self._store._lock:
+            docs = list(self._store._collections.get(self.name, {}).items())
+        for doc_id, data in docs:
+            yield _Snapshot(doc_id, copy.deepcopy(data))
+
+
+class _WriteBatch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append((ref.collection_name, ref.id, data, merge))
+        return self
+
+    def commit(self):
+        if len(self._writes) > 500:
+            raise ValueError("A write batch can contain at most 500 operations")
+        self._store._round_trip()
+        self._store._write(self._writes)
+        self._writes = []
+
+
+class InMemoryFirestore:
+    """Мінімальний клієнт Firestore у пам'яті"""
+
+    def __init__(self, latency=0.0, fail_next=0):
+        self.latency = latency
+        # Кількість наступних запитів, які завершаться помилкою
+        self.fail_next = fail_next
+        self.round_trips = 0
+        self._collections = {}
+        self._watches = []
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        return _CollectionRef(self, name)
+
+    def batch(self):
+        return _WriteBatch(self)
+
+    def documents(self, collection):
+        """Поточний вміст колекції (для перевірок)"""
+        with self._lock:
+            return copy.deepcopy(self._collections.get(collection, {}))
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+            fail = self.fail_next > 0
+            if fail:
+                self.fail_next -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError("Simulated Firestore failure")
+
+    def _watch(self, collection, callback):
+        watch = _Watch(self, collection, callback)
+        with self._lock:
+            self._watches.append(watch)
+            docs = copy.deepcopy(self._collections.get(collection, {}))
+        snapshots = [_Snapshot(doc_id, data) for doc_id, data in docs.items()]
+        callback(snapshots, [_DocumentChange(ChangeType.ADDED, snapshot) for snapshot in snapshots], time.time())
+        return watch
+
+    def _write(self, writes):
+        changes = {}
+        with self._lock:
+            for collection, doc_id, data, merge in writes:
+                docs = self._collections.setdefault(collection, {})
+                if data is None:
+                    # Видалення: слухачі отримують REMOVED з останнім вмістом документа
+                    if doc_id in docs:
+                        changes.setdefault(collection, {})[doc_id] = (ChangeType.REMOVED, docs.pop(doc_id))
+                    continue
+                change_type = ChangeType.MODIFIED if doc_id in docs else ChangeType.ADDED
+                if merge and doc_id in docs:
+                    docs[doc_id].update(copy.deepcopy(data))
+                else:
+                    docs[doc_id] = copy.deepcopy(data)
+                changes.setdefault(collection, {})[doc_id] = (change_type, copy.deepcopy(docs[doc_id]))
+            watches = [watch for watch in self._watches if watch.collection_name in changes]
+        # Слухачі викликаються поза блокуванням, як фонові потоки Firestore
+        for watch in watches:
+            changed = changes[watch.collection_name]
+            snapshots = [_Snapshot(doc_id, data) for doc_id, (_, data) in changed.items()]
+            watch.callback(
+                snapshots,
+                [_DocumentChange(change_type, snapshot)
+                 for (change_type, _), snapshot in zip(changed.values(), snapshots)],
+                time.time()
+            )
@@ -0,0 +1,274 @@
+"""
+Історія знімків сенсорів у колонковому кільцевому буфері
+
+Сирі знімки зберігаються в обмеженому кільці (NumPy-масив, колонка на метрику),
+а паралельно ведуться кільця попередньо агрегованих бакетів (min/max/sum/count)
+з роздільністю 1 хв, 5 хв і 1 год. Запит за добу читає кілька сотень готових
+бакетів замість сканування всіх тіків. Якщо вказано каталог, кільця
+відображаються у файли (np.memmap) і переживають перезапуск.
+
+Файли історії спільні для всіх воркерів gunicorn: запис і читання виконуються
+під блокуванням файлу (flock), а знімок, уже записаний іншим воркером
+(той самий тік SSE), пропускається за міткою часу.
+"""
+
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # Windows: блокування лише в межах процесу
+    FCNTL_AVAILABLE = False
+
+METRICS = ('free_spots', 'parking_occupied', 'co_level', 'nox_level', 'temperature')
+
+# Рядки кілець - float64 (мітки часу в мс точно представляються до 2^53)
+# Сире кільце: [timestamp, метрики...]
+RAW_VALUES = slice(1, 1 + len(METRICS))
+RAW_WIDTH = 1 + len(METRICS)
+# Кільце бакетів: [timestamp, count, min..., max..., sum...]
+_K = len(METRICS)
+BUCKET_COUNT = 1
+BUCKET_MIN = slice(2, 2 + _K)
+BUCKET_MAX = slice(2 + _K, 2 + 2 * _K)
+BUCKET_SUM = slice(2 + 2 * _K, 2 + 3 * _K)
+BUCKET_WIDTH = 2 + 3 * _K
+
+# (роздільність у секундах, місткість): 7 діб по 1 хв, 30 діб по 5 хв, рік по 1 год
+DEFAULT_LEVELS = ((60, 10080), (300, 8640), (3600, 8760))
+
+
+class _Ring:
+    """Кільце рядків фіксованої ширини (у пам'яті або у файлі)"""
+
+    def __init__(self, width, capacity, path=None):
+        self.capacity = capacity
+        if path is None:
+            self.data = np.zeros((capacity, width), dtype=np.float64)
+            self.meta = np.zeros(2, dtype=np.int64)
+            self._maps = ()
+        else:
+            self._maps = (
+                self._open_memmap(f"{path}.dat", np.float64, (capacity, width)),
+                self._open_memmap(f"{path}.meta", np.int64, (2,)),
+            )
+            # Звичайні ndarray-представлення: операції над np.memmap помітно повільніші
+            self.data, self.meta = (m.view(np.ndarray) for m in self._maps)
+            if not 0 <= self.meta[1] <= capacity:
+                self.meta[:] = 0
+
+    @staticmethod
+    def _open_memmap(filename, dtype, shape):
+        expected = np.dtype(dtype).itemsize * int(np.prod(shape))
+        mode = 'r+' if os.path.exists(filename) and os.path.getsize(filename) == expected else 'w+'
+        return np.memmap(filename, dtype=dtype, mode=mode, shape=shape)
+
+    # meta = [head, count]: head - індекс наступного запису
+    @property
+    def head(self):
+        return int(self.meta[0])
+
+    @property
+    def count(self):
+        return int(self.meta[1])
+
+    def first(self):
+        return self.data[(self.head - self.count) % self.capacity] if self.count else None
+
+    def last(self):
+        return self.data[(self.head - 1) % self.capacity] if self.count else None
+
+    def push(self):
+        """Займає наступний слот і повертає його індекс"""
+        idx = self.head
+        self.meta[0] = (idx + 1) % self.capacity
+        self.meta[1] = min(self.capacity, self.count + 1)
+        return idx
+
+    def ordered(self):
+        """Записи в хронологічному порядку"""
+        if self.count < self.capacity:
+            return self.data[:self.count]
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+    def flush(self):
+        for mapped in self._maps:
+            mapped.flush()
+
+
+class SensorHistory:
+    """Обмежена історія знімків з попередньо агрегованими бакетами"""
+
+    def __init__(self, capacity=17280, levels=DEFAULT_LEVELS, path=None):
+        if path:
+            os.makedirs(path, exist_ok=True)
+            atexit.register(self.flush)
+
+        def ring_path(name):
+            return os.path.join(path, name) if path else None
+
+        self._thread_lock = threading.Lock()
+        self._lock_path = ring_path('history.lock') if FCNTL_AVAILABLE else None
+        self._fd = None
+        self._pid = None
+        # Створення файлів теж під блокуванням: інший воркер міг саме їх ініціалізувати
+        with self._lock():
+            self.raw = _Ring(RAW_WIDTH, capacity, ring_path('raw'))
+            self.levels = [
+                (resolution, _Ring(BUCKET_WIDTH, level_capacity, ring_path(f"agg_{resolution}s")))
+                for resolution, level_capacity in sorted(levels)
+            ]
+
+    def _lock(self):
+        """Блокування кілець: у пам'яті - лише потоків, з файлами - ще й flock"""
+        if self._lock_path is None:
+            return self._thread_lock
+        return self._file_lock()
+
+    @contextmanager
+    def _file_lock(self):
+        if self._pid != os.getpid():
+            # Після fork: власний дескриптор, інакше flock спільний з батьківським процесом
+            self._fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+            self._thread_lock = threading.Lock()
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return self.raw.count
+
+    def append(self, snapshot):
+        """
+        Додає знімок у сире кільце і в поточні бакети кожного рівня.
+
+        Знімок не новіший за останній записаний пропускається: це той самий тік
+        від іншого воркера або запізнілий потік (кільце лишається відсортованим).
+        """
+        timestamp = int(snapshot['timestamp'])
+        values = np.array([snapshot[m] for m in METRICS], dtype=np.float64)
+        with self._lock():
+            last = self.raw.last()
+            if last is not None and last[0] >= timestamp:
+                return False
+            row = self.raw.data[self.raw.push()]
+            row[0] = timestamp
+            row[RAW_VALUES] = values
+            for resolution, ring in self.levels:
+                self._aggregate(ring, timestamp - timestamp % (resolution * 1000), values)
+        return True
+
+    @staticmethod
+    def _aggregate(ring, bucket_start, values):
+        last = ring.last()
+        if last is not None and last[0] >= bucket_start:
+            # Той самий бакет - оновлюємо на місці
+            last[BUCKET_COUNT] += 1
+            np.minimum(last[BUCKET_MIN], values, out=last[BUCKET_MIN])
+            np.maximum(last[BUCKET_MAX], values, out=last[BUCKET_MAX])
+            last[BUCKET_SUM] += values
+            return
+        row = ring.data[ring.push()]
+        row[0] = bucket_start
+        row[BUCKET_COUNT] = 1
+        row[BUCKET_MIN] = row[BUCKET_MAX] = row[BUCKET_SUM] = values
+
+    def default_step(self, start, end, points=300):
+        """
+        Крок (с) для ~points бакетів на [start, end), кратний роздільності рівня.
+
+        Некратний крок довелося б збирати з бакетів дрібнішого рівня, тож
+        він округлюється вгору до кратного найгрубшого рівня, що не більший за нього.
+        """
+        step = max(5, (end - start) // 1000 // points)
+        fitting = [resolution for resolution, _ in self.levels if resolution <= step]
+        if fitting:
+            step = -(-step // fitting[-1]) * fitting[-1]
+        return step
+
+    def _source(self, start, step):
+        """
+        (кільце, роздільність) для запиту; викликається під self._lock().
+
+        Найгрубший рівень, роздільність якого ділить step, інакше - найгрубший
+        не більший за step (бакети перегруповуються). Сирі знімки - лише якщо
+        step дрібніший за всі рівні і сире кільце ще покриває start.
+        """
+        fitting = [(resolution, ring) for resolution, ring in self.levels if resolution <= step]
+        exact = [(resolution, ring) for resolution, ring in fitting if step % resolution == 0]
+        if fitting:
+            resolution, ring = (exact or fitting)[-1]
+            return ring, resolution
+        oldest = self.raw.first()
+        if self.levels and oldest is not None and oldest[0] > start:
+            resolution, ring = self.levels[0]
+            if ring.count and ring.first()[0] < oldest[0]:
+                return ring, resolution
+        return self.raw, 0
+
+    def query(self, start, end, step):
+        """
+        Бакети [start, end) кроком step секунд: min/max/avg кожної метрики.
+
+        Джерело вибирає _source: рівень агрегатів або сирі знімки.
+        """
+        step_ms = max(1, int(step * 1000))
+        start -= start % step_ms
+
+        with self._lock():
+            source, resolution = self._source(start, step)
+            records = source.ordered()
+            lo, hi = np.searchsorted(records[:, 0], [start, end], side='left')
+            records = np.array(records[lo:hi])
+
+        result = {
+            'from': start,
+            'to': end,
+            'step': step,
+            'resolution': resolution,
+            'timestamps': [],
+            'count': [],
+            **{metric: {'min': [], 'max': [], 'avg': []} for metric in METRICS}
+        }
+        if not len(records):
+            return result
+
+        # Межі вихідних бакетів по відсортованих часових мітках
+        bucket_ids = (records[:, 0].astype(np.int64) - start) // step_ms
+        starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+        if resolution:
+            counts = records[:, BUCKET_COUNT]
+            mins, maxs, sums = records[:, BUCKET_MIN], records[:, BUCKET_MAX], records[:, BUCKET_SUM]
+        else:
+            counts = np.ones(len(records))
+            mins = maxs = sums = records[:, RAW_VALUES]
+        total = np.add.reduceat(counts, starts)
+        avg = np.add.reduceat(sums, starts, axis=0) / total[:, None]
+        mins = np.minimum.reduceat(mins, starts, axis=0)
+        maxs = np.maximum.reduceat(maxs, starts, axis=0)
+
+        result['timestamps'] = (start + bucket_ids[starts] * step_ms).tolist()
+        result['count'] = total.astype(np.int64).tolist()
+        for j, metric in enumerate(METRICS):
+            result[metric] = {
+                'min': np.round(mins[:, j], 2).tolist(),
+                'max': np.round(maxs[:, j], 2).tolist(),
+                'avg': np.round(avg[:, j], 2).tolist(),
+            }
+        return result
+
+    def flush(self):
+        with self._lock():
+            self.raw.flush()
+            for _, ring in self.levels:
+                ring.flush()
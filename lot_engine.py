@@ -0,0 +1,132 @@
+"""
+Векторизований рушій симуляції для багатьох парковок (NumPy)
+
+Стан зберігається масивами N парковок × M місць і оновлюється одним
+векторизованим кроком з тими самими зв'язками CO/NOx/температура,
+що й у generate_sensor_data().
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from sensor_simulator import base_temperature
+
+
+def parse_lot_ids(value, default='lot_1'):
+    """PARKING_LOTS: кількість ("250") або список id через кому ("lot_a,lot_b")"""
+    value = (value or default).strip()
+    if value.isdigit():
+        return [f"lot_{i}" for i in range(1, int(value) + 1)]
+    return [lot_id.strip() for lot_id in value.split(',') if lot_id.strip()]
+
+
+class LotSimulationEngine:
+    """Симуляція N парковок по M місць за один векторизований крок"""
+
+    def __init__(self, lot_ids, spots_per_lot=100, interval=5.0, seed=None):
+        self.lot_ids = list(lot_ids)
+        self._index = {lot_id: i for i, lot_id in enumerate(self.lot_ids)}
+        if len(self._index) != len(self.lot_ids):
+            raise ValueError("lot_ids must be unique")
+        self.spots_per_lot = spots_per_lot
+        self.interval = interval
+        self.rng = np.random.default_rng(seed)
+
+        n = len(self.lot_ids)
+        self.free_spots = np.full(n, spots_per_lot // 2, dtype=np.int32)
+        self.co_level = np.full(n, 50.0)
+        self.nox_level = np.full(n, 30.0)
+        self.temperature = np.full(n, 7.5)
+        self.parking_sensors = np.zeros((n, spots_per_lot), dtype=np.uint8)
+        self.time_counter = 0
+        self.timestamp = int(time.time() * 1000)
+
+        self._lock = threading.Lock()
+        self._last_step = None
+        # Допоміжні масиви, щоб не виділяти пам'ять на кожному кроці
+        self._rows = np.arange(n)[:, None]
+        self._ranks = np.empty((n, spots_per_lot), dtype=np.int32)
+        self._spot_range = np.arange(spots_per_lot, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.lot_ids)
+
+    def __contains__(self, lot_id):
+        return lot_id in self._index
+
+    def step(self):
+        """Один тік для всіх парковок"""
+        rng = self.rng
+        n = len(self.lot_ids)
+        m = self.spots_per_lot
+        self.time_counter += 1
+
+        # Вільні місця
+        change = rng.integers(-3, 4, size=n)
+        np.clip(self.free_spots + change, 0, m, out=self.free_spots)
+        occupied = m - self.free_spots
+        occupied_ratio = occupied / float(m)
+
+        # CO залежно від кількості машин + шум і рідкісні аномалії
+        base_co = occupied_ratio * 200.0 + 20.0
+        noise = rng.uniform(-10, 10, size=n)
+        anomaly = np.where(rng.random(n) < 0.05, rng.uniform(-50, 50, size=n), 0.0)
+        np.clip(base_co + noise + anomaly, 0, 500, out=self.co_level)
+
+        # NOx
+        base_nox = occupied_ratio * 150.0 + 15.0
+        noise = rng.uniform(-8, 8, size=n)
+        np.clip(base_nox + noise, 0, 500, out=self.nox_level)
+
+        # Температура: час доби + вплив CO + шум
+        co_effect = (self.co_level / 500.0) * 2.0
+        noise = rng.uniform(-0.75, 0.75, size=n)
+        np.clip(base_temperature(self.time_counter) + co_effect + noise, 5.0, 10.0, out=self.temperature)
+
+        # Масив датчиків: випадкові `occupied` місць у кожному ряду + 5% шуму
+        order = np.argsort(rng.random((n, m), dtype=np.float32), axis=1)
+        self._ranks[self._rows, order] = self._spot_range
+        np.less(self._ranks, occupied[:, None], out=self.parking_sensors, casting='unsafe')
+        self.parking_sensors ^= (rng.random((n, m), dtype=np.float32) < 0.05)
+
+        self.timestamp = int(time.time() * 1000)
+        self._last_step = time.monotonic()
+
+    def maybe_step(self, min_interval=None):
+        """Робить крок, якщо з попереднього минуло не менше min_interval (за замовчуванням interval) секунд"""
+        if min_interval is None:
+            min_interval = self.interval
+        with self._lock:
+            if self._last_step is None or time.monotonic() - self._last_step >= min_interval:
+                self.step()
+
+    def lot_index(self, lot_id):
+        return self._index[lot_id]
+
+    def snapshots(self, lot_ids):
+        """Знімки у форматі /api/sensor-data для вказаних парковок"""
+        with self._lock:
+            idx = np.fromiter((self._index[lot_id] for lot_id in lot_ids), dtype=np.intp)
+            m = float(self.spots_per_lot)
+            free = self.free_spots[idx].tolist()
+            occupied = ((self.spots_per_lot - self.free_spots[idx]) / m).tolist()
+            co = np.round(self.co_level[idx], 2).tolist()
+            nox = np.round(self.nox_level[idx], 2).tolist()
+            temp = np.round(self.temperature[idx], 2).tolist()
+            sensors = self.parking_sensors[idx].tolist()
+            timestamp = self.timestamp
+        return [
+            {
+                'lot_id': lot_id,
+                'timestamp': timestamp,
+                'parking_sensors': sensors[i],
+                'parking_occupied': occupied[i],
+                'free_spots': free[i],
+                'co_level': co[i],
+                'nox_level': nox[i],
+                'temperature': temp[i]
+            }
+            for i, lot_id in enumerate(lot_ids)
+        ]
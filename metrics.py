@@ -0,0 +1,225 @@
+"""
+Метрики у форматі Prometheus з мінімальними накладними витратами
+
+Запис іде в один з SHARDS шардів (словник з власним блокуванням), вибраний
+за id потоку: потоки рідко ділять шард, тож блокування майже не конкурують,
+а потік на кожен запит (werkzeug threaded) не створює нових шардів. Значення
+шардів сумуються лише при зчитуванні GET /api/metrics. Реєстр з
+enabled=False повертає порожні метрики, виклики яких нічого не роблять.
+
+Значення належать одному процесу: за кількох воркерів кожен зразок має
+мітку worker (pid), а сумування по воркерах виконує Prometheus.
+"""
+
+import os
+import threading
+import weakref
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Межі гістограм затримок, секунди
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Кількість шардів метрики; просте число - id потоків (адреси стеків) вирівняні
+SHARDS = 31
+
+# Метрики процесу: після fork блокування шардів створюються заново
+_sharded = weakref.WeakSet()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, *extra):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(pair for pair in extra if pair)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ShardedMetric:
+    """Основа метрик: шард за id потоку, сума шардів при зчитуванні"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # [(словник значень, блокування)]
+        self._shards = [({}, threading.Lock()) for _ in range(SHARDS)]
+        _sharded.add(self)
+
+    def _shard(self):
+        return self._shards[threading.get_ident() % SHARDS]
+
+    def _reset_locks(self):
+        # Потік батьківського процесу міг тримати блокування під час fork
+        self._shards = [(values, threading.Lock()) for values, _ in self._shards]
+
+    def values(self):
+        """Сума всіх шардів: {мітки: значення}"""
+        totals = {}
+        for shard, lock in self._shards:
+            with lock:
+                self._merge(totals, shard)
+        return totals
+
+    def render(self, const=''):
+        """Рядки експозиції; const - спільні для всіх зразків мітки ('worker="123"')"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples(const))
+        return lines
+
+
+class Counter(_ShardedMetric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        values, lock = self._shard()
+        with lock:
+            values[labels] = values.get(labels, 0) + amount
+
+    @staticmethod
+    def _merge(totals, shard):
+        for key, value in shard.items():
+            totals[key] = totals.get(key, 0) + value
+
+    def _samples(self, const=''):
+        return [f'{self.name}{_labels(self.labelnames, key, const)} {_number(value)}'
+                for key, value in sorted(self.values().items())]
+
+
+class Gauge(Counter):
+    """Значення, що зростає і зменшується (наприклад, запити в обробці)"""
+
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class CallbackGauge:
+    """Gauge, значення якого обчислюється функцією при зчитуванні"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, func):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+
+    def render(self, const=''):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge',
+                f'{self.name}{_labels((), (), const)} {_number(self.func())}']
+
+
+class Histogram(_ShardedMetric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        values, lock = self._shard()
+        with lock:
+            row = values.get(labels)
+            if row is None:
+                # [лічильники кошиків..., +Inf, сума]
+                row = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    @staticmethod
+    def _merge(totals, shard):
+        for key, row in shard.items():
+            total = totals.get(key)
+            if total is None:
+                totals[key] = list(row)
+            else:
+                for i, value in enumerate(row):
+                    total[i] += value
+
+    def _samples(self, const=''):
+        lines = []
+        bounds = self.buckets + (float('inf'),)
+        for key, row in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, row):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, const, le)} {cumulative}')
+            labels = _labels(self.labelnames, key, const)
+            lines.append(f'{self.name}_sum{labels} {_number(row[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def _reset_locks_after_fork():
+    for metric in list(_sharded):
+        metric._reset_locks()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+class _NullMetric:
+    """Метрика вимкненого реєстру"""
+
+    def inc(self, labels=(), amount=1):
+        pass
+
+    dec = inc
+
+    def observe(self, value, labels=()):
+        pass
+
+
+_NULL = _NullMetric()
+
+
+class MetricsRegistry:
+    """Набір метрик застосунку; METRICS_ENABLED=false вимикає збір повністю"""
+
+    def __init__(self, enabled=True, worker_label='worker'):
+        self.enabled = enabled
+        # Мітка процесу для кожного зразка (None - без неї)
+        self.worker_label = worker_label
+        self._metrics = []
+
+    def _register(self, metric):
+        if not self.enabled:
+            return _NULL
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def gauge_callback(self, name, documentation, func):
+        return self._register(CallbackGauge(name, documentation, func))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Текстовий формат експозиції Prometheus"""
+        # pid читається при кожному зчитуванні: після fork воркер має власний
+        const = f'{self.worker_label}="{os.getpid()}"' if self.worker_label else ''
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(const))
+        return '\n'.join(lines) + '\n'
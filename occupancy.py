@@ -0,0 +1,239 @@
+"""
+Інкрементна модель зайнятості паркомісць
+
+Зайнятість зберігається бітсетом (np.uint64, біт i - місце i), а кількість
+зайнятих місць - лічильниками сегментів (рівень × зона), які змінюються
+разом із бітами. Тік змінює лише місця, куди приїхали або звідки поїхали
+машини, тому free_spots завжди дорівнює кількості нулів у parking_sensors,
+а стан місць зберігається між тіками. Усі операції векторні (NumPy), без
+Python-циклів по місцях, що дозволяє моделювати 100k+ місць.
+"""
+
+import string
+
+import numpy as np
+
+_ONE = np.uint64(1)
+_ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+# Розмір вікна пошуку вільних місць (місць за одну векторну операцію)
+_SCAN_CHUNK = 4096
+
+
+class OccupancyModel:
+    """Бітсет зайнятості з лічильниками по рівнях і зонах"""
+
+    def __init__(self, spots=100, levels=1, zones_per_level=1, rng=None):
+        if spots <= 0 or levels <= 0 or zones_per_level <= 0:
+            raise ValueError('spots, levels and zones_per_level must be positive')
+        if zones_per_level > len(string.ascii_uppercase):
+            raise ValueError(f'At most {len(string.ascii_uppercase)} zones per level')
+        if levels * zones_per_level > spots:
+            raise ValueError('Every zone must have at least one spot')
+        self.spots = spots
+        self.levels = levels
+        self.zones_per_level = zones_per_level
+        self.zone_names = list(string.ascii_uppercase[:zones_per_level])
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # Сегмент s = рівень s // zones_per_level, зона s % zones_per_level;
+        # місця сегмента - [starts[s], starts[s + 1])
+        segments = levels * zones_per_level
+        self.starts = np.arange(segments + 1, dtype=np.int64) * spots // segments
+        self.words = np.zeros((spots + 63) // 64, dtype='<u8')
+        self.counts = np.zeros(segments, dtype=np.int64)
+
+    def bind(self, words, counts, copy=True):
+        """
+        Переносить стан у зовнішні масиви (наприклад, спільна пам'ять).
+
+        copy=True - записати поточний стан у масиви, False - прийняти їхній стан.
+        """
+        if copy:
+            words[:] = self.words
+            counts[:] = self.counts
+        self.words = words
+        self.counts = counts
+
+    def reseed(self):
+        """Новий стан генератора (після fork воркери не мають повторювати вибір місць)"""
+        self.rng = np.random.default_rng()
+
+    @property
+    def occupied(self):
+        # Лічильників небагато: sum() по списку швидший за ndarray.sum()
+        return sum(self.counts.tolist())
+
+    @property
+    def free(self):
+        return self.spots - self.occupied
+
+    # --- Біти -------------------------------------------------------------
+
+    def _masks(self, spots):
+        return np.left_shift(_ONE, (spots & 63).astype(np.uint64))
+
+    def _test(self, spots):
+        """1 для зайнятих місць з масиву індексів"""
+        return (self.words[spots >> 6] >> (spots & 63).astype(np.uint64)) & _ONE
+
+    def bits(self, start=0, end=None):
+        """Зайнятість місць [start, end) масивом uint8 (0/1)"""
+        end = self.spots if end is None else end
+        first, last = start >> 6, (end + 63) >> 6
+        unpacked = np.unpackbits(self.words[first:last].view(np.uint8), bitorder='little')
+        offset = start - first * 64
+        return unpacked[offset:offset + end - start]
+
+    def to_list(self):
+        """parking_sensors: 0 = вільне, 1 = зайняте"""
+        return self.bits().tolist()
+
+    def is_occupied(self, spot):
+        return bool(self._test(np.array([spot], dtype=np.int64))[0])
+
+    def segment_of(self, spots):
+        return np.searchsorted(self.starts, spots, side='right') - 1
+
+    def _count(self, spots, sign):
+        if len(self.counts) == 1:
+            self.counts[0] += sign * len(spots)
+        else:
+            np.add.at(self.counts, self.segment_of(spots), sign)
+
+    def occupy(self, spots):
+        """Позначає вільні місця (унікальні індекси) зайнятими"""
+        np.bitwise_or.at(self.words, spots >> 6, self._masks(spots))
+        self._count(spots, 1)
+
+    def release(self, spots):
+        """Позначає зайняті місця (унікальні індекси) вільними"""
+        np.bitwise_and.at(self.words, spots >> 6, ~self._masks(spots) & _ALL)
+        self._count(spots, -1)
+
+    # --- Тік --------------------------------------------------------------
+
+    def _sample(self, count, occupied):
+        """count випадкових різних місць із заданим станом"""
+        pool = self.occupied if occupied else self.free
+        count = min(count, pool)
+        if count <= 0:
+            return np.empty(0, dtype=np.int64)
+        if self.spots <= _SCAN_CHUNK or count * 4 > pool or pool * 8 < self.spots:
+            # Мала парковка або мало кандидатів: вибір зі списку всіх місць потрібного стану
+            candidates = np.flatnonzero(self.bits() == occupied)
+            if len(candidates) <= _SCAN_CHUNK:
+                return candidates[self.rng.permutation(len(candidates))[:count]]
+            return self.rng.choice(candidates, count, replace=False)
+        # Рідкісні зміни серед багатьох кандидатів: випадкові спроби з перевіркою біта
+        # (кандидатів щонайменше 1/8, тому вистачає кількох спроб на місце)
+        hits = np.empty(0, dtype=np.int64)
+        while True:
+            draw = self.rng.integers(0, self.spots, size=count * 4 + 16)
+            hits = np.concatenate([hits, draw[self._test(draw) == occupied]])
+            # Без повторів, у порядку випадання
+            _, first = np.unique(hits, return_index=True)
+            if len(first) >= count:
+                return hits[np.sort(first)[:count]]
+
+    def set_occupied(self, target):
+        """
+        Приводить кількість зайнятих місць до target.
+
+        Приїзди займають випадкові вільні місця, від'їзди звільняють випадкові
+        зайняті; решта місць не змінюється. Повертає (arrived, departed).
+        """
+        delta = max(0, min(self.spots, target)) - self.occupied
+        arrived = departed = np.empty(0, dtype=np.int64)
+        if delta > 0:
+            arrived = self._sample(delta, occupied=False)
+            self.occupy(arrived)
+        elif delta < 0:
+            departed = self._sample(-delta, occupied=True)
+            self.release(departed)
+        return arrived, departed
+
+    # --- Запити -----------------------------------------------------------
+
+    def segments(self, level=None, zone=None):
+        """Номери сегментів для рівня (1..levels) і/або зони ('A'..)"""
+        zones = self.zones_per_level
+        result = []
+        for segment in range(self.levels * zones):
+            if level is not None and segment // zones + 1 != level:
+                continue
+            if zone is not None and self.zone_names[segment % zones] != zone:
+                continue
+            result.append(segment)
+        return result
+
+    def free_count(self, level=None, zone=None):
+        """Кількість вільних місць у зоні/рівні (з лічильників, без сканування)"""
+        segments = self.segments(level, zone)
+        sizes = self.starts[np.add(segments, 1)] - self.starts[segments]
+        return int(sizes.sum() - self.counts[segments].sum())
+
+    def describe(self, spots):
+        """Рівень і зона для місця або списку місць"""
+        if np.ndim(spots) == 0:
+            return self.describe([spots])[0]
+        segments = self.segment_of(spots).tolist()
+        zones = self.zones_per_level
+        return [
+            {'spot': int(spot), 'level': segment // zones + 1, 'zone': self.zone_names[segment % zones]}
+            for spot, segment in zip(spots, segments)
+        ]
+
+    def find_free(self, level=None, zone=None, limit=50):
+        """Перші limit вільних місць у зоні/рівні (сканування вікнами)"""
+        found = []
+        for segment in self.segments(level, zone):
+            start, end = int(self.starts[segment]), int(self.starts[segment + 1])
+            if self.counts[segment] == end - start:
+                continue
+            for chunk in range(start, end, _SCAN_CHUNK):
+                free = np.flatnonzero(self.bits(chunk, min(end, chunk + _SCAN_CHUNK)) == 0) + chunk
+                found.extend(free[:limit - len(found)].tolist())
+                if len(found) >= limit:
+                    return found
+        return found
+
+    def nearest_free(self, spot):
+        """Найближче вільне місце на тому ж рівні (за номером місця) або None"""
+        zones = self.zones_per_level
+        level = int(self.segment_of(spot)) // zones
+        low, high = int(self.starts[level * zones]), int(self.starts[(level + 1) * zones])
+        radius = 64
+        while True:
+            start, end = max(low, spot - radius), min(high, spot + radius + 1)
+            free = np.flatnonzero(self.bits(start, end) == 0) + start
+            if len(free):
+                return int(free[np.argmin(np.abs(free - spot))])
+            if start == low and end == high:
+                return None
+            radius *= 4
+
+    def summary(self):
+        """Зайнятість загалом, по рівнях і по зонах"""
+        sizes = np.diff(self.starts)
+        zones = []
+        for segment, (size, occupied) in enumerate(zip(sizes.tolist(), self.counts.tolist())):
+            zones.append({
+                'level': segment // self.zones_per_level + 1,
+                'zone': self.zone_names[segment % self.zones_per_level],
+                'spots': size,
+                'occupied': occupied,
+                'free': size - occupied,
+            })
+        by_level = self.counts.reshape(self.levels, self.zones_per_level).sum(axis=1)
+        level_sizes = sizes.reshape(self.levels, self.zones_per_level).sum(axis=1)
+        levels = [
+            {'level': i + 1, 'spots': size, 'occupied': occupied, 'free': size - occupied}
+            for i, (size, occupied) in enumerate(zip(level_sizes.tolist(), by_level.tolist()))
+        ]
+        occupied = self.occupied
+        return {
+            'spots': self.spots,
+            'occupied': occupied,
+            'free': self.spots - occupied,
+            'levels': levels,
+            'zones': zones,
+        }
@@ -0,0 +1,167 @@
+"""
+Потокова аналітика показників сенсорів
+
+Для CO, NOx, температури і зайнятості підтримуються ковзні вікна 1 хв /
+15 хв / 1 год (за timestamp знімків). У кожному вікні середнє і дисперсія
+оновлюються алгоритмом Велфорда (додавання і вилучення значення), а
+мінімум і максимум - монотонними чергами, тому тік коштує O(1) амортизовано
+незалежно від розміру вікна.
+
+Аномалія - значення, z-оцінка якого відносно базового вікна (до додавання
+значення) перевищує поріг.
+"""
+
+import math
+import threading
+from collections import deque
+
+WINDOWS = (('1m', 60), ('15m', 15 * 60), ('1h', 60 * 60))
+METRICS = ('co_level', 'nox_level', 'temperature', 'parking_occupied')
+
+
+class RollingStats:
+    """Середнє, дисперсія, мінімум і максимум значень за останні span_ms"""
+
+    def __init__(self, span_ms):
+        self.span_ms = span_ms
+        # (timestamp, значення); монотонні черги містять ті самі об'єкти,
+        # тож елемент, що вийшов з вікна, впізнається за тотожністю (is)
+        self._values = deque()
+        self._min = deque()
+        self._max = deque()
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, timestamp, value):
+        values = self._values
+        if values and values[0][0] <= timestamp - self.span_ms:
+            self.expire(timestamp)
+        item = (timestamp, value)
+        values.append(item)
+        # Монотонні черги: на початку - мінімум/максимум вікна
+        window_min = self._min
+        while window_min and window_min[-1][1] >= value:
+            window_min.pop()
+        window_min.append(item)
+        window_max = self._max
+        while window_max and window_max[-1][1] <= value:
+            window_max.pop()
+        window_max.append(item)
+        self.count = count = self.count + 1
+        delta = value - self.mean
+        self.mean = mean = self.mean + delta / count
+        self._m2 += delta * (value - mean)
+
+    def expire(self, now):
+        """Вилучає значення, старші за span_ms від now"""
+        cutoff = now - self.span_ms
+        values = self._values
+        while values and values[0][0] <= cutoff:
+            item = values.popleft()
+            if self._min[0] is item:
+                self._min.popleft()
+            if self._max[0] is item:
+                self._max.popleft()
+            self.count -= 1
+            if not self.count:
+                self.mean = self._m2 = 0.0
+                continue
+            value = item[1]
+            delta = value - self.mean
+            self.mean -= delta / self.count
+            # Похибка округлення не повинна зробити дисперсію від'ємною
+            self._m2 = max(0.0, self._m2 - delta * (value - self.mean))
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0, 'mean': None, 'std': None, 'variance': None, 'min': None, 'max': None}
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 4),
+            'std': round(self.std, 4),
+            'variance': round(self.variance, 4),
+            'min': self._min[0][1],
+            'max': self._max[0][1],
+        }
+
+
+class SensorAnalytics:
+    """Ковзні вікна для кожного показника і журнал аномалій"""
+
+    def __init__(self, windows=WINDOWS, metrics=METRICS, z_threshold=3.0, baseline='15m',
+                 min_samples=12, max_anomalies=100):
+        self.windows = dict(windows)
+        if baseline not in self.windows:
+            raise ValueError(f"Unknown baseline window: {baseline}")
+        self.metrics = tuple(metrics)
+        self.z_threshold = z_threshold
+        self.baseline = baseline
+        self.min_samples = min_samples
+        self._stats = {
+            name: {metric: RollingStats(seconds * 1000) for metric in self.metrics}
+            for name, seconds in self.windows.items()
+        }
+        self._anomalies = deque(maxlen=max_anomalies)
+        self._lock = threading.Lock()
+        self.last_timestamp = None
+
+    def update(self, snapshot):
+        """Додає знімок у всі вікна; повертає аномалії цього знімка"""
+        timestamp = snapshot['timestamp']
+        anomalies = []
+        with self._lock:
+            self.last_timestamp = timestamp
+            baseline = self._stats[self.baseline]
+            for metric in self.metrics:
+                value = snapshot.get(metric)
+                if value is None:
+                    continue
+                reference = baseline[metric]
+                reference.expire(timestamp)
+                if reference.count >= self.min_samples:
+                    std = reference.std
+                    if std > 0:
+                        z = (value - reference.mean) / std
+                        if abs(z) >= self.z_threshold:
+                            anomalies.append({
+                                'timestamp': timestamp,
+                                'metric': metric,
+                                'value': value,
+                                'mean': round(reference.mean, 4),
+                                'std': round(std, 4),
+                                'z_score': round(z, 2),
+                            })
+                for window in self._stats.values():
+                    window[metric].add(timestamp, value)
+            self._anomalies.extend(anomalies)
+        return anomalies
+
+    def stats(self, windows=None, anomalies=True):
+        """Підсумки вікон (усіх або заданих) і останні аномалії"""
+        with self._lock:
+            now = self.last_timestamp
+            result = {}
+            for name in windows or self.windows:
+                window = self._stats[name]
+                if now is not None:
+                    for stats in window.values():
+                        stats.expire(now)
+                result[name] = {metric: stats.summary() for metric, stats in window.items()}
+            summary = {
+                'timestamp': now,
+                'windows': result,
+                'z_threshold': self.z_threshold,
+                'baseline': self.baseline,
+            }
+            if anomalies:
+                summary['anomalies'] = list(self._anomalies)
+            return summary
@@ -3,9 +3,11 @@
 Запуск: python sensor_api_server.py
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
+import atexit
 import json
+import queue
 import random
 import time
 import os
@@ -13,72 +15,49 @@ import sys
 import logging
 import warnings
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 
-# Firebase Admin SDK
+from content_negotiation import (
+    compress, negotiate_content_encoding, negotiate_media_type, serialize, variant_etag
+)
+from device_cache import DeviceStateCache, etag_matches
+from device_registry import (
+    DEVICE_TYPES, DeviceValidationError, apply_changes, apply_firebase_document,
+    firebase_document, load_inventory, matches_filter, parse_bool, remote_document_applies, validate_changes
+)
+from device_snapshot import DeviceSnapshotWriter, load_snapshot
+from firebase_client import FIREBASE_CREDENTIALS_FILE, FirebaseConnector, credentials_source
+from firebase_sync import FirebaseSyncQueue
+from history_store import SensorHistory
+from lot_engine import LotSimulationEngine, parse_lot_ids
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from occupancy import OccupancyModel
+from sensor_analytics import SensorAnalytics
+from sensor_codec import encode_bitmap, negotiate as negotiate_encoding
+from sensor_export import EXPORTERS, FORMATS as EXPORT_FORMATS
+from sensor_simulator import SensorSimulator, new_state
+from sse_hub import SensorBroadcastHub
+from state_backend import create_state_backend
+from ws_gateway import WebSocketGateway
+
+# WebSocket у WSGI-режимі - через необов'язковий flask-sock (в ASGI-режимі - нативно)
 try:
-    import firebase_admin
-    from firebase_admin import credentials, firestore
-    
-    # Ініціалізація Firebase (якщо є credentials)
-    FIREBASE_ENABLED = False
-    db = None
-    
-    # Спробуємо завантажити credentials зі змінної середовища (для Railway/деплою)
-    firebase_creds_env = os.environ.get('FIREBASE_CREDENTIALS')
-    firebase_creds_file = 'firebase-credentials.json'
-    
-    if firebase_creds_env:
-        # Використовуємо credentials зі змінної середовища
-        try:
-            cred_data = json.loads(firebase_creds_env)
-            if cred_data.get('type') == 'service_account':
-                # Створюємо тимчасовий файл для credentials
-                import tempfile
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                    json.dump(cred_data, f)
-                    temp_cred_file = f.name
-                
-                cred = credentials.Certificate(temp_cred_file)
-                firebase_admin.initialize_app(cred)
-                db = firestore.client()
-                FIREBASE_ENABLED = True
-                os.unlink(temp_cred_file)  # Видаляємо тимчасовий файл
-                print("✅ Firebase підключено (з змінної середовища)")
-            else:
-                print("⚠️  FIREBASE_CREDENTIALS не є Service Account key (type != 'service_account')")
-        except json.JSONDecodeError:
-            print("⚠️  FIREBASE_CREDENTIALS не є валідним JSON")
-        except Exception as e:
-            print(f"⚠️  Помилка ініціалізації Firebase зі змінної середовища: {e}")
-    elif os.path.exists(firebase_creds_file):
-        # Використовуємо credentials з файлу (для локальної розробки)
-        try:
-            with open(firebase_creds_file, 'r') as f:
-                cred_data = json.load(f)
-                if cred_data.get('type') == 'service_account':
-                    cred = credentials.Certificate(firebase_creds_file)
-                    firebase_admin.initialize_app(cred)
-                    db = firestore.client()
-                    FIREBASE_ENABLED = True
-                    print("✅ Firebase підключено (з файлу)")
-                else:
-                    print("⚠️  firebase-credentials.json не є Service Account key (type != 'service_account')")
-                    print("   Отримайте Service Account key з Firebase Console → Project Settings → Service accounts")
-        except json.JSONDecodeError:
-            print("⚠️  firebase-credentials.json не є валідним JSON файлом")
-        except Exception as e:
-            print(f"⚠️  Помилка ініціалізації Firebase: {e}")
-            print("   Перевірте правильність firebase-credentials.json")
-    else:
-        print("⚠️  Firebase не налаштовано")
-        print("   Для локальної розробки: створіть firebase-credentials.json")
-        print("   Для деплою: додайте змінну FIREBASE_CREDENTIALS в Railway")
-        print("   Сервер працюватиме без синхронізації з Firebase")
-        
+    from flask_sock import Sock
+    FLASK_SOCK_AVAILABLE = True
 except ImportError:
-    FIREBASE_ENABLED = False
-    db = None
-    print("⚠️  Firebase Admin SDK не встановлено. Встановіть: pip install firebase-admin")
+    FLASK_SOCK_AVAILABLE = False
+
+# Firebase підключається у фоновому потоці (firebase_client.py), тут лише
+# перевіряємо наявність credentials - без імпорту SDK, щоб старт був миттєвим
+FIREBASE_CREDENTIALS_SOURCE = credentials_source(
+    os.environ.get('FIREBASE_CREDENTIALS'), FIREBASE_CREDENTIALS_FILE
+)
+FIREBASE_ENABLED = FIREBASE_CREDENTIALS_SOURCE is not None
+db = None
+if not FIREBASE_ENABLED:
+    print("⚠️  Firebase не налаштовано")
+    print("   Для локальної розробки: створіть firebase-credentials.json")
+    print("   Для деплою: додайте змінну FIREBASE_CREDENTIALS в Railway")
     print("   Сервер працюватиме без синхронізації з Firebase")
 
 app = Flask(__name__)
@@ -88,12 +67,51 @@ CORS(app)  # Дозволяє запити з мобільного додатк
 warnings.filterwarnings('ignore', category=FutureWarning)
 
 # Налаштування логування
+# LOG_MODE=compact (за замовчуванням): один рядок на запит, деталі - лише в debug
+# LOG_MODE=verbose: попередня поведінка (тіла запитів/відповідей, деталі обробки)
+LOG_MODE = os.environ.get('LOG_MODE', 'compact').lower()
+VERBOSE_LOGGING = LOG_MODE == 'verbose'
+# Частка запитів, що логуються в compact-режимі (помилки логуються завжди)
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+LOG_BODIES = VERBOSE_LOGGING or os.environ.get('LOG_BODIES', 'False').lower() == 'true'
+# Запис у stdout виконує окремий потік, запити не чекають на I/O
+LOG_ASYNC = os.environ.get('LOG_ASYNC', 'True').lower() == 'true'
+
 # Використовуємо stdout для всіх логів (не stderr), щоб уникнути червоного кольору
+_log_handler = logging.StreamHandler(sys.stdout)  # Виводимо в stdout замість stderr
+_log_handler.setFormatter(logging.Formatter(
+    '%(asctime)s | %(levelname)-8s | %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+))
+if LOG_ASYNC:
+    _log_queue = queue.SimpleQueue()
+    log_listener = QueueListener(_log_queue, _log_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+    def restart_log_listener():
+        """
+        Після fork потік QueueListener є лише в батьківському процесі: без нового
+        потоку логи воркера зникають. Скопійовані записи виведе батьківський процес.
+        """
+        while True:
+            try:
+                _log_queue.get_nowait()
+            except queue.Empty:
+                break
+        # Потік батьківського процесу у воркері не існує, stop() його не чекатиме
+        log_listener._thread = None
+        log_listener.start()
+
+    if hasattr(os, 'register_at_fork'):
+        # Першим серед обробників fork, щоб логи інших уже виводилися
+        os.register_at_fork(after_in_child=restart_log_listener)
+    _log_handler = QueueHandler(_log_queue)
+    # Остаточне форматування виконує обробник у потоці QueueListener
+    _log_handler.setFormatter(logging.Formatter('%(message)s'))
 logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)-8s | %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    stream=sys.stdout  # Виводимо в stdout замість stderr
+    level=logging.DEBUG if VERBOSE_LOGGING else logging.INFO,
+    handlers=[_log_handler]
 )
 logger = logging.getLogger(__name__)
 
@@ -101,10 +119,118 @@ logger = logging.getLogger(__name__)
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.WARNING)  # Показуємо тільки WARNING і вище (не INFO)
 
+# Метрики Prometheus (GET /api/metrics); METRICS_ENABLED=false вимикає збір повністю
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+metrics = MetricsRegistry(enabled=METRICS_ENABLED)
+http_requests_total = metrics.counter(
+    'smart_parking_http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status'))
+http_request_seconds = metrics.histogram(
+    'smart_parking_http_request_duration_seconds', 'HTTP request latency until response headers', ('method', 'route'))
+http_requests_in_flight = metrics.gauge(
+    'smart_parking_http_requests_in_flight', 'HTTP requests being processed')
+sensor_generate_seconds = metrics.histogram(
+    'smart_parking_sensor_generate_seconds', 'Time spent in generate_sensor_data',
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005))
+firebase_sync_batches_total = metrics.counter(
+    'smart_parking_firebase_sync_batches_total', 'Firestore batch commits by result', ('result',))
+firebase_sync_documents_total = metrics.counter(
+    'smart_parking_firebase_sync_documents_total', 'Device documents written to Firestore by result', ('result',))
+firebase_sync_seconds = metrics.histogram(
+    'smart_parking_firebase_sync_duration_seconds', 'Firestore batch commit latency')
+sensor_anomalies_total = metrics.counter(
+    'smart_parking_sensor_anomalies_total', 'Sensor readings flagged as z-score anomalies', ('metric',))
+ws_dropped_snapshots_total = metrics.counter(
+    'smart_parking_ws_dropped_snapshots_total', 'Stale sensor snapshots skipped for slow WebSocket clients')
+
+def record_request_metrics(method, route, status, seconds):
+    """Лічильник і гістограма затримки для одного запиту"""
+    http_requests_total.inc((method, route, status))
+    http_request_seconds.observe(seconds, (method, route))
+
+def record_firebase_commit(seconds, documents, error):
+    """Результат пакетного запису у Firestore (викликає черга синхронізації)"""
+    result = 'failure' if error is not None else 'success'
+    firebase_sync_batches_total.inc((result,))
+    firebase_sync_documents_total.inc((result,), documents)
+    firebase_sync_seconds.observe(seconds)
+
+def sample_request():
+    """Чи логувати поточний запит (семплінг для compact-режиму)"""
+    return LOG_SAMPLE_RATE >= 1.0 or random.random() < LOG_SAMPLE_RATE
+
+def log_request_line(method, path, status, duration_ms, remote_addr, sampled=True):
+    """Один структурований рядок на запит (compact-режим)"""
+    if sampled or status >= 400:
+        logger.info("📤 method=%s path=%s status=%s duration_ms=%.1f ip=%s",
+                    method, path, status, duration_ms, remote_addr)
+
+# Стиснення відповідей (gzip/br за Accept-Encoding); менші за поріг тіла не стискаються
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True').lower() == 'true'
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+def json_body(payload):
+    """JSON так само, як у jsonify: компактні роздільники і перенос рядка в кінці"""
+    return app.json.dumps(payload, separators=(',', ':')) + '\n'
+
+def compress_body(body, accept_encoding):
+    """(тіло, Content-Encoding або None) з урахуванням порогу"""
+    if not COMPRESSION_ENABLED or len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    content_encoding = negotiate_content_encoding(accept_encoding)
+    if content_encoding is None:
+        return body, None
+    return compress(body, content_encoding), content_encoding
+
+def api_response(payload, status=200, headers=None):
+    """Відповідь з даними у форматі з Accept: JSON, MessagePack або CBOR"""
+    media_type = negotiate_media_type(request.headers.get('Accept'))
+    response = app.response_class(
+        serialize(payload, media_type, json_body), status=status, headers=headers, content_type=media_type
+    )
+    add_vary(response, 'Accept')
+    return response
+
+def add_vary(response, header):
+    """Додає заголовок у Vary (response.vary розбирає і збирає заголовок на кожному доступі)"""
+    vary = response.headers.get('Vary')
+    if not vary:
+        response.headers['Vary'] = header
+    elif header.lower() not in (name.strip().lower() for name in vary.split(',')):
+        response.headers['Vary'] = f'{vary}, {header}'
+
+# Зареєстровано першим, тому виконується після інших after_request (логування бачить JSON)
+@app.after_request
+def compress_response(response):
+    """
+    Стискає тіла відповідей; потоки і вже стиснені (кешовані) тіла пропускаються.
+
+    Відповіді з Accept-Encoding у Vary (GET пристроїв) стиснення вже узгодили самі.
+    """
+    if (not COMPRESSION_ENABLED or response.direct_passthrough or response.is_streamed
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or 'Accept-Encoding' in response.headers.get('Vary', '')):
+        return response
+    add_vary(response, 'Accept-Encoding')
+    body, content_encoding = compress_body(response.get_data(), request.headers.get('Accept-Encoding'))
+    if content_encoding is not None:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = content_encoding
+    return response
+
 # Додаємо middleware для логування всіх запитів
 @app.before_request
 def log_request_info():
     """Логує інформацію про вхідний запит"""
+    g.request_started = time.perf_counter()
+    # Зміни пристроїв з інших воркерів (без змін - одне читання спільної пам'яті)
+    state_backend.refresh_devices()
+    if METRICS_ENABLED:
+        http_requests_in_flight.inc()
+    if not VERBOSE_LOGGING:
+        g.log_sampled = sample_request()
+        if LOG_BODIES and g.log_sampled and request.is_json:
+            logger.info("📥 %s %s body=%s", request.method, request.path, request.get_data(as_text=True))
+        return
     logger.info(f"📥 {request.method} {request.path}")
     logger.info(f"   IP: {request.remote_addr}")
     if request.is_json:
@@ -115,6 +241,18 @@ def log_request_info():
 @app.after_request
 def log_response_info(response):
     """Логує інформацію про відповідь"""
+    if METRICS_ENABLED:
+        record_request_metrics(
+            request.method, request.url_rule.rule if request.url_rule else 'unmatched',
+            response.status_code, time.perf_counter() - g.request_started
+        )
+    if not VERBOSE_LOGGING:
+        log_request_line(
+            request.method, request.path, response.status_code,
+            (time.perf_counter() - g.request_started) * 1000, request.remote_addr,
+            sampled=g.get('log_sampled', True)
+        )
+        return response
     logger.info(f"📤 {request.method} {request.path} → {response.status_code}")
     if response.is_json:
         try:
@@ -129,329 +267,808 @@ def log_response_info(response):
             pass
     return response
 
+@app.teardown_request
+def finish_request_metrics(exc):
+    if METRICS_ENABLED and 'request_started' in g:
+        http_requests_in_flight.dec()
+
+# Модель зайнятості місць: PARKING_SPOTS місць, PARKING_LEVELS рівнів,
+# PARKING_ZONES зон (A, B, ...) на кожному рівні
+occupancy = OccupancyModel(
+    spots=int(os.environ.get('PARKING_SPOTS', 100)),
+    levels=int(os.environ.get('PARKING_LEVELS', 1)),
+    zones_per_level=int(os.environ.get('PARKING_ZONES', 1))
+)
+
 # Стан системи для реалістичної поведінки
-state = {
-    'free_spots': 50,
-    'co_level': 50.0,
-    'nox_level': 30.0,
-    'temperature': 7.5,  # Реалістична базова температура (5-10°C)
-    'time_counter': 0
-}
+state = new_state(occupancy.spots)
+simulator = SensorSimulator(state, occupancy=occupancy)
+
+# Сховище стану: STATE_BACKEND=shared (за замовчуванням) - файл у пам'яті, спільний
+# для воркерів gunicorn (STATE_PATH); local - стан лише цього процесу
+state_backend = create_state_backend(
+    os.environ.get('STATE_BACKEND', 'shared'),
+    os.environ.get('STATE_PATH') or None,
+    os.environ.get('PORT')
+)
 
 # Стан пристроїв (Компонент 3)
-device_states = {
-    'direction_panels_1': {
-        'device_id': 'direction_panels_1',
-        'device_type': 'DIRECTION_PANELS',
-        'enabled': False,
-        'brightness': 50,
-        'last_updated': int(time.time() * 1000)
-    },
-    'ventilation_1': {
-        'device_id': 'ventilation_1',
-        'device_type': 'VENTILATION',
-        'enabled': False,
-        'fan_speed': 1,
-        'last_updated': int(time.time() * 1000)
-    },
-    'heating_1': {
-        'device_id': 'heating_1',
-        'device_type': 'HEATING',
-        'enabled': False,
-        'heating_power': 1,
-        'last_updated': int(time.time() * 1000)
-    }
-}
+# DEVICE_INVENTORY - JSON-файл з інвентарем: {"VENTILATION": 500, ...} або список пристроїв
+device_states = load_inventory(os.environ.get('DEVICE_INVENTORY'))
+
+# Warm start: DEVICE_SNAPSHOT_PATH - локальний знімок станів пристроїв, з якого
+# сервер стартує ще до підключення до Firebase (потім стан узгоджується з Firestore)
+DEVICE_SNAPSHOT_PATH = os.environ.get('DEVICE_SNAPSHOT_PATH') or None
+# Пристрої, локальний стан яких може бути новішим за Firestore
+# (відновлені зі знімка або змінені до узгодження)
+local_device_ids = load_snapshot(DEVICE_SNAPSHOT_PATH, device_states)
+devices_source = 'snapshot' if local_device_ids else 'inventory'
+firebase_reconciled = False
+
+# Історія знімків; SENSOR_HISTORY_PATH - каталог для збереження між перезапусками
+sensor_history = SensorHistory(
+    capacity=int(os.environ.get('HISTORY_CAPACITY', 17280)),
+    path=os.environ.get('SENSOR_HISTORY_PATH') or None
+)
+
+# Ковзна аналітика 1 хв / 15 хв / 1 год; ANOMALY_Z_THRESHOLD - поріг z-оцінки,
+# ANOMALY_BASELINE_WINDOW - вікно, відносно якого рахується z-оцінка
+sensor_analytics = SensorAnalytics(
+    z_threshold=float(os.environ.get('ANOMALY_Z_THRESHOLD', 3.0)),
+    baseline=os.environ.get('ANOMALY_BASELINE_WINDOW', '15m')
+)
+
+def analyze_sensor_data(data):
+    """Додає знімок в аналітику; повертає знайдені аномалії"""
+    anomalies = sensor_analytics.update(data)
+    for anomaly in anomalies:
+        sensor_anomalies_total.inc((anomaly['metric'],))
+        logger.info("🚨 Аномалія %s: %s (z=%s)", anomaly['metric'], anomaly['value'], anomaly['z_score'])
+    return anomalies
 
 def generate_sensor_data():
     """Генерує наступні дані сенсорів з реалістичною поведінкою"""
-    state['time_counter'] += 1
-    
-    # Генеруємо вільні місця
-    change = random.randint(-3, 3)
-    state['free_spots'] = max(0, min(100, state['free_spots'] + change))
-    
-    # Генеруємо CO залежно від кількості машин
-    occupied_spots = 100 - state['free_spots']
-    base_co = (occupied_spots / 100.0) * 200.0 + 20.0
-    noise = random.uniform(-10, 10)
-    anomaly = random.uniform(-50, 50) if random.random() < 0.05 else 0
-    state['co_level'] = max(0, min(500, base_co + noise + anomaly))
-    
-    # Генеруємо NOx
-    base_nox = (occupied_spots / 100.0) * 150.0 + 15.0
-    noise = random.uniform(-8, 8)
-    state['nox_level'] = max(0, min(500, base_nox + noise))
-    
-    # Генеруємо температуру в реалістичному діапазоні (5-10°C)
-    # З логічними зв'язками з іншими сенсорами
-    day_progress = (state['time_counter'] % 17280) / 17280.0
-    
-    # Базова температура в реалістичному діапазоні
-    if day_progress < 0.25:
-        # Ніч (0-6 год): 5-7°C (трохи прохолодніше)
-        base_temp = 5.0 + day_progress * 8.0
-    elif day_progress < 0.5:
-        # Ранок (6-12 год): 7-9°C (поступове потепління)
-        base_temp = 7.0 + (day_progress - 0.25) * 8.0
-    elif day_progress < 0.75:
-        # День (12-18 год): 9-10°C (найтепліше)
-        base_temp = 9.0 + (day_progress - 0.5) * 4.0
-    else:
-        # Вечір (18-24 год): 10-6°C (поступове охолодження)
-        base_temp = 10.0 - (day_progress - 0.75) * 16.0
-    
-    # Логічний зв'язок: високий CO (багато машин) → трохи підвищує температуру
-    # (відпрацьовані гази від двигунів)
-    co_effect = (state['co_level'] / 500.0) * 2.0  # Максимум +2°C при CO=500
-    
-    # Невеликий шум для реалістичності
-    noise = random.uniform(-0.75, 0.75)  # ±0.75°C
-    
-    # Фінальна температура в реалістичному діапазоні 5-10°C
-    state['temperature'] = max(5.0, min(10.0, base_temp + co_effect + noise))
-    
-    # Генеруємо масив датчиків для кожного місця парковки (100 місць)
-    # 0 = вільне місце, 1 = зайняте місце
-    parking_sensors = [0] * 100
-    occupied_indices = random.sample(range(100), occupied_spots)
-    for idx in occupied_indices:
-        parking_sensors[idx] = 1
-    
-    # Додаємо невеликий шум (можливість зміни стану окремих місць)
-    for i in range(100):
-        if random.random() < 0.05:  # 5% шанс зміни стану
-            parking_sensors[i] = 1 - parking_sensors[i]
-    
-    # Обчислюємо похідні значення
-    parking_occupied = occupied_spots / 100.0
-    
-    return {
-        'timestamp': int(time.time() * 1000),
-        'parking_sensors': parking_sensors,  # Масив з 100 елементів [0,1,0,1,1,...]
-        'parking_occupied': parking_occupied,
-        'free_spots': state['free_spots'],
-        'co_level': round(state['co_level'], 2),
-        'nox_level': round(state['nox_level'], 2),
-        'temperature': round(state['temperature'], 2)
-    }
+    started = time.perf_counter()
+    data = state_backend.step(simulator)
+    sensor_history.append(data)
+    analyze_sensor_data(data)
+    sensor_generate_seconds.observe(time.perf_counter() - started)
+    return data
+
+_broadcast_tick = 0
+
+def broadcast_sensor_data():
+    """
+    Продюсер SSE: один тік на інтервал для всіх воркерів.
+
+    Тік генерує воркер, що першим прокинувся після інтервалу; інші отримують
+    той самий знімок. Повертає (tick, snapshot): tick спільний для воркерів
+    і стає id події SSE. None - нового знімка ще немає.
+    """
+    global _broadcast_tick
+    started = time.perf_counter()
+    result = state_backend.advance_if_due(simulator, sensor_hub.interval, _broadcast_tick)
+    if result is None:
+        return None
+    _broadcast_tick, data, advanced = result
+    if advanced:
+        sensor_generate_seconds.observe(time.perf_counter() - started)
+    sensor_history.append(data)
+    return _broadcast_tick, data
+
+def encode_sensor_data(data, encoding):
+    """Окремий знімок у заданому кодуванні; delta для окремого знімка - це ключовий кадр (bitmap)"""
+    return data if encoding == 'json' else encode_bitmap(data)
 
 @app.route('/api/sensor-data', methods=['GET'])
 def get_sensor_data():
-    """Endpoint для отримання поточних даних сенсорів"""
-    logger.info("🔍 Генерую дані сенсорів...")
+    """Endpoint для отримання поточних даних сенсорів (?encoding=json|bitmap)"""
+    try:
+        encoding = negotiate_encoding(request.args.get('encoding'), request.headers.get('Accept'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     data = generate_sensor_data()
-    logger.info(f"✅ Дані згенеровано:")
-    logger.info(f"   - free_spots: {data['free_spots']}")
-    logger.info(f"   - co_level: {data['co_level']}")
-    logger.info(f"   - nox_level: {data['nox_level']}")
-    logger.info(f"   - temperature: {data['temperature']}")
-    logger.info(f"   - parking_occupied: {data['parking_occupied']}")
-    logger.info(f"   - timestamp: {data['timestamp']}")
-    logger.info(f"📤 Відправляю JSON: {json.dumps(data)}")
-    return jsonify(data)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("✅ Дані згенеровано: free_spots=%s, co_level=%s, nox_level=%s, temperature=%s, parking_occupied=%s, timestamp=%s",
+                     data['free_spots'], data['co_level'], data['nox_level'],
+                     data['temperature'], data['parking_occupied'], data['timestamp'])
+        logger.debug("📤 Відправляю JSON: %s", json.dumps(data))
+    return api_response(encode_sensor_data(data, encoding))
+
+# Максимум точок в одній відповіді історії
+HISTORY_MAX_POINTS = 2000
+
+@app.route('/api/sensor-data/history', methods=['GET'])
+def get_sensor_history():
+    """Історія з агрегацією: ?from=<ms>&to=<ms>&step=<секунди>"""
+    now = int(time.time() * 1000)
+    try:
+        end = int(request.args.get('to', now))
+        start = int(request.args.get('from', end - 3600 * 1000))
+        # За замовчуванням ~300 точок на інтервал, крок кратний рівню агрегатів
+        step = int(request.args['step']) if 'step' in request.args else sensor_history.default_step(start, end)
+    except ValueError:
+        return jsonify({'error': 'from, to and step must be integers'}), 400
+    if start >= end or step <= 0:
+        return jsonify({'error': 'Expected from < to and step > 0'}), 400
+    if (end - start) // (step * 1000) > HISTORY_MAX_POINTS:
+        return jsonify({'error': f'Too many points, increase step (max {HISTORY_MAX_POINTS})'}), 400
+    return api_response(sensor_history.query(start, end, step))
+
+@app.route('/api/sensor-data/stats', methods=['GET'])
+def get_sensor_stats():
+    """Ковзна статистика (середнє, std, min/max) і останні аномалії: ?window=1m,15m"""
+    windows = [name for name in request.args.get('window', '').split(',') if name] or None
+    unknown = [name for name in windows or () if name not in sensor_analytics.windows]
+    if unknown:
+        return jsonify({'error': f'window must be one of: {", ".join(sensor_analytics.windows)}'}), 400
+    return api_response(sensor_analytics.stats(windows))
+
+# Додаткові типи подій SSE (?events=stats,anomaly)
+SSE_EVENTS = ('stats', 'anomaly')
+
+def parse_sse_events(value):
+    """Список додаткових подій з ?events=; ValueError - невідомий тип"""
+    events = [event for event in (value or '').split(',') if event]
+    unknown = [event for event in events if event not in SSE_EVENTS]
+    if unknown:
+        raise ValueError(f'events must be a subset of: {", ".join(SSE_EVENTS)}')
+    return events
+
+def analyze_broadcast(data):
+    """Аналітика тіку SSE: подія stats на кожен тік і anomaly, якщо щось знайдено"""
+    anomalies = analyze_sensor_data(data)
+    extra = {'stats': sensor_analytics.stats(anomalies=False)}
+    if anomalies:
+        extra['anomaly'] = {'timestamp': data['timestamp'], 'anomalies': anomalies}
+    return extra
+
+# Один продюсер на тік для всіх SSE-клієнтів (інтервал і розмір буфера - через змінні середовища)
+sensor_hub = SensorBroadcastHub(
+    broadcast_sensor_data,
+    interval=float(os.environ.get('SSE_INTERVAL', 5)),
+    buffer_size=int(os.environ.get('SSE_BUFFER_SIZE', 120)),
+    keyframe_interval=int(os.environ.get('SSE_KEYFRAME_INTERVAL', 20)),
+    analyze=analyze_broadcast
+)
+metrics.gauge_callback('smart_parking_sse_subscribers', 'Open SSE subscriptions', lambda: sensor_hub.subscribers)
 
 @app.route('/api/sensor-data/stream', methods=['GET'])
 def stream_sensor_data():
-    """Endpoint для потокової передачі даних (SSE)"""
-    logger.info("🌊 SSE stream підключено")
+    """Endpoint для потокової передачі даних (SSE, ?encoding=json|bitmap|delta&events=stats,anomaly)"""
+    try:
+        encoding = negotiate_encoding(request.args.get('encoding'), request.headers.get('Accept'))
+        events = parse_sse_events(request.args.get('events'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    logger.info("🌊 SSE stream підключено (Last-Event-ID: %s, encoding: %s)", last_event_id, encoding)
+
     def generate():
-        counter = 0
-        while True:
-            try:
-                counter += 1
-                logger.info(f"📡 Генерую дані для SSE (пакет #{counter})...")
-                data = generate_sensor_data()
-                json_data = json.dumps(data)
-                logger.info(f"✅ Відправляю SSE пакет #{counter}: free_spots={data['free_spots']}, co={data['co_level']}")
-                yield f"data: {json_data}\n\n"
-                time.sleep(5)  # Оновлення кожні 5 секунд
-            except GeneratorExit:
-                logger.info("🔌 SSE stream закрито клієнтом")
-                break
-            except Exception as e:
-                logger.error(f"❌ Помилка в SSE stream: {e}")
-                yield f"error: {str(e)}\n\n"
-                break
-    
-    return app.response_class(
+        try:
+            yield from sensor_hub.subscribe(last_event_id, encoding, events)
+        except GeneratorExit:
+            logger.debug("🔌 SSE stream закрито клієнтом")
+
+    response = app.response_class(
         generate(),
         mimetype='text/event-stream'
     )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Максимум тіків для одного експорту (за замовчуванням ~3 місяці)
+SIMULATE_MAX_TICKS = int(os.environ.get('SIMULATE_MAX_TICKS', 17280 * 92))
+
+@app.route('/api/simulate', methods=['GET'])
+def simulate():
+    """Детермінована перемотка симуляції: ?ticks=17280&seed=42&format=ndjson|csv|npz"""
+    try:
+        ticks = int(request.args.get('ticks', 17280))
+        seed = int(request.args['seed']) if 'seed' in request.args else random.SystemRandom().randrange(2 ** 32)
+        start = int(request.args.get('start', 0))
+        interval_ms = int(request.args.get('interval_ms', 5000))
+    except ValueError:
+        return jsonify({'error': 'ticks, seed, start and interval_ms must be integers'}), 400
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORTERS:
+        return jsonify({'error': f'Unsupported format, use one of: {", ".join(EXPORTERS)}'}), 400
+    if not 0 < ticks <= SIMULATE_MAX_TICKS:
+        return jsonify({'error': f'ticks must be between 1 and {SIMULATE_MAX_TICKS}'}), 400
+    
+    logger.info("⏩ Перемотка симуляції: ticks=%s, seed=%s, format=%s", ticks, seed, fmt)
+    response = app.response_class(
+        EXPORTERS[fmt](ticks, seed, start=start, interval_ms=interval_ms),
+        mimetype=EXPORT_FORMATS[fmt]
+    )
+    response.headers['X-Simulation-Seed'] = str(seed)
+    if fmt != 'ndjson':
+        response.headers['Content-Disposition'] = f'attachment; filename="simulation_{seed}_{ticks}.{fmt}"'
+    return response
+
+# ========== Зайнятість місць ==========
+
+# Максимум місць в одній відповіді /api/spots/free
+SPOTS_MAX_LIMIT = 1000
+
+def spot_filters(args):
+    """(level, zone) з query-параметрів; ValueError - невідомий рівень або зона"""
+    level = args.get('level')
+    if level is not None:
+        if not level.isdigit() or not 1 <= int(level) <= occupancy.levels:
+            raise ValueError(f'level must be an integer between 1 and {occupancy.levels}')
+        level = int(level)
+    zone = args.get('zone')
+    if zone is not None:
+        zone = zone.upper()
+        if zone not in occupancy.zone_names:
+            raise ValueError(f'zone must be one of: {", ".join(occupancy.zone_names)}')
+    return level, zone
+
+@app.route('/api/spots', methods=['GET'])
+def get_spots_summary():
+    """Зайнятість загалом, по рівнях і по зонах"""
+    with state_backend.locked():
+        summary = occupancy.summary()
+    return api_response(summary)
+
+@app.route('/api/spots/free', methods=['GET'])
+def get_free_spots():
+    """Вільні місця: ?zone=A&level=1&limit=50"""
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not 0 < limit <= SPOTS_MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {SPOTS_MAX_LIMIT}'}), 400
+    try:
+        level, zone = spot_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with state_backend.locked():
+        spots = occupancy.find_free(level, zone, limit)
+        free = occupancy.free_count(level, zone)
+    return api_response({
+        'level': level,
+        'zone': zone,
+        'free': free,
+        'spots': occupancy.describe(spots)
+    })
+
+@app.route('/api/spots/nearest', methods=['GET'])
+def get_nearest_free_spot():
+    """Найближче вільне місце на тому ж рівні: ?spot=<номер місця>"""
+    try:
+        spot = int(request.args['spot'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Query parameter "spot" must be an integer'}), 400
+    if not 0 <= spot < occupancy.spots:
+        return jsonify({'error': f'spot must be between 0 and {occupancy.spots - 1}'}), 400
+    with state_backend.locked():
+        nearest = occupancy.nearest_free(spot)
+    if nearest is None:
+        return jsonify({'error': 'No free spots on this level'}), 404
+    return api_response({**occupancy.describe(nearest), 'distance': abs(nearest - spot)})
+
+# ========== Кілька парковок (векторизований рушій) ==========
+
+# PARKING_LOTS: кількість парковок або список id через кому
+lot_engine = LotSimulationEngine(
+    parse_lot_ids(os.environ.get('PARKING_LOTS')),
+    spots_per_lot=int(os.environ.get('SPOTS_PER_LOT', 100)),
+    interval=float(os.environ.get('SSE_INTERVAL', 5))
+)
+
+@app.route('/api/lots/<lot_id>/sensor-data', methods=['GET'])
+def get_lot_sensor_data(lot_id):
+    """Дані сенсорів конкретної парковки"""
+    if lot_id not in lot_engine:
+        logger.warning(f"❌ Парковку не знайдено: {lot_id}")
+        return jsonify({'error': 'Lot not found'}), 404
+    lot_engine.maybe_step()
+    return api_response(lot_engine.snapshots([lot_id])[0])
+
+@app.route('/api/sensor-data/batch', methods=['GET'])
+def get_sensor_data_batch():
+    """Дані сенсорів для кількох парковок: ?lots=lot_1,lot_2"""
+    lot_ids = [lot_id for lot_id in request.args.get('lots', '').split(',') if lot_id]
+    if not lot_ids:
+        return jsonify({'error': 'Query parameter "lots" is required'}), 400
+    unknown = [lot_id for lot_id in lot_ids if lot_id not in lot_engine]
+    if unknown:
+        logger.warning(f"❌ Парковки не знайдено: {unknown}")
+        return jsonify({'error': 'Lot not found', 'lots': unknown}), 404
+    lot_engine.maybe_step()
+    return api_response({'lots': lot_engine.snapshots(lot_ids)})
 
 # ========== Компонент 3: Керування пристроями ==========
 
+def filter_devices(device_type=None, enabled=None):
+    """Список пристроїв з фільтрами; enabled - рядок з query ('true'/'false')"""
+    enabled = parse_bool(enabled)
+    if device_type is not None and device_type not in DEVICE_TYPES:
+        raise DeviceValidationError(f'Unknown device type: {device_type}')
+    if device_type is None and enabled is None:
+        return list(device_states.values())
+    return [d for d in device_states.values() if matches_filter(d, device_type, enabled)]
+
+# Версії пристроїв і кеш серіалізованих відповідей (інвалідуються лише змінами)
+device_cache = DeviceStateCache(
+    device_states,
+    lambda payload, media_type: serialize(payload, media_type, json_body),
+    compress
+)
+
+device_snapshot = DeviceSnapshotWriter(DEVICE_SNAPSHOT_PATH, device_states) if DEVICE_SNAPSHOT_PATH else None
+if device_snapshot is not None:
+    atexit.register(device_snapshot.flush)
+
+def devices_changed(device_ids=None, local=True, version=None, device_versions=None):
+    """
+    Після змін пристроїв: нові версії в кеші і запис знімка (local - змінено цим сервером).
+
+    Викликається сховищем стану під його блокуванням; version і device_versions -
+    версії зі спільного стану воркерів.
+    """
+    device_cache.bump(device_ids, version, device_versions)
+    if local and not firebase_reconciled:
+        local_device_ids.update(device_states if device_ids is None else device_ids)
+    if device_snapshot is not None:
+        device_snapshot.mark_dirty()
+
+# Робочі копії state і device_states синхронізуються зі сховищем; зміни інших
+# воркерів підтягуються перед кожною зміною і фоновим потоком
+local_device_ids.update(state_backend.attach(
+    state, device_states, local_device_ids, on_devices_changed=devices_changed, occupancy=occupancy
+))
+# ETag, версії й id подій SSE - зі сховища стану, тобто однакові для всіх воркерів
+device_cache.adopt(state_backend.epoch, state_backend.device_versions())
+sensor_hub.epoch = state_backend.epoch
+
+# Максимальний час очікування для ?wait_for_version= (секунди)
+LONG_POLL_MAX_TIMEOUT = float(os.environ.get('LONG_POLL_MAX_TIMEOUT', 60))
+
+def long_poll_params(args):
+    """(wait_for_version, timeout) з query-параметрів; wait_for_version=None - без очікування"""
+    wait_for = args.get('wait_for_version')
+    if wait_for is None:
+        return None, 0
+    try:
+        timeout = float(args.get('timeout', 30))
+        return int(wait_for), max(0.0, min(timeout, LONG_POLL_MAX_TIMEOUT))
+    except ValueError:
+        raise DeviceValidationError('wait_for_version must be an integer and timeout a number')
+
+def device_get_response(device_id=None, if_none_match=None, device_type=None, enabled=None,
+                         accept=None, accept_encoding=None):
+    """
+    Умовна відповідь GET для пристрою або колекції: (status, body, headers).
+
+    Тіло береться з кешу (для колекції з фільтрами - серіалізується заново),
+    ETag - версія і варіант (формат, стиснення); якщо клієнт уже має цю
+    версію, повертається 304 без тіла. Кешовані тіла стискаються один раз.
+    """
+    filtered = device_type is not None or enabled is not None
+    devices = filter_devices(device_type, enabled) if filtered else None
+    media_type = negotiate_media_type(accept)
+    content_encoding = negotiate_content_encoding(accept_encoding) if COMPRESSION_ENABLED else None
+    etag = device_cache.etag(device_id)
+    if filtered:
+        etag = f'{etag[:-1]}-{device_type}-{enabled}"'
+    headers = {
+        'ETag': variant_etag(etag, media_type, content_encoding),
+        'X-Devices-Version': str(device_cache.current_version(device_id)),
+        'Cache-Control': 'no-cache',
+        'Content-Type': media_type,
+        'Vary': 'Accept, Accept-Encoding'
+    }
+    if etag_matches(if_none_match, headers['ETag']):
+        return 304, b'', headers
+    if filtered:
+        body, content_encoding = compress_body(serialize({'devices': devices}, media_type, json_body), accept_encoding)
+    else:
+        body = device_cache.body(device_id, media_type)
+        if content_encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+            body = device_cache.body(device_id, media_type, content_encoding)
+        else:
+            content_encoding = None
+    if content_encoding is not None:
+        headers['Content-Encoding'] = content_encoding
+    return 200, body, headers
+
 @app.route('/api/devices', methods=['GET'])
 def get_all_devices():
-    """Отримати стан всіх пристроїв"""
-    logger.info("📋 Запит на отримання всіх пристроїв")
-    devices = list(device_states.values())
-    logger.info(f"✅ Повертаю {len(devices)} пристроїв")
-    for device in devices:
-        logger.info(f"   - {device['device_id']}: enabled={device['enabled']}, type={device['device_type']}")
-    return jsonify({
-        'devices': devices
-    })
+    """Отримати стан всіх пристроїв (фільтри: ?type=VENTILATION&enabled=true, long-poll: ?wait_for_version=N)"""
+    try:
+        wait_for, timeout = long_poll_params(request.args)
+        if wait_for is not None:
+            device_cache.wait(wait_for, timeout=timeout)
+        status, body, headers = device_get_response(
+            None, request.headers.get('If-None-Match'),
+            request.args.get('type'), request.args.get('enabled'),
+            request.headers.get('Accept'), request.headers.get('Accept-Encoding')
+        )
+    except DeviceValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    return app.response_class(body, status=status, headers=headers)
+
+# Інтервал коментарів-пінгів у потоці пристроїв (секунди)
+DEVICE_STREAM_KEEPALIVE = float(os.environ.get('DEVICE_STREAM_KEEPALIVE', 15))
+
+@app.route('/api/devices/stream', methods=['GET'])
+def stream_devices():
+    """
+    Зміни пристроїв (SSE): перша подія - усі пристрої, далі - лише змінені.
+
+    Last-Event-ID - продовжити з версії; якщо журнал її вже не містить - повний знімок.
+    """
+    last_version = device_cache.parse_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    )
+    logger.info("🌊 Потік пристроїв підключено (версія: %s)", last_version)
+    response = app.response_class(
+        device_cache.subscribe(last_version, DEVICE_STREAM_KEEPALIVE),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/devices/<device_id>', methods=['GET'])
 def get_device(device_id):
-    """Отримати стан конкретного пристрою"""
-    logger.info(f"🔍 Запит на отримання пристрою: {device_id}")
+    """Отримати стан конкретного пристрою (long-poll: ?wait_for_version=N)"""
     if device_id not in device_states:
         logger.warning(f"❌ Пристрій не знайдено: {device_id}")
         return jsonify({'error': 'Device not found'}), 404
     
-    device = device_states[device_id]
-    logger.info(f"✅ Знайдено пристрій: {device_id}, enabled={device['enabled']}, type={device['device_type']}")
-    return jsonify(device)
+    try:
+        wait_for, timeout = long_poll_params(request.args)
+    except DeviceValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    if wait_for is not None:
+        device_cache.wait(wait_for, device_id, timeout)
+    status, body, headers = device_get_response(
+        device_id, request.headers.get('If-None-Match'),
+        accept=request.headers.get('Accept'), accept_encoding=request.headers.get('Accept-Encoding')
+    )
+    return app.response_class(body, status=status, headers=headers)
+
+def device_to_firebase_data(device):
+    """Підготовка документа пристрою для Firebase"""
+    return firebase_document(device)
+
+def get_firebase_db():
+    """Клієнт Firestore або None, якщо Firebase вимкнено"""
+    return db if FIREBASE_ENABLED else None
+
+# Фонова черга синхронізації: PUT не чекає на Firestore
+firebase_sync_queue = FirebaseSyncQueue(
+    get_firebase_db,
+    flush_interval=float(os.environ.get('FIREBASE_SYNC_INTERVAL', 0.2)),
+    on_commit=record_firebase_commit if METRICS_ENABLED else None,
+    # Поки Firebase підключається, оновлення накопичуються в черзі
+    is_enabled=lambda: FIREBASE_ENABLED and firebase_connector.state != 'failed',
+    # Зі спільним станом номери єдині для всіх воркерів (/api/devices/sync/<seq> у будь-якого)
+    sequence=state_backend.sync_sequence()
+)
+metrics.gauge_callback(
+    'smart_parking_firebase_sync_pending', 'Device updates waiting for Firestore', lambda: firebase_sync_queue.pending)
 
 def sync_device_to_firebase(device):
-    """Синхронізувати стан пристрою з Firebase"""
-    if FIREBASE_ENABLED and db:
-        try:
-            logger.info(f"☁️  Синхронізую пристрій з Firebase: {device['device_id']}")
-            # Підготовка даних для Firebase
-            firebase_data = {
-                'device_id': device['device_id'],
-                'device_type': device['device_type'],
-                'enabled': device['enabled'],
-                'last_updated': device['last_updated'],
-                'synced': True
-            }
-            
-            # Додаємо специфічні поля залежно від типу
-            if device['device_type'] == 'DIRECTION_PANELS':
-                firebase_data['brightness'] = device['brightness']
-                logger.info(f"   Дані: enabled={device['enabled']}, brightness={device['brightness']}")
-            elif device['device_type'] == 'VENTILATION':
-                firebase_data['fan_speed'] = device['fan_speed']
-                logger.info(f"   Дані: enabled={device['enabled']}, fan_speed={device['fan_speed']}")
-            elif device['device_type'] == 'HEATING':
-                firebase_data['heating_power'] = device['heating_power']
-                logger.info(f"   Дані: enabled={device['enabled']}, heating_power={device['heating_power']}")
-            
-            # Зберігаємо в Firebase
-            db.collection('device_states').document(device['device_id']).set(firebase_data)
-            logger.info(f"✅ Успішно синхронізовано з Firebase: {device['device_id']}")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Помилка синхронізації з Firebase: {e}")
-            return False
-    else:
+    """Поставити стан пристрою в чергу синхронізації з Firebase (повертає seq або None)"""
+    seq = firebase_sync_queue.enqueue(device['device_id'], device_to_firebase_data(device))
+    if seq is None:
         logger.debug("⚠️  Firebase не увімкнено, пропускаю синхронізацію")
-    return False
+    return seq
 
 def load_devices_from_firebase():
-    """Завантажити стани пристроїв з Firebase при старті"""
+    """
+    Узгодити стани пристроїв з Firebase.
+
+    Документ застосовується, якщо пристрій локально не змінювався або документ
+    новіший; новіші локальні стани (зі знімка чи змінені під час підключення)
+    ставляться в чергу на запис у Firestore.
+    """
+    global devices_source, firebase_reconciled
     if FIREBASE_ENABLED and db:
         try:
             logger.info("📥 Завантажую стани пристроїв з Firebase...")
             devices_ref = db.collection('device_states')
-            docs = devices_ref.stream()
+            documents = [doc.to_dict() for doc in devices_ref.stream()]
             
-            loaded_count = 0
-            for doc in docs:
-                data = doc.to_dict()
-                device_id = data.get('device_id')
-                
-                if device_id and device_id in device_states:
+            applied = set()
+            with state_backend.update_devices(local=False):
+                for data in documents:
+                    device = device_states.get(data.get('device_id'))
+                    if device is None:
+                        continue
+                    if device['device_id'] in local_device_ids and device['last_updated'] > data.get('last_updated', 0):
+                        continue
                     # Оновлюємо локальний стан з Firebase
-                    old_enabled = device_states[device_id]['enabled']
-                    device_states[device_id]['enabled'] = data.get('enabled', False)
-                    device_states[device_id]['last_updated'] = data.get('last_updated', int(time.time() * 1000))
-                    
-                    if device_states[device_id]['device_type'] == 'DIRECTION_PANELS':
-                        device_states[device_id]['brightness'] = data.get('brightness', 50)
-                        logger.info(f"   Завантажено {device_id}: enabled={device_states[device_id]['enabled']}, brightness={device_states[device_id]['brightness']}")
-                    elif device_states[device_id]['device_type'] == 'VENTILATION':
-                        device_states[device_id]['fan_speed'] = data.get('fan_speed', 1)
-                        logger.info(f"   Завантажено {device_id}: enabled={device_states[device_id]['enabled']}, fan_speed={device_states[device_id]['fan_speed']}")
-                    elif device_states[device_id]['device_type'] == 'HEATING':
-                        device_states[device_id]['heating_power'] = data.get('heating_power', 1)
-                        logger.info(f"   Завантажено {device_id}: enabled={device_states[device_id]['enabled']}, heating_power={device_states[device_id]['heating_power']}")
-                    
-                    loaded_count += 1
+                    apply_firebase_document(device, data)
+                    applied.add(device['device_id'])
             
-            logger.info(f"✅ Завантажено {loaded_count} пристроїв з Firebase")
+            newer_local = {
+                device_id: device_to_firebase_data(device_states[device_id])
+                for device_id in set(local_device_ids) - applied
+            }
+            firebase_sync_queue.enqueue_many(newer_local)
+            firebase_reconciled = True
+            local_device_ids.clear()
+            devices_source = 'firebase'
+            logger.info(f"✅ Завантажено {len(applied)} пристроїв з Firebase, локально новіших: {len(newer_local)}")
             return True
         except Exception as e:
             logger.error(f"⚠️  Не вдалося завантажити з Firebase: {e}")
             return False
     return False
 
+def apply_remote_documents(documents):
+    """
+    Застосовує документи Firestore, змінені іншими інстансами або в консолі.
+
+    Відлуння власних записів і застарілі документи пропускаються; решта
+    оновлює device_states, кеш відповідей і потік /api/devices/stream.
+    """
+    candidates = [
+        data for data in documents
+        if data.get('device_id') in device_states and remote_document_applies(device_states[data['device_id']], data)
+    ]
+    if not candidates:
+        return []
+    applied = []
+    with state_backend.update_devices([data['device_id'] for data in candidates], local=False):
+        for data in candidates:
+            device = device_states[data['device_id']]
+            # Повторна перевірка під блокуванням: інший воркер міг уже застосувати документ
+            if remote_document_applies(device, data):
+                apply_firebase_document(device, data)
+                applied.append(device['device_id'])
+    if applied:
+        logger.info(f"🔄 Зміни з Firestore: {len(applied)} пристроїв")
+    return applied
+
+def on_device_documents(docs, changes, read_time):
+    """Слухач колекції device_states (викликається фоновим потоком Firestore)"""
+    try:
+        apply_remote_documents([
+            change.document.to_dict() for change in changes if change.type.name in ('ADDED', 'MODIFIED')
+        ])
+    except Exception as e:
+        logger.error(f"❌ Помилка застосування змін з Firestore: {e}")
+
+# Підписка на зміни device_states (після узгодження стану)
+device_listener = None
+
+def on_firebase_connected(client):
+    """Викликається фоновим потоком після підключення: узгоджуємо стан пристроїв і слухаємо зміни"""
+    global db, device_listener
+    db = client
+    delay = 1.0
+    # Воркер після fork успадковує вже узгоджений стан: лише підписуємося,
+    # а документи першого знімка слухача порівнюються за last_updated
+    while not firebase_reconciled and not load_devices_from_firebase():
+        time.sleep(delay)
+        delay = min(delay * 2, 60.0)
+    try:
+        device_listener = db.collection('device_states').on_snapshot(on_device_documents)
+        logger.info("👂 Слухаю зміни device_states у Firestore")
+    except Exception as e:
+        logger.error(f"⚠️  Не вдалося підписатися на зміни Firestore: {e}")
+
+firebase_connector = FirebaseConnector(FIREBASE_CREDENTIALS_SOURCE, on_connect=on_firebase_connected)
+
+def restart_firebase_after_fork():
+    """Воркер gunicorn --preload: клієнт і слухач майстра непридатні, підключаємося заново"""
+    global db, device_listener
+    db = None
+    device_listener = None
+    firebase_connector.reset()
+    firebase_connector.start()
+
+def apply_device_update(device, data):
+    """Застосовує зміни до пристрою з валідацією та обмеженням діапазонів"""
+    changes = validate_changes(device['device_type'], data)
+    with state_backend.update_devices([device['device_id']]):
+        old_state = apply_changes(device, changes)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("   Зміни: %s", ", ".join(f"{name} {old_state[name]} → {device[name]}" for name in changes))
+    return device
+
+def device_update_response(device, sync_seq):
+    """Відповідь на оновлення: стан пристрою + номер фонової синхронізації"""
+    return {
+        **device,
+        'status': 'updated',
+        'firebase_synced': sync_seq is not None and firebase_sync_queue.status(sync_seq)['synced'],
+        'sync_seq': sync_seq
+    }
+
 @app.route('/api/devices/<device_id>', methods=['PUT'])
 def update_device(device_id):
     """Змінити стан пристрою"""
-    logger.info(f"🔄 Оновлення пристрою: {device_id}")
-    
     if device_id not in device_states:
         logger.warning(f"❌ Пристрій не знайдено: {device_id}")
         return jsonify({'error': 'Device not found'}), 404
     
     device = device_states[device_id]
     data = request.get_json()
-    logger.info(f"   Отримано дані: {json.dumps(data, indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("   Отримано дані для %s: %s", device_id, json.dumps(data, indent=2))
     
-    # Зберігаємо старі значення для логування
-    old_state = {
-        'enabled': device['enabled'],
-        'last_updated': device['last_updated']
-    }
-    if device['device_type'] == 'DIRECTION_PANELS':
-        old_state['brightness'] = device['brightness']
-    elif device['device_type'] == 'VENTILATION':
-        old_state['fan_speed'] = device['fan_speed']
-    elif device['device_type'] == 'HEATING':
-        old_state['heating_power'] = device['heating_power']
+    try:
+        apply_device_update(device, data)
+    except DeviceValidationError as e:
+        logger.warning(f"❌ Некоректні дані для {device_id}: {e}")
+        return jsonify({'error': str(e)}), 400
     
-    # Оновлюємо стан залежно від типу пристрою
-    if device['device_type'] == 'DIRECTION_PANELS':
-        if 'enabled' in data:
-            device['enabled'] = bool(data['enabled'])
-        if 'brightness' in data:
-            device['brightness'] = max(0, min(100, int(data['brightness'])))
-        logger.info(f"   Зміни: enabled {old_state['enabled']} → {device['enabled']}, brightness {old_state.get('brightness')} → {device['brightness']}")
+    # Синхронізуємо з Firebase у фоні
+    sync_seq = sync_device_to_firebase(device)
     
-    elif device['device_type'] == 'VENTILATION':
-        if 'enabled' in data:
-            device['enabled'] = bool(data['enabled'])
-        if 'fan_speed' in data:
-            device['fan_speed'] = max(1, min(3, int(data['fan_speed'])))
-        logger.info(f"   Зміни: enabled {old_state['enabled']} → {device['enabled']}, fan_speed {old_state.get('fan_speed')} → {device['fan_speed']}")
+    logger.debug("✅ Пристрій оновлено: %s, Firebase sync seq: %s", device_id, sync_seq)
     
-    elif device['device_type'] == 'HEATING':
-        if 'enabled' in data:
-            device['enabled'] = bool(data['enabled'])
-        if 'heating_power' in data:
-            device['heating_power'] = max(1, min(2, int(data['heating_power'])))
-        logger.info(f"   Зміни: enabled {old_state['enabled']} → {device['enabled']}, heating_power {old_state.get('heating_power')} → {device['heating_power']}")
+    return jsonify(device_update_response(device, sync_seq))
+
+@app.route('/api/devices', methods=['PATCH'])
+def update_devices_bulk():
+    """
+    Масове оновлення пристроїв одним запитом.
+
+    {"updates": [{"device_id": "ventilation_1", "enabled": true, "fan_speed": 3}, ...]}
+    або {"filter": {"type": "VENTILATION", "enabled": false}, "set": {"enabled": true}}
+    Усі зміни перевіряються до застосування: при помилці не змінюється нічого.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
     
-    device['last_updated'] = int(time.time() * 1000)
+    # Збираємо пари (пристрій, зміни) і всі помилки валідації
+    planned = []
+    errors = []
+    if 'updates' in data:
+        if not isinstance(data['updates'], list):
+            return jsonify({'error': '"updates" must be a list'}), 400
+        for item in data['updates']:
+            device_id = item.get('device_id') if isinstance(item, dict) else None
+            device = device_states.get(device_id)
+            if device is None:
+                errors.append({'device_id': device_id, 'error': 'Device not found'})
+                continue
+            try:
+                planned.append((device, validate_changes(device['device_type'], item)))
+            except DeviceValidationError as e:
+                errors.append({'device_id': device_id, 'error': str(e)})
+    elif 'set' in data:
+        selector = data.get('filter') or {}
+        if not isinstance(selector, dict):
+            return jsonify({'error': '"filter" must be a JSON object'}), 400
+        device_type = selector.get('type')
+        if device_type is not None and (not isinstance(device_type, str) or device_type not in DEVICE_TYPES):
+            return jsonify({'error': f'Unknown device type: {device_type}'}), 400
+        try:
+            # Як у GET: "false" - рядок, а не істинне значення
+            enabled = parse_bool(selector.get('enabled'))
+        except DeviceValidationError as e:
+            return jsonify({'error': str(e)}), 400
+        for device in device_states.values():
+            if not matches_filter(device, device_type, enabled):
+                continue
+            try:
+                planned.append((device, validate_changes(device['device_type'], data['set'])))
+            except DeviceValidationError as e:
+                errors.append({'device_id': device['device_id'], 'error': str(e)})
+    else:
+        return jsonify({'error': 'Expected "updates" or "filter" + "set"'}), 400
     
-    # Синхронізуємо з Firebase
-    sync_success = sync_device_to_firebase(device)
+    if errors:
+        logger.warning(f"❌ Масове оновлення відхилено: {len(errors)} помилок")
+        return jsonify({'error': 'Validation failed', 'errors': errors}), 400
     
-    logger.info(f"✅ Пристрій оновлено: {device_id}, Firebase sync: {sync_success}")
+    timestamp = int(time.time() * 1000)
+    with state_backend.update_devices([device['device_id'] for device, _ in planned]):
+        for device, changes in planned:
+            apply_changes(device, changes, timestamp)
     
+    # Одна черга → пакетний запис у Firestore замість N запитів
+    sync_seq = firebase_sync_queue.enqueue_many(
+        {device['device_id']: device_to_firebase_data(device) for device, _ in planned}
+    )
+    logger.info("✅ Масово оновлено %d пристроїв, Firebase sync seq: %s", len(planned), sync_seq)
     return jsonify({
-        **device,
         'status': 'updated',
-        'firebase_synced': sync_success
+        'updated': len(planned),
+        'device_ids': [device['device_id'] for device, _ in planned],
+        'sync_seq': sync_seq
     })
 
+# ========== WebSocket: сенсори, зміни пристроїв і команди в одному з'єднанні ==========
+
+def execute_device_command(device_id, data):
+    """Команда з WebSocket: та сама валідація і синхронізація, що й у PUT /api/devices/<id>"""
+    device = device_states.get(device_id)
+    if device is None:
+        raise LookupError('Device not found')
+    apply_device_update(device, data)
+    sync_seq = sync_device_to_firebase(device)
+    logger.debug("✅ Пристрій оновлено через WebSocket: %s, Firebase sync seq: %s", device_id, sync_seq)
+    return device_update_response(device, sync_seq)
+
+ws_gateway = WebSocketGateway(
+    sensor_hub, lot_engine, device_cache, device_states, DEVICE_TYPES, execute_device_command,
+    max_pending_acks=int(os.environ.get('WS_MAX_PENDING_ACKS', 32)),
+    on_drop=lambda count: ws_dropped_snapshots_total.inc(amount=count)
+)
+metrics.gauge_callback('smart_parking_ws_sessions', 'Open WebSocket sessions', lambda: ws_gateway.sessions)
+
+if FLASK_SOCK_AVAILABLE:
+    sock = Sock(app)
+
+    @sock.route('/api/ws')
+    def websocket_endpoint(ws):
+        """Мультиплексований WebSocket (протокол описано в ws_gateway.py)"""
+        logger.info("🔌 WebSocket підключено")
+        ws_gateway.session().run(ws.receive, ws.send)
+
+@app.route('/api/devices/sync/<int:seq>', methods=['GET'])
+def get_sync_status(seq):
+    """Статус фонової синхронізації з Firebase для номера з відповіді PUT"""
+    return jsonify(firebase_sync_queue.status(seq))
+
+def readiness():
+    """Готовність: стан пристроїв узгоджено з Firestore (або Firebase не налаштовано)"""
+    return {
+        'ready': firebase_reconciled or not FIREBASE_ENABLED,
+        'firebase': firebase_connector.state,
+        'firebase_error': firebase_connector.error,
+        'state_backend': state_backend.name,
+        'devices_source': devices_source,
+        'device_listener': device_listener is not None,
+        'sync_pending': firebase_sync_queue.pending
+    }
+
+def health_status():
+    """
+    Тіло і HTTP-статус /api/health.
+
+    Firebase налаштовано, але підключитися неможливо (failed) - 503 і status "error",
+    щоб деплой з некоректним секретом не вважався здоровим.
+    """
+    state = readiness()
+    failed = state['firebase'] == 'failed'
+    body = {'status': 'error' if failed else 'ok', 'timestamp': datetime.now().isoformat(), **state}
+    return body, 503 if failed else 200
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Перевірка стану сервера"""
-    return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()})
+    body, status = health_status()
+    return jsonify(body), status
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Метрики у текстовому форматі Prometheus"""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return app.response_class(metrics.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+# Однаковий старт для `python sensor_api_server.py`, gunicorn і ASGI: Firebase
+# підключається у фоні, а пристрої вже відновлено зі знімка
+firebase_connector.start()
+state_backend.start()
+if hasattr(os, 'register_at_fork'):
+    # gunicorn --preload: потоки не переживають fork, тому перезапускаються у воркері
+    os.register_at_fork(after_in_child=restart_firebase_after_fork)
+    os.register_at_fork(after_in_child=state_backend.start)
+    os.register_at_fork(after_in_child=occupancy.reseed)
 
 if __name__ == '__main__':
     logger.info("\n" + "="*50)
     logger.info("  Smart Parking System API Server")
     logger.info("="*50)
     
-    # Завантажуємо стани пристроїв з Firebase при старті
-    if FIREBASE_ENABLED:
-        load_devices_from_firebase()
+    # Симуляція тікає постійно, щоб історія не мала пропусків
+    sensor_hub.start()
     
     logger.info("\n\nКомпонент 1: Дані сенсорів")
     logger.info("  - GET  http://localhost:5000/api/sensor-data")
@@ -461,7 +1078,7 @@ if __name__ == '__main__':
     logger.info("  - GET  http://localhost:5000/api/devices/{deviceId}")
     logger.info("  - PUT  http://localhost:5000/api/devices/{deviceId}")
     if FIREBASE_ENABLED:
-        logger.info("  - ✅ Синхронізація з Firebase увімкнена")
+        logger.info("  - ✅ Синхронізація з Firebase увімкнена (підключення у фоні)")
     else:
         logger.info("  - ⚠️  Синхронізація з Firebase вимкнена")
     logger.info("\n" + "="*50)
@@ -471,7 +1088,7 @@ if __name__ == '__main__':
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
     
     logger.info(f"🚀 Сервер запущено на http://0.0.0.0:{port}")
-    logger.info(f"📝 Логи активні - всі запити будуть відображатися")
+    logger.info(f"📝 Логи: режим {LOG_MODE}, семплінг {LOG_SAMPLE_RATE}, тіла запитів: {LOG_BODIES}")
     logger.info(f"🔧 Debug mode: {debug}\n")
     
     app.run(host='0.0.0.0', port=port, debug=debug)
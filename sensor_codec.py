@@ -0,0 +1,155 @@
+"""
+Компактні кодування знімків сенсорів
+
+json     - звичайний знімок, parking_sensors - масив 0/1.
+bitmap   - parking_sensors упаковано в бітову карту base64 (біт i - місце i,
+           молодший біт першим) у полі parking_bitmap, кількість місць - spots.
+delta    - для потоку: періодичні ключові кадри (keyframe, формат bitmap) і
+           дельти між ними: змінені скалярні поля (fields) і номери місць,
+           що стали зайнятими (occupied) або вільними (freed). Поле base -
+           timestamp знімка, до якого застосовується дельта.
+
+Кодування обирається параметром ?encoding= або заголовком Accept з
+MEDIA_TYPES. StreamDecoder - еталонний декодер (так само декодують клієнти).
+"""
+
+import base64
+import json
+
+import numpy as np
+
+ENCODINGS = ('json', 'bitmap', 'delta')
+
+MEDIA_TYPES = {
+    'application/vnd.smartparking.bitmap+json': 'bitmap',
+    'application/vnd.smartparking.delta+json': 'delta',
+}
+
+# Компактний JSON для закодованих подій
+dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class CodecError(ValueError):
+    """Дельту неможливо застосувати (немає ключового кадру або пропущено подію)"""
+
+
+def negotiate(encoding=None, accept=None, default='json'):
+    """Кодування з ?encoding= (пріоритет) або Accept; ValueError - невідоме кодування"""
+    if encoding:
+        encoding = encoding.lower()
+        if encoding not in ENCODINGS:
+            raise ValueError(f'encoding must be one of: {", ".join(ENCODINGS)}')
+        return encoding
+    for media_type in (accept or '').split(','):
+        media_type = media_type.split(';', 1)[0].strip().lower()
+        if media_type in MEDIA_TYPES:
+            return MEDIA_TYPES[media_type]
+    return default
+
+
+def pack_spots(parking_sensors):
+    """Масив 0/1 → base64 бітової карти"""
+    bits = np.packbits(np.asarray(parking_sensors, dtype=np.uint8), bitorder='little')
+    return base64.b64encode(bits.tobytes()).decode('ascii')
+
+
+def unpack_spots(bitmap, spots):
+    """base64 бітової карти → список 0/1 довжини spots"""
+    packed = np.frombuffer(base64.b64decode(bitmap), dtype=np.uint8)
+    return np.unpackbits(packed, count=spots, bitorder='little').tolist()
+
+
+def encode_bitmap(snapshot):
+    """Знімок з parking_sensors, упакованим у бітову карту"""
+    data = {key: value for key, value in snapshot.items() if key != 'parking_sensors'}
+    data['encoding'] = 'bitmap'
+    if 'parking_sensors' in snapshot:
+        data['spots'] = len(snapshot['parking_sensors'])
+        data['parking_bitmap'] = pack_spots(snapshot['parking_sensors'])
+    return data
+
+
+def decode_bitmap(data):
+    """Зворотне до encode_bitmap: звичайний знімок"""
+    snapshot = {key: value for key, value in data.items()
+                if key not in ('encoding', 'type', 'spots', 'parking_bitmap')}
+    if 'parking_bitmap' in data:
+        snapshot['parking_sensors'] = unpack_spots(data['parking_bitmap'], data['spots'])
+    return snapshot
+
+
+def encode_delta(previous, snapshot):
+    """
+    Дельта між двома знімками або None, якщо ключовий кадр вийде меншим
+    (змінилася більша частина місць або кількість місць).
+    """
+    fields = {key: value for key, value in snapshot.items()
+              if key not in ('parking_sensors', 'timestamp') and previous.get(key) != value}
+    delta = {'type': 'delta', 'base': previous.get('timestamp'), 'timestamp': snapshot.get('timestamp'),
+             'fields': fields}
+    if 'parking_sensors' in snapshot:
+        current = np.asarray(snapshot['parking_sensors'], dtype=np.int8)
+        before = np.asarray(previous.get('parking_sensors', ()), dtype=np.int8)
+        if before.shape != current.shape:
+            return None
+        changed = current - before
+        occupied, freed = np.flatnonzero(changed > 0), np.flatnonzero(changed < 0)
+        # Номер місця в JSON займає кілька байтів, біт карти - 1/6 байта base64
+        if (len(occupied) + len(freed)) * 8 > len(current):
+            return None
+        delta['occupied'] = occupied.tolist()
+        delta['freed'] = freed.tolist()
+    return delta
+
+
+def encode_stream_event(encoding, snapshot, previous=None):
+    """
+    (тип події SSE, дані) для кодування потоку.
+
+    delta без previous (новий клієнт, пропуск, періодичний кадр) - ключовий кадр.
+    """
+    if encoding == 'bitmap':
+        return None, encode_bitmap(snapshot)
+    if encoding != 'delta':
+        return None, snapshot
+    if previous is not None:
+        delta = encode_delta(previous, snapshot)
+        if delta is not None:
+            return 'delta', delta
+    return 'keyframe', {'type': 'keyframe', **encode_bitmap(snapshot)}
+
+
+class StreamDecoder:
+    """Еталонний декодер потоку: ключові кадри і дельти → повні знімки"""
+
+    def __init__(self):
+        self.snapshot = None
+
+    def feed(self, data):
+        """Застосовує подію (dict або JSON-рядок) і повертає повний знімок"""
+        if isinstance(data, (str, bytes)):
+            data = json.loads(data)
+        kind = data.get('type') or data.get('encoding')
+        if kind in ('keyframe', 'bitmap'):
+            self.snapshot = decode_bitmap(data)
+        elif kind == 'delta':
+            self.snapshot = self._apply_delta(data)
+        else:
+            self.snapshot = dict(data)
+        return self.snapshot
+
+    def _apply_delta(self, delta):
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise CodecError('delta received before keyframe')
+        if snapshot.get('timestamp') != delta['base']:
+            raise CodecError(f"delta base {delta['base']} does not match {snapshot.get('timestamp')}")
+        snapshot = {**snapshot, **delta['fields'], 'timestamp': delta['timestamp']}
+        if 'parking_sensors' in snapshot:
+            spots = list(snapshot['parking_sensors'])
+            for index in delta.get('occupied', ()):
+                spots[index] = 1
+            for index in delta.get('freed', ()):
+                spots[index] = 0
+            snapshot['parking_sensors'] = spots
+        return snapshot
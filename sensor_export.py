@@ -0,0 +1,124 @@
+"""
+Детермінована перемотка симуляції та потоковий експорт історії
+
+Дані генеруються SensorSimulator.seeded(seed) і віддаються частинами
+(NDJSON, CSV або .npz), тому пам'ять не залежить від кількості тіків,
+а однаковий seed завжди дає однаковий результат.
+"""
+
+import json
+import zipfile
+
+import numpy as np
+
+from sensor_simulator import SPOTS, SensorSimulator
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'npz': 'application/octet-stream',
+}
+
+CSV_COLUMNS = ['timestamp', 'free_spots', 'parking_occupied', 'co_level',
+               'nox_level', 'temperature', 'parking_sensors']
+
+# Колонки .npz: (назва, dtype); parking_sensors має форму (ticks, 100)
+NPZ_COLUMNS = [
+    ('timestamp', np.int64),
+    ('free_spots', np.int16),
+    ('parking_occupied', np.float64),
+    ('co_level', np.float64),
+    ('nox_level', np.float64),
+    ('temperature', np.float64),
+    ('parking_sensors', np.uint8),
+]
+
+
+def iter_ticks(ticks, seed, start=0, interval_ms=5000, with_spots=True):
+    """Генерує `ticks` знімків детермінованої симуляції"""
+    simulator = SensorSimulator.seeded(seed)
+    for i in range(ticks):
+        yield simulator.step(timestamp=start + i * interval_ms, with_spots=with_spots)
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ndjson_chunks(ticks, seed, start=0, interval_ms=5000, chunk_size=1000):
+    """NDJSON: один знімок на рядок"""
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+    for chunk in _chunked(iter_ticks(ticks, seed, start, interval_ms), chunk_size):
+        yield ''.join(dumps(data) + '\n' for data in chunk).encode('utf-8')
+
+
+def csv_chunks(ticks, seed, start=0, interval_ms=5000, chunk_size=1000):
+    """CSV: parking_sensors записується рядком з 0/1 (100 символів)"""
+    yield (','.join(CSV_COLUMNS) + '\n').encode('utf-8')
+    for chunk in _chunked(iter_ticks(ticks, seed, start, interval_ms), chunk_size):
+        lines = [
+            f"{d['timestamp']},{d['free_spots']},{d['parking_occupied']},{d['co_level']},"
+            f"{d['nox_level']},{d['temperature']},{''.join(map(str, d['parking_sensors']))}\n"
+            for d in chunk
+        ]
+        yield ''.join(lines).encode('utf-8')
+
+
+class _ChunkSink:
+    """Файлоподібний об'єкт без seek(): zipfile пише в нього, ми віддаємо байти клієнту"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def npz_chunks(ticks, seed, start=0, interval_ms=5000, chunk_size=1000):
+    """
+    Колонковий .npz (сумісний з numpy.load), який пишеться потоково.
+
+    Кожна колонка - окремий .npy у zip. Щоб не тримати колонки в пам'яті,
+    симуляція перезапускається з того самого seed для кожної колонки.
+    Скалярні колонки не генерують масив місць (окреме джерело випадковості).
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, dtype in NPZ_COLUMNS:
+            shape = (ticks, SPOTS) if name == 'parking_sensors' else (ticks,)
+            with archive.open(f"{name}.npy", mode='w', force_zip64=True) as entry:
+                np.lib.format.write_array_header_1_0(entry, {
+                    'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                    'fortran_order': False,
+                    'shape': shape,
+                })
+                ticks_iter = iter_ticks(ticks, seed, start, interval_ms,
+                                        with_spots=(name == 'parking_sensors'))
+                for chunk in _chunked(ticks_iter, chunk_size):
+                    entry.write(np.asarray([d[name] for d in chunk], dtype=dtype).tobytes())
+                    yield sink.drain()
+    yield sink.drain()
+
+
+EXPORTERS = {
+    'ndjson': ndjson_chunks,
+    'csv': csv_chunks,
+    'npz': npz_chunks,
+}
+
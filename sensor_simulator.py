@@ -0,0 +1,116 @@
+"""
+Модель сенсорів однієї парковки
+
+SensorSimulator містить логіку generate_sensor_data() і працює з будь-яким
+джерелом випадковості: модулем random (живий сервер) або random.Random(seed)
+для детермінованої перемотки симуляції. Стан окремих місць зберігається між
+тіками в OccupancyModel: змінюються лише місця, куди приїхали або звідки
+поїхали машини.
+"""
+
+import random
+import time
+
+import numpy as np
+
+from occupancy import OccupancyModel
+
+TICKS_PER_DAY = 17280  # 24 год при тіку 5 секунд
+SPOTS = 100
+
+
+def new_state(spots=SPOTS):
+    """Початковий стан системи"""
+    return {
+        'free_spots': spots // 2,
+        'co_level': 50.0,
+        'nox_level': 30.0,
+        'temperature': 7.5,  # Реалістична базова температура (5-10°C)
+        'time_counter': 0
+    }
+
+
+def base_temperature(time_counter, ticks_per_day=TICKS_PER_DAY):
+    """Базова температура в реалістичному діапазоні (5-10°C) для моменту доби"""
+    day_progress = (time_counter % ticks_per_day) / float(ticks_per_day)
+    if day_progress < 0.25:
+        # Ніч (0-6 год): 5-7°C (трохи прохолодніше)
+        return 5.0 + day_progress * 8.0
+    elif day_progress < 0.5:
+        # Ранок (6-12 год): 7-9°C (поступове потепління)
+        return 7.0 + (day_progress - 0.25) * 8.0
+    elif day_progress < 0.75:
+        # День (12-18 год): 9-10°C (найтепліше)
+        return 9.0 + (day_progress - 0.5) * 4.0
+    # Вечір (18-24 год): 10-6°C (поступове охолодження)
+    return 10.0 - (day_progress - 0.75) * 16.0
+
+
+class SensorSimulator:
+    """Генерує послідовні знімки сенсорів з реалістичною поведінкою"""
+
+    def __init__(self, state=None, rng=random, spot_rng=None, occupancy=None):
+        # Скалярні сенсори і масив місць мають окремі джерела випадковості,
+        # щоб скалярні колонки можна було відтворити без генерації місць
+        self.rng = rng
+        self.spot_rng = spot_rng if spot_rng is not None else rng
+        if occupancy is None:
+            occupancy = OccupancyModel(SPOTS, rng=np.random.default_rng(self.spot_rng.getrandbits(64)))
+        self.occupancy = occupancy
+        self.spots = occupancy.spots
+        self.state = state if state is not None else new_state(self.spots)
+        self.occupancy.set_occupied(self.spots - self.state['free_spots'])
+
+    @classmethod
+    def seeded(cls, seed):
+        """Детермінований симулятор: однаковий seed → однакова послідовність"""
+        return cls(rng=random.Random(seed), spot_rng=random.Random(f"{seed}:spots"))
+
+    def step(self, timestamp=None, with_spots=True):
+        """Генерує наступні дані сенсорів"""
+        state = self.state
+        rng = self.rng
+        state['time_counter'] += 1
+
+        # Генеруємо вільні місця (крок масштабується з розміром парковки)
+        spots = self.spots
+        change = rng.randint(-3, 3) * max(1, spots // SPOTS)
+        state['free_spots'] = max(0, min(spots, state['free_spots'] + change))
+
+        # Генеруємо CO залежно від частки зайнятих місць
+        occupied_spots = spots - state['free_spots']
+        occupied_share = occupied_spots / spots
+        base_co = occupied_share * 200.0 + 20.0
+        noise = rng.uniform(-10, 10)
+        anomaly = rng.uniform(-50, 50) if rng.random() < 0.05 else 0
+        state['co_level'] = max(0, min(500, base_co + noise + anomaly))
+
+        # Генеруємо NOx
+        base_nox = occupied_share * 150.0 + 15.0
+        noise = rng.uniform(-8, 8)
+        state['nox_level'] = max(0, min(500, base_nox + noise))
+
+        # Логічний зв'язок: високий CO (багато машин) → трохи підвищує температуру
+        # (відпрацьовані гази від двигунів)
+        co_effect = (state['co_level'] / 500.0) * 2.0  # Максимум +2°C при CO=500
+
+        # Невеликий шум для реалістичності
+        noise = rng.uniform(-0.75, 0.75)  # ±0.75°C
+
+        # Фінальна температура в реалістичному діапазоні 5-10°C
+        base_temp = base_temperature(state['time_counter'])
+        state['temperature'] = max(5.0, min(10.0, base_temp + co_effect + noise))
+
+        data = {'timestamp': int(time.time() * 1000) if timestamp is None else timestamp}
+        if with_spots:
+            # Приїзди/від'їзди змінюють лише відповідні місця
+            self.occupancy.set_occupied(occupied_spots)
+            data['parking_sensors'] = self.occupancy.to_list()
+        data.update({
+            'parking_occupied': occupied_share,
+            'free_spots': state['free_spots'],
+            'co_level': round(state['co_level'], 2),
+            'nox_level': round(state['nox_level'], 2),
+            'temperature': round(state['temperature'], 2)
+        })
+        return data
@@ -5,13 +5,33 @@ setup(
     version="1.0.0",
     description="REST API сервер для генерації емульованих даних сенсорів",
     author="Smart Parking System",
-    py_modules=["sensor_api_server"],
+    py_modules=["sensor_api_server", "sse_hub", "asgi_server", "lot_engine",
+                "sensor_simulator", "sensor_export", "history_store",
+                "firebase_sync", "firestore_memory", "device_registry",
+                "device_cache", "metrics", "firebase_client", "device_snapshot",
+                "state_backend", "occupancy", "sensor_codec",
+                "content_negotiation", "sensor_analytics", "ws_gateway"],
+    packages=find_packages(include=["benchmarks"]),
     install_requires=[
         "Flask==3.0.0",
         "flask-cors==4.0.0",
         "firebase-admin==6.5.0",
         "gunicorn==21.2.0",
+        "numpy==2.2.6",
     ],
+    extras_require={
+        # Асинхронний режим: python asgi_server.py / uvicorn asgi_server:app
+        "asgi": ["starlette==1.7.0", "uvicorn==0.54.0", "a2wsgi==1.10.10"],
+        # Бінарні формати і brotli для відповідей (content_negotiation.py)
+        "binary": ["msgpack>=1.0", "cbor2>=5.4", "brotli>=1.0"],
+        # WebSocket /api/ws у WSGI-режимі (в ASGI-режимі не потрібен)
+        "websocket": ["flask-sock>=0.7"],
+    },
+    entry_points={
+        "console_scripts": [
+            "smart-parking-asgi=asgi_server:main",
+        ],
+    },
     python_requires=">=3.10",
 )
 
@@ -0,0 +1,273 @@
+"""
+Спільний SSE-хаб для /api/sensor-data/stream
+
+Один потік-продюсер генерує дані раз на тік, серіалізує подію один раз
+і роздає однакові байти всім підписникам. Останні події зберігаються
+в обмеженому кільцевому буфері, щоб клієнт міг продовжити з Last-Event-ID.
+
+Компактні кодування (sensor_codec) серіалізуються ліниво, один раз на подію
+для кожного кодування. У режимі delta клієнт отримує ключовий кадр першою
+подією, після пропуску в буфері і кожні keyframe_interval подій.
+
+analyze(snapshot) може повернути додаткові події тіку ({тип: дані}, наприклад
+аналітику); вони надсилаються лише підписникам, що їх запросили.
+
+id події має вигляд "<epoch>-<tick>": epoch змінюється з кожним запуском,
+тож Last-Event-ID з попереднього запуску не приймається за поточний.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from sensor_codec import dumps as compact_dumps, encode_stream_event
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse_event(event_id, data, event=None):
+    """Формує SSE-подію (bytes) з полем id:"""
+    lines = [f"id: {event_id}"]
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return ("\n".join(lines) + "\n\n").encode('utf-8')
+
+
+class SensorBroadcastHub:
+    """
+    Роздає один тік симуляції всім SSE-підписникам.
+
+    producer() повертає (tick, snapshot) або None; tick - номер у id події.
+    """
+
+    def __init__(self, producer, interval=5.0, buffer_size=120, keyframe_interval=20, analyze=None,
+                 epoch=None):
+        self._producer = producer
+        self._analyze = analyze
+        self.interval = interval
+        if keyframe_interval < 1:
+            raise ValueError('keyframe_interval must be at least 1 (1 - keyframes only)')
+        self.keyframe_interval = keyframe_interval
+        self.epoch = epoch or format(int(time.time() * 1000), 'x')
+        # Кільцевий буфер: (seq, snapshot, payload_bytes, {(кодування, ключовий кадр): bytes},
+        #                   {тип додаткової події: bytes}, tick)
+        # seq - внутрішній наскрізний номер, tick - номер у id події (може мати пропуски)
+        self._buffer = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._last_id = 0
+        self._thread = None
+        self._stop = threading.Event()
+        # Очікувачі asyncio-підписників: {asyncio.Event: loop}
+        self._async_waiters = {}
+        # Функції без аргументів, що викликаються після кожного тіку (WebSocket-сесії)
+        self._listeners = set()
+        self.subscribers = 0
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def start(self):
+        """Запускає потік-продюсер (ідемпотентно)"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='sse-producer', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._wake_async_waiters()
+
+    def _run(self):
+        logger.info("📡 SSE продюсер запущено (інтервал %ss)", self.interval)
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                # (tick, snapshot) або None - продюсер не має нового знімка (тік уже роздано)
+                result = self._producer()
+                if result is not None:
+                    self.publish(result[1], result[0])
+            except Exception as e:
+                logger.error(f"❌ Помилка в SSE продюсері: {e}")
+            elapsed = time.monotonic() - started
+            self._stop.wait(max(0.0, self.interval - elapsed))
+
+    def event_id(self, item):
+        return f"{self.epoch}-{item[5]}"
+
+    def parse_event_id(self, value):
+        """tick із Last-Event-ID цього запуску (None, якщо відсутній, некоректний або з іншого запуску)"""
+        epoch, sep, tick = (value or '').rpartition('-')
+        if not sep or epoch != self.epoch:
+            return None
+        try:
+            return max(0, int(tick))
+        except ValueError:
+            return None
+
+    def publish(self, snapshot, tick=None):
+        """Серіалізує знімок один раз і будить усіх підписників (tick за замовчуванням - seq)"""
+        extra = None
+        if self._analyze is not None:
+            try:
+                extra = self._analyze(snapshot)
+            except Exception as e:
+                # Помилка аналітики не повинна зупиняти роздачу тіків
+                logger.error(f"❌ Помилка аналізу знімка: {e}")
+        with self._cond:
+            self._last_id += 1
+            tick = self._last_id if tick is None else tick
+            event_id = f"{self.epoch}-{tick}"
+            payload = format_sse_event(event_id, json.dumps(snapshot))
+            # Додаткові події мають той самий id, що й тік: Last-Event-ID не змінюється
+            extras = {event: format_sse_event(event_id, compact_dumps(data), event)
+                      for event, data in (extra or {}).items()}
+            self._buffer.append((self._last_id, snapshot, payload, {}, extras, tick))
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        self._wake_async_waiters()
+        for listener in listeners:
+            listener()
+        return self._last_id
+
+    def add_listener(self, callback):
+        """callback() після кожного тіку (з потоку продюсера, має бути швидким)"""
+        with self._cond:
+            self._listeners.add(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.discard(callback)
+
+    def latest(self):
+        """Останній елемент буфера або None"""
+        with self._cond:
+            return self._buffer[-1] if self._buffer else None
+
+    def _wake_async_waiters(self):
+        with self._cond:
+            waiters = list(self._async_waiters.items())
+        for waiter, loop in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # Цикл подій уже закрито
+                pass
+
+    def events_after(self, last_id):
+        """Події з буфера з seq > last_id (без очікування)"""
+        with self._cond:
+            return [item for item in self._buffer if item[0] > last_id]
+
+    def _previous_snapshot(self, seq):
+        """Знімок події seq - 1, якщо вона ще в буфері"""
+        with self._cond:
+            if not self._buffer:
+                return None
+            index = seq - 1 - self._buffer[0][0]
+            return self._buffer[index][1] if 0 <= index < len(self._buffer) else None
+
+    def encoded(self, item, encoding='json', keyframe=False):
+        """Байти події в заданому кодуванні (кешуються в елементі буфера)"""
+        seq, snapshot, payload, cache = item[:4]
+        if encoding == 'json':
+            return payload
+        keyframe = keyframe or encoding != 'delta' or seq % self.keyframe_interval == 0
+        key = (encoding, keyframe)
+        data = cache.get(key)
+        if data is None:
+            previous = None if keyframe else self._previous_snapshot(seq)
+            event, body = encode_stream_event(encoding, snapshot, previous)
+            data = cache[key] = format_sse_event(self.event_id(item), compact_dumps(body), event)
+        return data
+
+    def _initial_cursor(self, last_event_id):
+        """
+        (seq, synced) для заголовка Last-Event-ID; викликається під self._cond.
+
+        synced - клієнт має знімок події seq, тож наступна може бути дельтою.
+        Невідомий id (відсутній, з іншого запуску або новіший за останню подію)
+        дає останню подію ключовим кадром; старіший за буфер - увесь буфер.
+        """
+        tick = self.parse_event_id(last_event_id)
+        if not self._buffer:
+            return self._last_id, False
+        if tick is None or tick > self._buffer[-1][5]:
+            return self._buffer[-1][0] - 1, False
+        for item in reversed(self._buffer):
+            if item[5] <= tick:
+                return item[0], item[5] == tick
+        return self._buffer[0][0] - 1, False
+
+    def subscribe(self, last_event_id=None, encoding='json', events=()):
+        """Генератор SSE-байтів для одного клієнта (last_event_id - сирий заголовок, events - додаткові типи подій)"""
+        self.start()
+        with self._cond:
+            # Клієнт з відомим Last-Event-ID має стан на cursor, решта - потребує ключового кадру
+            cursor, synced = self._initial_cursor(last_event_id)
+            self.subscribers += 1
+        try:
+            while not self._stop.is_set():
+                with self._cond:
+                    if self._last_id <= cursor:
+                        self._cond.wait(timeout=self.interval * 2)
+                    pending = [item for item in self._buffer if item[0] > cursor]
+                if not pending:
+                    # Коментар-пінг, щоб проксі не закривали з'єднання
+                    yield b": keepalive\n\n"
+                    continue
+                for item in pending:
+                    payload = self.encoded(item, encoding, keyframe=not synced or item[0] != cursor + 1)
+                    cursor, synced = item[0], True
+                    yield payload
+                    for event in events:
+                        if event in item[4]:
+                            yield item[4][event]
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    async def subscribe_async(self, last_event_id=None, encoding='json', events=()):
+        """Асинхронний генератор SSE-байтів (ASGI): не займає потік на клієнта"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.Event()
+        with self._cond:
+            cursor, synced = self._initial_cursor(last_event_id)
+            self.subscribers += 1
+            self._async_waiters[waiter] = loop
+        try:
+            while not self._stop.is_set():
+                pending = self.events_after(cursor)
+                if not pending:
+                    waiter.clear()
+                    # Повторна перевірка після clear(), щоб не пропустити publish()
+                    pending = self.events_after(cursor)
+                if not pending:
+                    try:
+                        await asyncio.wait_for(waiter.wait(), timeout=self.interval * 2)
+                    except asyncio.TimeoutError:
+                        yield b": keepalive\n\n"
+                    continue
+                for item in pending:
+                    payload = self.encoded(item, encoding, keyframe=not synced or item[0] != cursor + 1)
+                    cursor, synced = item[0], True
+                    yield payload
+                    for event in events:
+                        if event in item[4]:
+                            yield item[4][event]
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+                self._async_waiters.pop(waiter, None)
+
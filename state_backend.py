@@ -0,0 +1,631 @@
+"""
+Сховище стану симуляції і пристроїв
+
+LocalStateBackend - стан у пам'яті процесу (один воркер).
+SharedStateBackend - файл фіксованої структури, відображений у пам'ять
+(mmap) усіма воркерами gunicorn: скаляри симуляції, останній знімок,
+бітсет зайнятості місць і таблиця пристроїв. Зміни виконуються під блокуванням файлу (flock), тому
+кожен тік і кожне оновлення пристрою послідовні для всіх процесів.
+
+Локальні словники state і device_states лишаються робочою копією: перед
+зміною вони оновлюються з файлу, після зміни записуються назад, а зміни
+інших воркерів підтягуються за глобальною версією пристроїв.
+
+Ідентифікатори, які бачать клієнти, теж беруться зі спільного файлу: мітка
+запуску (epoch) для ETag і id подій SSE, версії пристроїв, номер тіку і номери
+синхронізації з Firebase. Тому будь-який воркер розуміє ETag, Last-Event-ID,
+wait_for_version і /api/devices/sync/<seq>, видані іншим.
+
+Кожен процес займає у файлі слот зі своїм pid. Якщо під час підключення
+жоден інший слот не належить живому процесу, файл лишився від попереднього
+запуску і ініціалізується заново: новий запуск отримує новий epoch і не
+успадковує старих станів пристроїв.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from device_registry import device_fields
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # Windows: лише локальний стан
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Тік SSE вважається належним, якщо з попереднього минуло 80% інтервалу:
+# воркери прокидаються з різною фазою, а продюсер - з невеликим дрейфом
+LEASE_FRACTION = 0.8
+
+SIMULATION_FIELDS = ('free_spots', 'co_level', 'nox_level', 'temperature', 'time_counter')
+
+
+def new_epoch():
+    """Мітка запуску (hex мілісекунд) для ETag і id подій"""
+    return format(int(time.time() * 1000), 'x')
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class LocalStateBackend:
+    """Стан у пам'яті процесу; блокування лише між потоками"""
+
+    name = 'local'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = None
+        self._last_tick_time = 0.0
+        self._on_devices_changed = None
+        self.epoch = new_epoch()
+
+    def attach(self, state, device_states, local_ids=(), on_devices_changed=None, occupancy=None):
+        """Підключає робочі копії стану; повертає id пристроїв, змінених іншими процесами"""
+        self._state = state
+        self._on_devices_changed = on_devices_changed
+        return set()
+
+    def device_versions(self):
+        """Версії пристроїв ведуться кешем процесу"""
+        return None
+
+    def sync_sequence(self):
+        """Номери синхронізації ведуться чергою процесу"""
+        return None
+
+    @contextmanager
+    def locked(self):
+        """Узгоджене читання стану (наприклад, зайнятості місць)"""
+        with self._lock:
+            yield
+
+    def start(self):
+        pass
+
+    def step(self, simulator):
+        """Наступний тік симуляції"""
+        with self._lock:
+            snapshot = simulator.step()
+            self._latest = (simulator.state['time_counter'], snapshot)
+            return snapshot
+
+    def advance_if_due(self, simulator, interval, after_tick=0):
+        """
+        Тік для SSE, якщо з попереднього минуло достатньо часу.
+
+        Повертає (tick, snapshot, advanced) або None, якщо знімка новішого
+        за after_tick немає.
+        """
+        with self._lock:
+            advanced = False
+            now = time.time()
+            if self._latest is None or now - self._last_tick_time >= interval * LEASE_FRACTION:
+                snapshot = simulator.step()
+                self._latest = (simulator.state['time_counter'], snapshot)
+                self._last_tick_time = now
+                advanced = True
+            tick, snapshot = self._latest
+        if tick <= after_tick:
+            return None
+        return tick, snapshot, advanced
+
+    @contextmanager
+    def update_devices(self, device_ids=None, local=True):
+        """
+        Контекст для зміни пристроїв (None - усі).
+
+        Після виходу, ще під блокуванням, викликається on_devices_changed, тож
+        версії в кеші зростають у тому ж порядку, що й зміни.
+        """
+        with self._lock:
+            yield None
+            if self._on_devices_changed is not None and (device_ids is None or device_ids):
+                self._on_devices_changed(device_ids, local=local)
+
+    def refresh_needed(self):
+        return False
+
+    def refresh_devices(self):
+        return []
+
+
+class SharedStateBackend:
+    """Стан у файлі, відображеному в пам'ять усіма воркерами"""
+
+    name = 'shared'
+
+    MAGIC = 0x53505353_54415445  # 'SPSSTATE'
+    LAYOUT_VERSION = 3
+    HEADER_BYTES = 256
+    HEADER_DTYPE = np.dtype([
+        ('magic', '<u8'),
+        ('layout', '<u4'),
+        ('snapshot_capacity', '<u4'),
+        ('inventory_hash', '<u8'),
+        ('device_count', '<u4'),
+        ('max_fields', '<u4'),
+        ('device_version', '<u8'),
+        ('snapshot_tick', '<i8'),
+        ('last_tick_time', '<f8'),
+        ('snapshot_len', '<u4'),
+        ('_pad', '<u4'),
+        ('free_spots', '<i8'),
+        ('co_level', '<f8'),
+        ('nox_level', '<f8'),
+        ('temperature', '<f8'),
+        ('time_counter', '<i8'),
+        ('epoch', '<u8'),
+        ('sync_seq', '<u8'),
+    ])
+    # Слоти черг синхронізації: pid воркера і його найменший незакомічений seq (0 - немає)
+    SYNC_SLOTS = 256
+    SYNC_SLOT_DTYPE = np.dtype([('pid', '<i8'), ('outstanding', '<u8')])
+
+    def __init__(self, path, snapshot_capacity=65536, refresh_interval=0.05):
+        self.path = path
+        self.snapshot_capacity = snapshot_capacity
+        self.refresh_interval = refresh_interval
+        self._pid = None
+        self._fd = None
+        self._thread_lock = threading.Lock()
+        self._watcher = None
+
+    # --- Розмітка файлу ---------------------------------------------------
+
+    def attach(self, state, device_states, local_ids=(), on_devices_changed=None, occupancy=None):
+        """
+        Відкриває (або створює) файл стану і синхронізує з ним робочі копії.
+
+        Перший процес записує у файл свій стан; наступні копіюють стан із файлу.
+        local_ids - пристрої, відновлені зі знімка (вважаються зміненими).
+        occupancy - OccupancyModel, бітсет і лічильники якого переносяться у файл.
+        Повертає id пристроїв, змінених іншими процесами (або до перезапуску).
+        """
+        self._state = state
+        self._devices = device_states
+        self._on_devices_changed = on_devices_changed
+        self._ids = list(device_states)
+        self._index = {device_id: i for i, device_id in enumerate(self._ids)}
+        self._fields = [tuple(device_fields(d['device_type'])) for d in device_states.values()]
+        max_fields = max((len(f) for f in self._fields), default=1) or 1
+        self._record_dtype = np.dtype([
+            ('version', '<u8'),
+            ('last_updated', '<i8'),
+            ('enabled', 'u1'),
+            ('values', '<i4', (max_fields,)),
+        ])
+        geometry = None
+        words = segments = 0
+        if occupancy is not None:
+            geometry = (occupancy.spots, occupancy.levels, occupancy.zones_per_level)
+            words, segments = len(occupancy.words), len(occupancy.counts)
+            # Знімок містить parking_sensors: до 3 байтів JSON на місце
+            self.snapshot_capacity = max(self.snapshot_capacity, occupancy.spots * 3 + 4096)
+        self.snapshot_capacity = (self.snapshot_capacity + 7) // 8 * 8
+        inventory = json.dumps([geometry, [(d['device_id'], d['device_type']) for d in device_states.values()]])
+        inventory_hash = int.from_bytes(hashlib.blake2b(inventory.encode(), digest_size=8).digest(), 'little')
+
+        self._sync_offset = self.HEADER_BYTES
+        self._snapshot_offset = self._sync_offset + self.SYNC_SLOT_DTYPE.itemsize * self.SYNC_SLOTS
+        self._occupancy_offset = self._snapshot_offset + self.snapshot_capacity
+        self._devices_offset = self._occupancy_offset + 8 * (words + segments)
+        size = self._devices_offset + self._record_dtype.itemsize * max(1, len(self._ids))
+
+        self._fd, self._pid = self._open(size), os.getpid()
+        with self._lock():
+            self._mmap = mmap.mmap(self._fd, size)
+            self._header = np.ndarray((), dtype=self.HEADER_DTYPE, buffer=self._mmap)
+            self._sync_slots = np.ndarray(
+                self.SYNC_SLOTS, dtype=self.SYNC_SLOT_DTYPE, buffer=self._mmap, offset=self._sync_offset
+            )
+            self._snapshot_buffer = np.ndarray(
+                self.snapshot_capacity, dtype='u1', buffer=self._mmap, offset=self._snapshot_offset
+            )
+            self._records = np.ndarray(
+                len(self._ids), dtype=self._record_dtype, buffer=self._mmap, offset=self._devices_offset
+            )
+            # Колонки таблиці: доступ до елемента 1-D масиву швидший, ніж до запису np.void
+            self._versions = self._records['version']
+            self._last_updated = self._records['last_updated']
+            self._enabled = self._records['enabled']
+            self._values = self._records['values']
+            header = self._header
+            # Файл, який не використовує жоден живий процес, лишився від попереднього
+            # запуску: його стан (пристрої, тік, epoch) не переноситься у новий
+            initialize = (not self._in_use() or header['magic'] != self.MAGIC or header['layout'] != self.LAYOUT_VERSION
+                          or header['inventory_hash'] != inventory_hash
+                          or header['snapshot_capacity'] != self.snapshot_capacity)
+            if occupancy is not None:
+                occupancy.bind(
+                    np.ndarray(words, dtype='<u8', buffer=self._mmap, offset=self._occupancy_offset),
+                    np.ndarray(segments, dtype='<i8', buffer=self._mmap, offset=self._occupancy_offset + 8 * words),
+                    copy=initialize
+                )
+            if initialize:
+                self._initialize(inventory_hash, max_fields, local_ids)
+                self._seen_version = int(header['device_version'])
+                self.epoch = format(int(header['epoch']), 'x')
+                self._sync_slot()
+                logger.info(f"🗂️  Спільний стан створено: {self.path}")
+                return set()
+            # Робочі копії - зі спільного файлу; "зміненими" вважаються записи з версією > 0
+            for index in range(len(self._ids)):
+                self._load_device(index)
+            changed = [self._ids[i] for i in np.flatnonzero(self._versions > 0)]
+            self._seen_version = int(header['device_version'])
+            self.epoch = format(int(header['epoch']), 'x')
+            self._load_simulation()
+            self._sync_slot()
+            logger.info(f"🗂️  Підключено спільний стан: {self.path} (тік {int(header['time_counter'])})")
+            return set(changed)
+
+    def _open(self, size):
+        """
+        Дескриптор файлу стану розміру size.
+
+        Файл іншого розміру не змінюється на місці: процеси, що його відобразили,
+        отримали б SIGBUS. Натомість поруч створюється новий файл і атомарно
+        підміняє старий (os.replace); старий лишається у цих процесах до їх завершення.
+        """
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                opened = os.fstat(fd)
+                try:
+                    current = os.stat(self.path)
+                except FileNotFoundError:
+                    current = None
+                if current is not None and (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                    if opened.st_size != size:
+                        replaced, fd = fd, self._create(size)
+                        os.close(replaced)
+                    else:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                    return fd
+            except BaseException:
+                os.close(fd)
+                raise
+            # Поки чекали блокування, файл підмінив інший процес: відкриваємо новий
+            os.close(fd)
+
+    def _create(self, size):
+        directory, name = os.path.split(self.path)
+        fd, temp_path = tempfile.mkstemp(prefix=f'.{name}.', dir=directory or None)
+        try:
+            os.ftruncate(fd, size)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.close(fd)
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return fd
+
+    def _in_use(self):
+        """Чи зайняв слот у файлі інший живий процес"""
+        pid = os.getpid()
+        return any(slot_pid not in (0, pid) and _process_alive(slot_pid)
+                   for slot_pid in self._sync_slots['pid'].tolist())
+
+    def _initialize(self, inventory_hash, max_fields, local_ids):
+        header = self._header
+        previous_epoch = int(header['epoch']) if header['magic'] == self.MAGIC else 0
+        header['magic'] = 0
+        self._records[:] = np.zeros(len(self._ids), dtype=self._record_dtype)
+        for i in range(len(self._ids)):
+            self._store_device(i)
+        local_index = [i for i, device_id in enumerate(self._ids) if device_id in local_ids]
+        if local_index:
+            self._versions[local_index] = 1
+        header['layout'] = self.LAYOUT_VERSION
+        header['snapshot_capacity'] = self.snapshot_capacity
+        header['inventory_hash'] = inventory_hash
+        header['device_count'] = len(self._ids)
+        header['max_fields'] = max_fields
+        header['device_version'] = 1 if local_index else 0
+        header['snapshot_tick'] = 0
+        header['last_tick_time'] = 0.0
+        header['snapshot_len'] = 0
+        # Навіть перезапуск у ту саму мілісекунду дає нову мітку
+        header['epoch'] = max(int(new_epoch(), 16), previous_epoch + 1)
+        header['sync_seq'] = 0
+        self._sync_slots[:] = np.zeros(self.SYNC_SLOTS, dtype=self.SYNC_SLOT_DTYPE)
+        self._store_simulation()
+        # magic останнім: інші процеси бачать файл готовим лише після повної ініціалізації
+        header['magic'] = self.MAGIC
+
+    # --- Блокування -------------------------------------------------------
+
+    @contextmanager
+    def _lock(self):
+        if self._pid != os.getpid():
+            # Після fork: власний дескриптор, інакше flock спільний з батьківським процесом
+            self._fd = os.open(self.path, os.O_RDWR)
+            self._pid = os.getpid()
+            self._thread_lock = threading.Lock()
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def locked(self):
+        """Узгоджене читання стану (наприклад, зайнятості місць) між тіками воркерів"""
+        with self._lock():
+            yield
+
+    # --- Симуляція --------------------------------------------------------
+
+    def _load_simulation(self):
+        header = self._header
+        state = self._state
+        state['free_spots'] = int(header['free_spots'])
+        state['co_level'] = float(header['co_level'])
+        state['nox_level'] = float(header['nox_level'])
+        state['temperature'] = float(header['temperature'])
+        state['time_counter'] = int(header['time_counter'])
+
+    def _store_simulation(self):
+        header = self._header
+        for name in SIMULATION_FIELDS:
+            header[name] = self._state[name]
+
+    def _store_snapshot(self, snapshot):
+        payload = json.dumps(snapshot).encode('utf-8')
+        if len(payload) > self.snapshot_capacity:
+            # Знімок не вміщається: воркери-послідовники генеруватимуть тік самі
+            self._header['snapshot_len'] = 0
+            return
+        self._snapshot_buffer[:len(payload)] = np.frombuffer(payload, dtype='u1')
+        self._header['snapshot_len'] = len(payload)
+
+    def _load_snapshot(self):
+        length = int(self._header['snapshot_len'])
+        if not length:
+            return None
+        return json.loads(self._snapshot_buffer[:length].tobytes())
+
+    def _step_locked(self, simulator):
+        self._load_simulation()
+        snapshot = simulator.step()
+        self._store_simulation()
+        return snapshot
+
+    def step(self, simulator):
+        """Наступний тік спільної симуляції"""
+        with self._lock():
+            return self._step_locked(simulator)
+
+    def advance_if_due(self, simulator, interval, after_tick=0):
+        """
+        Тік для SSE не частіше ніж раз на інтервал для всіх воркерів.
+
+        Перший воркер, що прокинувся після інтервалу, генерує тік (оренда),
+        решта отримують той самий знімок. Повертає (tick, snapshot, advanced)
+        або None, якщо знімка новішого за after_tick немає.
+        """
+        with self._lock():
+            header = self._header
+            now = time.time()
+            snapshot = None
+            advanced = False
+            if not header['snapshot_len'] or now - float(header['last_tick_time']) >= interval * LEASE_FRACTION:
+                snapshot = self._step_locked(simulator)
+                # Знімок для інших воркерів зберігається лише для тіків SSE
+                self._store_snapshot(snapshot)
+                header['snapshot_tick'] = self._state['time_counter']
+                header['last_tick_time'] = now
+                advanced = True
+            tick = int(header['snapshot_tick'])
+            if tick <= after_tick:
+                return None
+            if snapshot is None:
+                snapshot = self._load_snapshot()
+        return tick, snapshot, advanced
+
+    # --- Пристрої ---------------------------------------------------------
+
+    def _store_device(self, index, version=None):
+        device = self._devices[self._ids[index]]
+        self._enabled[index] = device['enabled']
+        self._last_updated[index] = device['last_updated']
+        fields = self._fields[index]
+        if fields:
+            self._values[index, :len(fields)] = [device[name] for name in fields]
+        if version is not None:
+            self._versions[index] = version
+
+    def _load_device(self, index):
+        device = self._devices[self._ids[index]]
+        device['enabled'] = bool(self._enabled[index])
+        device['last_updated'] = int(self._last_updated[index])
+        for name, value in zip(self._fields[index], self._values[index].tolist()):
+            device[name] = value
+
+    def device_versions(self):
+        """(версія колекції, {id: версія}) зі спільного файлу для кешу відповідей"""
+        with self._lock():
+            return int(self._header['device_version']), dict(zip(self._ids, self._versions.tolist()))
+
+    def _refresh_locked(self):
+        """
+        Копіює в робочі словники записи, змінені іншими воркерами.
+
+        Сповіщення - ще під блокуванням, з версіями записів: кеш отримує зміни
+        в порядку версій і ті самі номери, що й інші воркери.
+        """
+        version = int(self._header['device_version'])
+        if version == self._seen_version:
+            return []
+        changed = np.flatnonzero(self._versions > self._seen_version)
+        for index in changed:
+            self._load_device(index)
+        self._seen_version = version
+        device_ids = [self._ids[index] for index in changed]
+        if device_ids and self._on_devices_changed is not None:
+            self._on_devices_changed(device_ids, version=version, device_versions=dict(
+                zip(device_ids, self._versions[changed].tolist())
+            ))
+        return device_ids
+
+    def refresh_needed(self):
+        """Чи є зміни інших воркерів (одне читання з пам'яті, без блокування)"""
+        return int(self._header['device_version']) != self._seen_version
+
+    def refresh_devices(self):
+        """Підтягує зміни інших воркерів; без змін - одне читання з пам'яті"""
+        if not self.refresh_needed():
+            return []
+        with self._lock():
+            return self._refresh_locked()
+
+    @contextmanager
+    def update_devices(self, device_ids=None, local=True):
+        """
+        Контекст для зміни пристроїв (None - усі); повертає нову версію.
+
+        Під блокуванням файлу робочі копії спершу оновлюються змінами інших
+        воркерів, а після виходу з контексту змінені записи пишуться у файл
+        і викликається on_devices_changed (local - змінено цим сервером).
+        """
+        with self._lock():
+            self._refresh_locked()
+            version = int(self._header['device_version']) + 1
+            yield version
+            indexes = range(len(self._ids)) if device_ids is None else [
+                self._index[device_id] for device_id in device_ids
+            ]
+            if not indexes:
+                return
+            for index in indexes:
+                self._store_device(index, version)
+            self._header['device_version'] = version
+            self._seen_version = version
+            if self._on_devices_changed is not None:
+                self._on_devices_changed(device_ids, local=local, version=version)
+
+    # --- Номери синхронізації з Firebase ----------------------------------
+
+    def sync_sequence(self):
+        """Спільні для воркерів номери синхронізації (для FirebaseSyncQueue)"""
+        return SharedSyncSequence(self)
+
+    def _sync_slot(self):
+        """Індекс слота цього процесу; вільний слот - без pid або процесу, що завершився"""
+        pid = os.getpid()
+        pids = self._sync_slots['pid']
+        own = np.flatnonzero(pids == pid)
+        if len(own):
+            return int(own[0])
+        for index, slot_pid in enumerate(pids.tolist()):
+            if slot_pid == 0 or not _process_alive(slot_pid):
+                self._sync_slots[index] = (pid, 0)
+                return index
+        raise RuntimeError(f"No free Firebase sync slots ({self.SYNC_SLOTS} processes)")
+
+    # --- Фоновий потік ----------------------------------------------------
+
+    def start(self):
+        """Потік, що підтягує зміни інших воркерів (для long-poll і потоків подій)"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher = threading.Thread(target=self._watch, name='state-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh_devices()
+            except Exception as e:
+                logger.error(f"❌ Помилка оновлення спільного стану: {e}")
+
+
+class SharedSyncSequence:
+    """
+    Номери синхронізації з Firebase для всіх воркерів.
+
+    Номери видає лічильник у заголовку файлу, а кожен воркер тримає у своєму
+    слоті найменший незакомічений номер. Закомічено все нижче найменшого
+    з них: консервативно, але однаково для будь-якого воркера. Слоти
+    завершених процесів звільняються (їхні незаписані оновлення втрачено).
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def allocate(self, count):
+        """Резервує count номерів поспіль; повертає останній"""
+        backend = self._backend
+        with backend._lock():
+            header = backend._header
+            first = int(header['sync_seq']) + 1
+            header['sync_seq'] = first + count - 1
+            # Під тим самим блокуванням: інший воркер не побачить номер закоміченим
+            slot = backend._sync_slots[backend._sync_slot()]
+            if not slot['outstanding']:
+                slot['outstanding'] = first
+            return first + count - 1
+
+    def report(self, outstanding):
+        """Найменший незакомічений номер цього воркера (0 - усе записано)"""
+        backend = self._backend
+        with backend._lock():
+            backend._sync_slots[backend._sync_slot()]['outstanding'] = outstanding
+
+    def committed(self, local_committed):
+        """Номер, до якого (включно) записано оновлення всіх воркерів"""
+        backend = self._backend
+        with backend._lock():
+            slots = backend._sync_slots
+            lowest = None
+            for index in np.flatnonzero(slots['outstanding'] > 0):
+                pid, outstanding = int(slots[index]['pid']), int(slots[index]['outstanding'])
+                if not _process_alive(pid):
+                    slots[index] = (0, 0)
+                    continue
+                lowest = outstanding if lowest is None else min(lowest, outstanding)
+            return lowest - 1 if lowest is not None else int(backend._header['sync_seq'])
+
+
+def default_state_path(port=None):
+    """Файл спільного стану: /dev/shm (пам'ять), інакше тимчасовий каталог"""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(directory, f"smart-parking-{uid}-{port or 5000}.state")
+
+
+def create_state_backend(kind='shared', path=None, port=None):
+    """STATE_BACKEND: shared (за замовчуванням) або local"""
+    kind = (kind or 'shared').lower()
+    if kind == 'local':
+        return LocalStateBackend()
+    if kind != 'shared':
+        raise ValueError(f"Unknown STATE_BACKEND: {kind}")
+    if not FCNTL_AVAILABLE:
+        logger.warning("⚠️  Спільний стан недоступний на цій платформі, використовую локальний")
+        return LocalStateBackend()
+    return SharedStateBackend(path or default_state_path(port))
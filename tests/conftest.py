@@ -0,0 +1,51 @@
+"""
+Спільні налаштування тестів
+
+Модулі лежать у корені репозиторію; сервер у тестах працює з локальним
+станом процесу, без файлу спільного стану і без журналу в окремому потоці.
+"""
+
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('STATE_BACKEND', 'local')
+os.environ.setdefault('LOG_ASYNC', 'False')
+os.environ.pop('FIREBASE_CREDENTIALS', None)
+os.environ.pop('SENSOR_HISTORY_PATH', None)
+
+import pytest
+
+
+@pytest.fixture
+def server():
+    """Модуль сервера; стани пристроїв після тесту відновлюються (словники - на місці)"""
+    import sensor_api_server
+
+    saved = copy.deepcopy(sensor_api_server.device_states)
+    yield sensor_api_server
+    devices = sensor_api_server.device_states
+    if devices != saved:
+        # Через сховище стану: кеш відповідей отримує нову версію
+        with sensor_api_server.state_backend.update_devices(local=False):
+            for device_id, device in devices.items():
+                device.clear()
+                device.update(saved[device_id])
+
+
+@pytest.fixture
+def firestore(server, monkeypatch):
+    """Сервер з Firestore у пам'яті замість справжнього Firebase"""
+    from firestore_memory import InMemoryFirestore
+
+    db = InMemoryFirestore()
+    monkeypatch.setattr(server, 'db', db)
+    monkeypatch.setattr(server, 'FIREBASE_ENABLED', True)
+    yield db
+    # Черга спільна для тестів: незаписані оновлення не повинні дійти до Firestore наступного
+    deadline = time.monotonic() + 5
+    while server.firebase_sync_queue.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
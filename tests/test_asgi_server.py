@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('a2wsgi')
+pytest.importorskip('httpx')
+
+from starlette.testclient import TestClient
+
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@pytest.fixture
+def client(server):
+    import asgi_server
+
+    return TestClient(asgi_server.app)
+
+
+def test_websocket_command_round_trip_runs_off_event_loop(server, client, monkeypatch):
+    calls = []
+    command = server.ws_gateway.command
+
+    def recording_command(device_id, data):
+        calls.append(on_event_loop())
+        return command(device_id, data)
+
+    monkeypatch.setattr(server.ws_gateway, 'command', recording_command)
+    with client.websocket_connect('/api/ws') as websocket:
+        websocket.send_text(json.dumps({'id': 7, 'type': 'command', 'device_id': 'ventilation_1',
+                                        'set': {'enabled': True, 'fan_speed': 3}}))
+        ack = json.loads(websocket.receive_text())
+        websocket.send_text(json.dumps({'id': 8, 'type': 'command', 'device_id': 'missing', 'set': {}}))
+        error = json.loads(websocket.receive_text())
+
+    assert ack['type'] == 'ack' and ack['id'] == 7 and ack['ok']
+    assert ack['result']['fan_speed'] == 3 and ack['result']['status'] == 'updated'
+    assert server.device_states['ventilation_1']['fan_speed'] == 3
+    assert error == {'type': 'ack', 'id': 8, 'ok': False, 'error': 'Device not found'}
+    # Команди виконуються в пулі потоків, а не на циклі подій
+    assert calls == [False, False]
+
+
+def test_put_rejects_malformed_json(client):
+    response = client.put('/api/devices/ventilation_1', content=b'{"enabled": tru',
+                          headers={'Content-Type': 'application/json'})
+    assert response.status_code == 400
+    assert response.json() == {'error': 'Request body must be valid JSON'}
+
+
+def test_put_updates_and_syncs_off_event_loop(server, firestore, client, monkeypatch):
+    calls = []
+    sync = server.sync_device_to_firebase
+
+    def recording_sync(device):
+        calls.append(on_event_loop())
+        return sync(device)
+
+    monkeypatch.setattr(server, 'sync_device_to_firebase', recording_sync)
+    response = client.put('/api/devices/heating_1', json={'enabled': True, 'heating_power': 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['heating_power'] == 2 and body['sync_seq'] is not None
+    assert calls == [False]
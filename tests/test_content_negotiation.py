@@ -0,0 +1,18 @@
+import json
+
+PAYLOAD = {'zone': 'A', 'free_spots': 12, 'co_level': 31.5, 'note': 'вільно', 'spots': [0, 1, 1]}
+
+
+def test_json_body_matches_jsonify(server):
+    with server.app.test_request_context():
+        expected = server.jsonify(PAYLOAD).get_data()
+        assert server.json_body(PAYLOAD).encode('utf-8') == expected
+        assert server.api_response(PAYLOAD).get_data() == expected
+
+
+def test_json_response_is_compact(server):
+    body = server.app.test_client().get('/api/sensor-data').get_data()
+    assert b', ' not in body and b'": ' not in body
+    assert body.endswith(b'}\n')
+    assert set(json.loads(body)) >= {'timestamp', 'free_spots', 'co_level'}
+
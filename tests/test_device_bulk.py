@@ -0,0 +1,44 @@
+import pytest
+
+from device_registry import DeviceValidationError, build_inventory, parse_bool, validate_changes
+
+
+def test_validate_changes_rejects_infinity():
+    with pytest.raises(DeviceValidationError):
+        validate_changes('VENTILATION', {'fan_speed': float('inf')})
+
+
+def test_parse_bool_accepts_json_and_query_values():
+    assert parse_bool(True) is True
+    assert parse_bool('false') is False
+    assert parse_bool(None) is None
+    with pytest.raises(DeviceValidationError):
+        parse_bool('maybe')
+
+
+@pytest.mark.parametrize('selector', [['VENTILATION'], 'VENTILATION', {'type': ['VENTILATION']},
+                                      {'enabled': 'maybe'}])
+def test_bulk_update_rejects_invalid_filter(server, selector):
+    response = server.app.test_client().patch('/api/devices', json={'filter': selector, 'set': {'enabled': True}})
+    assert response.status_code == 400
+
+
+def test_bulk_update_parses_enabled_filter_string(server):
+    client = server.app.test_client()
+    client.patch('/api/devices', json={'filter': {}, 'set': {'enabled': False}})
+    response = client.patch('/api/devices', json={'filter': {'enabled': 'false'}, 'set': {'enabled': True}})
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == len(server.device_states)
+
+
+@pytest.mark.parametrize('spec', [{'VENTILATION': 1, 'SPRINKLER': 2},
+                                  [{'device_id': 'sprinkler_1', 'device_type': 'SPRINKLER'}]])
+def test_build_inventory_rejects_unknown_type(spec):
+    with pytest.raises(ValueError, match="Unknown device types: \\['SPRINKLER'\\]"):
+        build_inventory(spec)
+
+
+def test_build_inventory_from_counts_and_list():
+    assert list(build_inventory({'HEATING': 2})) == ['heating_1', 'heating_2']
+    devices = build_inventory([{'device_id': 'fan_a', 'device_type': 'VENTILATION'}])
+    assert devices['fan_a']['fan_speed'] == 1
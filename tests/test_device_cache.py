@@ -0,0 +1,26 @@
+def test_cached_device_bodies_match_jsonify(server):
+    client = server.app.test_client()
+    with server.app.test_request_context():
+        collection = server.jsonify({'devices': list(server.device_states.values())}).get_data()
+        device = server.jsonify(server.device_states['heating_1']).get_data()
+    # Двічі: друга відповідь - з кешу тіл
+    for _ in range(2):
+        assert client.get('/api/devices').get_data() == collection
+        assert client.get('/api/devices/heating_1').get_data() == device
+
+
+def test_filtered_device_body_matches_jsonify(server):
+    response = server.app.test_client().get('/api/devices?type=HEATING')
+    with server.app.test_request_context():
+        expected = server.jsonify({'devices': [server.device_states['heating_1']]}).get_data()
+    assert response.get_data() == expected
+
+
+def test_device_change_event_is_compact(server):
+    stream = server.device_cache.subscribe(None)
+    try:
+        event = next(stream)
+    finally:
+        stream.close()
+    data = event.split(b'data: ', 1)[1]
+    assert b', ' not in data and b'": ' not in data
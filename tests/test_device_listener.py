@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def listener(server, firestore, monkeypatch):
+    """Слухач device_states, підписаний як після узгодження стану з Firebase"""
+    monkeypatch.setattr(server, 'firebase_reconciled', True)
+    watch = firestore.collection('device_states').on_snapshot(server.on_device_documents)
+    yield firestore.collection('device_states')
+    watch.unsubscribe()
+
+
+def remote_document(server, device_id, **changes):
+    """Документ, змінений іншим інстансом (новіший за локальний стан)"""
+    device = server.device_states[device_id]
+    document = server.device_to_firebase_data(device)
+    document.update(changes, last_updated=device['last_updated'] + 1000)
+    return document
+
+
+def parse_event(raw):
+    fields = dict(line.split(': ', 1) for line in raw.decode('utf-8').strip().split('\n'))
+    return fields['id'], fields['event'], json.loads(fields['data'])
+
+
+def test_added_and_modified_documents_are_applied(server, listener):
+    version = server.device_cache.version
+    listener.document('heating_1').set(remote_document(server, 'heating_1', enabled=True, heating_power=2))
+    assert server.device_states['heating_1']['heating_power'] == 2
+    assert server.device_cache.version == version + 1
+
+    listener.document('heating_1').set(remote_document(server, 'heating_1', heating_power=1))
+    assert server.device_states['heating_1']['heating_power'] == 1
+    assert server.device_cache.version == version + 2
+
+
+def test_stale_document_is_ignored(server, listener):
+    device = server.device_states['ventilation_1']
+    speed = device['fan_speed']
+    document = remote_document(server, 'ventilation_1', fan_speed=speed % 3 + 1)
+    document['last_updated'] = device['last_updated'] - 1
+    version = server.device_cache.version
+    listener.document('ventilation_1').set(document)
+    assert device['fan_speed'] == speed
+    assert server.device_cache.version == version
+
+
+def test_removed_document_keeps_device_state(server, listener):
+    listener.document('direction_panels_1').set(remote_document(server, 'direction_panels_1', brightness=30))
+    # Локальний стан відрізняється від видаленого документа (як MODIFIED він би застосувався)
+    server.device_states['direction_panels_1']['brightness'] = 60
+    state = dict(server.device_states['direction_panels_1'])
+    version = server.device_cache.version
+    # Пристрої задає інвентар: видалений документ не видаляє і не скидає пристрій
+    listener.document('direction_panels_1').delete()
+    assert server.device_states['direction_panels_1'] == state
+    assert server.device_cache.version == version
+
+
+def test_own_writes_are_not_applied_again(server, listener):
+    client = server.app.test_client()
+    response = client.put('/api/devices/ventilation_1', json={'enabled': True, 'fan_speed': 2})
+    seq = response.get_json()['sync_seq']
+    version = server.device_cache.version
+    assert server.firebase_sync_queue.wait(seq, timeout=5)
+    # Слухач отримав відлуння запису черги, але стан і версія не змінилися
+    assert listener.document('ventilation_1').get().to_dict()['fan_speed'] == 2
+    assert server.device_cache.version == version
+
+
+def test_device_stream_sends_snapshot_then_remote_changes(server, listener):
+    response = server.app.test_client().get('/api/devices/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    try:
+        event_id, event, data = parse_event(next(stream))
+        assert event == 'devices'
+        assert event_id == f"{server.device_cache.epoch}-{server.device_cache.version}"
+        assert data['full'] and len(data['devices']) == len(server.device_states)
+
+        listener.document('heating_1').set(remote_document(server, 'heating_1', enabled=False))
+        event_id, event, data = parse_event(next(stream))
+        assert event_id == f"{server.device_cache.epoch}-{data['version']}"
+        assert data['full'] is False
+        assert [device['device_id'] for device in data['devices']] == ['heating_1']
+        assert data['devices'][0]['enabled'] is False
+    finally:
+        response.close()
@@ -0,0 +1,55 @@
+from firebase_client import FirebaseConnector
+
+
+def flaky_connect(failures, error=ConnectionError):
+    calls = []
+
+    def connect(source):
+        calls.append(source)
+        if len(calls) <= failures:
+            raise error('unavailable')
+        return object()
+    return connect, calls
+
+
+def test_transient_errors_are_retried():
+    connect, calls = flaky_connect(2)
+    connector = FirebaseConnector(('env', '{}'), connect=connect, retry_base=0.01)
+    connector.start()
+    assert connector.wait(5)
+    assert connector.state == 'connected'
+    assert (len(calls), connector.attempts, connector.error) == (3, 3, None)
+
+
+def test_configuration_error_fails_without_retry():
+    connect, calls = flaky_connect(5, ValueError)
+    connector = FirebaseConnector(('env', '{}'), connect=connect, retry_base=0.01)
+    connector.start()
+    assert connector.wait(5)
+    assert connector.state == 'failed'
+    assert len(calls) == 1 and connector.error == 'unavailable'
+
+
+def test_reset_after_fork_reconnects():
+    connected = []
+    connect, calls = flaky_connect(0)
+    connector = FirebaseConnector(('env', '{}'), on_connect=connected.append, connect=connect)
+    connector.start()
+    assert connector.wait(5)
+    parent_client = connector.client
+
+    connector.reset()
+    assert (connector.state, connector.client) == ('pending', None)
+    connector.start()
+    assert connector.wait(5)
+    assert connector.state == 'connected' and connector.client is not parent_client
+    assert len(calls) == 2 and connected == [parent_client, connector.client]
+
+
+def test_health_reports_failed_firebase(server, monkeypatch):
+    monkeypatch.setattr(server.firebase_connector, 'state', 'failed')
+    monkeypatch.setattr(server.firebase_connector, 'error', 'bad credentials')
+    response = server.app.test_client().get('/api/health')
+    assert response.status_code == 503
+    body = response.get_json()
+    assert (body['status'], body['firebase_error']) == ('error', 'bad credentials')
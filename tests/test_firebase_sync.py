@@ -0,0 +1,130 @@
+import threading
+import time
+
+from firebase_sync import FirebaseSyncQueue
+from firestore_memory import InMemoryFirestore
+
+
+def make_queue(holder, **kwargs):
+    """Черга з клієнтом holder['client'] (None - Firebase ще підключається) і журналом комітів"""
+    commits = []
+    queue = FirebaseSyncQueue(
+        lambda: holder.get('client'), flush_interval=0.01, backoff_base=0.05,
+        on_commit=lambda seconds, documents, error: commits.append((documents, error)),
+        is_enabled=lambda: True, **kwargs
+    )
+    return queue, commits
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.01)
+
+
+def test_updates_of_one_device_are_coalesced():
+    firestore = InMemoryFirestore()
+    holder = {}
+    queue, commits = make_queue(holder)
+    # Поки клієнта немає, оновлення накопичуються
+    for speed in (1, 2, 3):
+        seq = queue.enqueue('ventilation_1', {'device_id': 'ventilation_1', 'fan_speed': speed})
+    queue.enqueue('heating_1', {'device_id': 'heating_1', 'heating_power': 2})
+    assert queue.pending == 2
+
+    holder['client'] = firestore
+    assert queue.wait(seq + 1, timeout=5)
+    assert commits == [(2, None)]
+    assert firestore.documents('device_states')['ventilation_1']['fan_speed'] == 3
+
+
+def test_failed_commit_is_retried_with_backoff():
+    firestore = InMemoryFirestore(fail_next=3)
+    queue, commits = make_queue({'client': firestore})
+    started = time.monotonic()
+    seq = queue.enqueue('ventilation_1', {'device_id': 'ventilation_1', 'fan_speed': 2})
+
+    assert queue.wait(seq, timeout=5)
+    # Затримки 0.05, 0.1, 0.2 с з множником не менше 0.5
+    assert time.monotonic() - started >= 0.175
+    assert queue.failures == 3
+    assert [error is None for _, error in commits] == [False, False, False, True]
+    assert queue.status(seq)['last_error'] is None
+    assert firestore.documents('device_states')['ventilation_1']['fan_speed'] == 2
+
+
+def test_newer_update_survives_failed_commit():
+    firestore = InMemoryFirestore(fail_next=1)
+    failed = threading.Event()
+    queue = FirebaseSyncQueue(
+        lambda: firestore, flush_interval=0.01, backoff_base=0.05, is_enabled=lambda: True,
+        on_commit=lambda seconds, documents, error: error is not None and failed.set()
+    )
+    first = queue.enqueue('ventilation_1', {'device_id': 'ventilation_1', 'fan_speed': 1})
+    assert failed.wait(5)
+    second = queue.enqueue('ventilation_1', {'device_id': 'ventilation_1', 'fan_speed': 3})
+
+    assert queue.wait(second, timeout=5)
+    assert queue.status(first)['synced']
+    assert firestore.documents('device_states')['ventilation_1']['fan_speed'] == 3
+
+
+def test_sync_status_follows_oldest_outstanding_seq():
+    holder = {}
+    queue, _ = make_queue(holder)
+    first = queue.enqueue('ventilation_1', {'device_id': 'ventilation_1', 'fan_speed': 1})
+    second = queue.enqueue('heating_1', {'device_id': 'heating_1', 'heating_power': 1})
+
+    status = queue.status(second)
+    assert (status['seq'], status['synced'], status['pending']) == (second, False, 2)
+    assert status['committed_seq'] < first
+
+    holder['client'] = InMemoryFirestore()
+    assert queue.wait(second, timeout=5)
+    assert queue.status(first)['synced'] and queue.status(second)['synced']
+    assert queue.status(second + 1)['synced'] is False
+
+
+def test_sync_status_endpoint(server, firestore):
+    client = server.app.test_client()
+    response = client.put('/api/devices/ventilation_1', json={'enabled': True, 'fan_speed': 2})
+    seq = response.get_json()['sync_seq']
+    assert seq is not None
+
+    assert server.firebase_sync_queue.wait(seq, timeout=5)
+    status = client.get(f'/api/devices/sync/{seq}').get_json()
+    assert status['synced'] and status['seq'] == seq
+    assert firestore.documents('device_states')['ventilation_1']['fan_speed'] == 2
+
+
+def test_reconciliation_keeps_newer_side_by_last_updated(server, firestore, monkeypatch):
+    devices = server.device_states
+    for device_id in ('direction_panels_1', 'ventilation_1', 'heating_1'):
+        devices[device_id]['last_updated'] = 1000
+    devices['heating_1']['heating_power'] = 1
+    # ventilation_1 і heating_1 змінено локально, поки Firebase підключався
+    monkeypatch.setattr(server, 'local_device_ids', {'ventilation_1', 'heating_1'})
+    monkeypatch.setattr(server, 'firebase_reconciled', False)
+
+    collection = firestore.collection('device_states')
+    # Не змінювався локально: Firestore - джерело істини навіть зі старшим документом
+    collection.document('direction_panels_1').set(
+        {'device_id': 'direction_panels_1', 'device_type': 'DIRECTION_PANELS',
+         'enabled': True, 'brightness': 80, 'last_updated': 500})
+    # Документ новіший за локальну зміну - застосовується
+    collection.document('ventilation_1').set(
+        {'device_id': 'ventilation_1', 'device_type': 'VENTILATION',
+         'enabled': True, 'fan_speed': 3, 'last_updated': 2000})
+    # Локальна зміна новіша - лишається і записується у Firestore
+    collection.document('heating_1').set(
+        {'device_id': 'heating_1', 'device_type': 'HEATING',
+         'enabled': True, 'heating_power': 2, 'last_updated': 500})
+
+    assert server.load_devices_from_firebase()
+    assert server.firebase_reconciled
+    assert devices['direction_panels_1']['brightness'] == 80
+    assert devices['ventilation_1']['fan_speed'] == 3
+    assert devices['heating_1']['heating_power'] == 1
+    wait_until(lambda: firestore.documents('device_states')['heating_1']['last_updated'] == 1000)
+    assert firestore.documents('device_states')['heating_1']['heating_power'] == 1
@@ -0,0 +1,88 @@
+from history_store import SensorHistory
+
+MINUTE = 60 * 1000
+
+
+def snapshot(timestamp, value=1.0):
+    return {'timestamp': timestamp, 'free_spots': value, 'parking_occupied': value,
+            'co_level': value, 'nox_level': value, 'temperature': value}
+
+
+def filled_history(hours, capacity=100):
+    """Знімок щохвилини протягом hours годин; сире кільце тримає лише capacity останніх"""
+    history = SensorHistory(capacity=capacity)
+    for i in range(hours * 60):
+        history.append(snapshot(i * MINUTE))
+    return history
+
+
+def test_default_step_is_multiple_of_level_resolution():
+    history = SensorHistory()
+    assert history.default_step(0, 3600 * 1000) == 12
+    assert history.default_step(0, 24 * 3600 * 1000) == 300
+    assert history.default_step(0, 7 * 24 * 3600 * 1000) == 2100
+
+
+def test_default_step_day_query_covers_whole_range():
+    history = filled_history(24)
+    end = 24 * 60 * MINUTE
+    result = history.query(0, end, history.default_step(0, end))
+    assert result['resolution'] == 300
+    assert len(result['timestamps']) == 288
+    assert sum(result['count']) == 24 * 60
+
+
+def test_inexact_step_rebuckets_coarsest_fitting_level():
+    history = filled_history(24)
+    result = history.query(0, 24 * 60 * MINUTE, 288)
+    assert result['resolution'] == 60
+    assert sum(result['count']) == 24 * 60
+
+
+def test_fine_step_beyond_raw_ring_uses_finest_level():
+    history = filled_history(3)
+    result = history.query(0, 3 * 60 * MINUTE, 5)
+    assert result['resolution'] == 60
+    assert sum(result['count']) == 3 * 60
+
+
+def test_fine_step_within_raw_ring_uses_raw_snapshots():
+    history = filled_history(1)
+    result = history.query(0, 60 * MINUTE, 5)
+    assert result['resolution'] == 0
+    assert sum(result['count']) == 60
+
+
+def append_ticks(path, ticks):
+    history = SensorHistory(capacity=5000, path=path)
+    for i in range(ticks):
+        history.append(snapshot(i * 1000))
+    history.flush()
+
+
+def test_workers_share_history_files_without_duplicates(tmp_path):
+    import multiprocessing
+
+    context = multiprocessing.get_context('fork')
+    # Кожен воркер записує ті самі тіки SSE
+    workers = [context.Process(target=append_ticks, args=(str(tmp_path), 3000)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    history = SensorHistory(capacity=5000, path=str(tmp_path))
+    assert len(history) == 3000
+    timestamps = history.raw.ordered()[:, 0]
+    assert (timestamps[1:] > timestamps[:-1]).all()
+    result = history.query(0, 3000 * 1000, 60)
+    assert sum(result['count']) == 3000
+
+
+def test_late_snapshot_is_skipped():
+    history = SensorHistory()
+    assert history.append(snapshot(2000))
+    assert not history.append(snapshot(1000))
+    assert not history.append(snapshot(2000))
+    assert len(history) == 1
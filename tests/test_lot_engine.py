@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from lot_engine import LotSimulationEngine, parse_lot_ids
+
+
+def test_parse_lot_ids():
+    assert parse_lot_ids('3') == ['lot_1', 'lot_2', 'lot_3']
+    assert parse_lot_ids(' lot_a, lot_b ,,') == ['lot_a', 'lot_b']
+    assert parse_lot_ids(None) == ['lot_1']
+
+
+def test_duplicate_lot_ids_are_rejected():
+    with pytest.raises(ValueError):
+        LotSimulationEngine(['lot_1', 'lot_1'])
+
+
+@pytest.mark.parametrize('lots, spots', [(1, 100), (7, 33), (250, 100)])
+def test_shapes_and_bounds_after_step(lots, spots):
+    engine = LotSimulationEngine(parse_lot_ids(str(lots)), spots_per_lot=spots, seed=lots)
+    for _ in range(100):
+        engine.step()
+        assert engine.free_spots.shape == engine.co_level.shape == (lots,)
+        assert engine.nox_level.shape == engine.temperature.shape == (lots,)
+        assert engine.parking_sensors.shape == (lots, spots)
+        assert engine.parking_sensors.dtype == np.uint8
+        assert ((engine.free_spots >= 0) & (engine.free_spots <= spots)).all()
+        assert ((engine.co_level >= 0) & (engine.co_level <= 500)).all()
+        assert ((engine.nox_level >= 0) & (engine.nox_level <= 500)).all()
+        assert ((engine.temperature >= 5.0) & (engine.temperature <= 10.0)).all()
+        assert np.isin(engine.parking_sensors, (0, 1)).all()
+    assert engine.time_counter == 100
+
+
+def test_sensor_array_follows_free_spots():
+    engine = LotSimulationEngine(parse_lot_ids('50'), spots_per_lot=200, seed=3)
+    for _ in range(20):
+        engine.step()
+    occupied = engine.parking_sensors.sum(axis=1)
+    expected = 200 - engine.free_spots
+    # Зайняті місця + 5% шуму датчиків
+    assert np.abs(occupied - expected).max() <= 40
+    assert abs(float(np.mean(occupied - expected))) < 5
+
+
+def test_same_seed_gives_same_lots():
+    first = LotSimulationEngine(parse_lot_ids('10'), seed=42)
+    second = LotSimulationEngine(parse_lot_ids('10'), seed=42)
+    for _ in range(5):
+        first.step()
+        second.step()
+    for name in ('free_spots', 'co_level', 'nox_level', 'temperature', 'parking_sensors'):
+        assert np.array_equal(getattr(first, name), getattr(second, name))
+
+
+def test_snapshots_have_sensor_data_format():
+    engine = LotSimulationEngine(['lot_a', 'lot_b', 'lot_c'], spots_per_lot=10, seed=1)
+    engine.step()
+    snapshots = engine.snapshots(['lot_c', 'lot_a'])
+    assert [snapshot['lot_id'] for snapshot in snapshots] == ['lot_c', 'lot_a']
+    index = engine.lot_index('lot_c')
+    snapshot = snapshots[0]
+    assert snapshot['free_spots'] == int(engine.free_spots[index])
+    assert snapshot['parking_occupied'] == (10 - snapshot['free_spots']) / 10
+    assert snapshot['parking_sensors'] == engine.parking_sensors[index].tolist()
+    assert snapshot['co_level'] == round(float(engine.co_level[index]), 2)
+    assert snapshot['timestamp'] == engine.timestamp
+    assert 'lot_b' in engine and 'lot_d' not in engine and len(engine) == 3
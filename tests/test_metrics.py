@@ -0,0 +1,48 @@
+import os
+import threading
+
+from metrics import SHARDS, MetricsRegistry
+
+
+def test_short_lived_threads_sum_correctly():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests', ('route',))
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    start = threading.Barrier(50)
+
+    def handle_requests():
+        start.wait()
+        for _ in range(200):
+            requests.inc(('/api/devices',))
+            latency.observe(0.05)
+
+    # Як werkzeug threaded: новий потік на кожну хвилю запитів
+    for _ in range(4):
+        threads = [threading.Thread(target=handle_requests) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        start.reset()
+
+    assert requests.values() == {('/api/devices',): 4 * 50 * 200}
+    row = latency.values()[()]
+    assert row[:3] == [4 * 50 * 200, 0, 0]
+    assert abs(row[-1] - 4 * 50 * 200 * 0.05) < 1e-6
+    # Кількість шардів не залежить від кількості потоків
+    assert len(requests._shards) == SHARDS
+
+
+def test_render_labels_every_sample_with_worker():
+    registry = MetricsRegistry()
+    registry.gauge('in_flight', 'In flight').inc()
+    registry.histogram('latency_seconds', 'Latency', buckets=(1.0,)).observe(0.5)
+    worker = f'worker="{os.getpid()}"'
+    samples = [line for line in registry.render().splitlines() if not line.startswith('#')]
+    assert samples == [
+        f'in_flight{{{worker}}} 1',
+        f'latency_seconds_bucket{{{worker},le="1.0"}} 1',
+        f'latency_seconds_bucket{{{worker},le="+Inf"}} 1',
+        f'latency_seconds_sum{{{worker}}} 0.5',
+        f'latency_seconds_count{{{worker}}} 1',
+    ]
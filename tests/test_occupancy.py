@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from occupancy import OccupancyModel
+from sensor_simulator import SensorSimulator, new_state
+
+
+def model(spots, levels=1, zones_per_level=1, occupied=()):
+    occupancy = OccupancyModel(spots, levels, zones_per_level, rng=np.random.default_rng(7))
+    occupancy.occupy(np.array(sorted(set(occupied)), dtype=np.int64))
+    return occupancy
+
+
+@pytest.mark.parametrize('spots', [100, 130, 20_000])
+def test_free_spots_match_zero_bits_after_step(spots):
+    occupancy = OccupancyModel(spots, levels=2, zones_per_level=3, rng=np.random.default_rng(spots))
+    simulator = SensorSimulator(new_state(spots), occupancy=occupancy)
+    previous = occupancy.bits().copy()
+    for tick in range(50):
+        data = simulator.step(timestamp=tick)
+        sensors = data['parking_sensors']
+        assert len(sensors) == spots
+        assert data['free_spots'] == sensors.count(0) == occupancy.free
+        assert occupancy.counts.tolist() == [
+            int(occupancy.bits(start, end).sum())
+            for start, end in zip(occupancy.starts[:-1].tolist(), occupancy.starts[1:].tolist())
+        ]
+        # Змінюються лише місця приїздів або від'їздів
+        current = np.array(sensors, dtype=np.uint8)
+        changed = int(np.count_nonzero(current != previous))
+        assert changed == abs(int(current.sum()) - int(previous.sum()))
+        previous = current
+
+
+def test_set_occupied_clamps_to_lot_size():
+    occupancy = model(64)
+    occupancy.set_occupied(100)
+    assert occupancy.free == 0 and occupancy.bits().all()
+    occupancy.set_occupied(-5)
+    assert occupancy.occupied == 0 and not occupancy.bits().any()
+
+
+def test_find_free_on_full_and_partially_full_lot():
+    occupancy = model(200, levels=2, zones_per_level=2, occupied=range(200))
+    assert occupancy.find_free() == []
+    assert occupancy.free_count() == 0
+
+    occupancy.release(np.array([0, 199], dtype=np.int64))
+    assert occupancy.find_free() == [0, 199]
+    assert occupancy.find_free(limit=1) == [0]
+    assert occupancy.find_free(level=2) == [199]
+    assert occupancy.find_free(level=2, zone='A') == []
+    assert occupancy.find_free(level=2, zone='B') == [199]
+    assert occupancy.free_count(level=1) == 1
+
+
+def test_find_free_crosses_scan_chunks():
+    occupancy = model(10_000, occupied=range(10_000))
+    occupancy.release(np.array([4095, 4096, 9999], dtype=np.int64))
+    assert occupancy.find_free() == [4095, 4096, 9999]
+
+
+def test_nearest_free_edge_cases():
+    occupancy = model(300, levels=2, occupied=range(300))
+    assert occupancy.nearest_free(0) is None
+    assert occupancy.nearest_free(299) is None
+
+    # Перше і останнє місце парковки
+    occupancy.release(np.array([0, 299], dtype=np.int64))
+    assert occupancy.nearest_free(0) == 0
+    assert occupancy.nearest_free(140) == 0
+    assert occupancy.nearest_free(299) == 299
+    assert occupancy.nearest_free(150) == 299
+
+    # Вільне місце на іншому рівні не пропонується
+    occupancy.occupy(np.array([299], dtype=np.int64))
+    assert occupancy.nearest_free(160) is None
+
+
+def test_nearest_free_prefers_closest_spot():
+    occupancy = model(1000, occupied=range(1000))
+    occupancy.release(np.array([10, 700], dtype=np.int64))
+    assert occupancy.nearest_free(300) == 10
+    assert occupancy.nearest_free(400) == 700
+
+
+def test_summary_counts_levels_and_zones():
+    occupancy = model(10, levels=2, zones_per_level=2, occupied=[0, 1, 5, 9])
+    # Сегменти: [0, 2), [2, 5), [5, 7), [7, 10)
+    assert occupancy.summary() == {
+        'spots': 10,
+        'occupied': 4,
+        'free': 6,
+        'levels': [
+            {'level': 1, 'spots': 5, 'occupied': 2, 'free': 3},
+            {'level': 2, 'spots': 5, 'occupied': 2, 'free': 3},
+        ],
+        'zones': [
+            {'level': 1, 'zone': 'A', 'spots': 2, 'occupied': 2, 'free': 0},
+            {'level': 1, 'zone': 'B', 'spots': 3, 'occupied': 0, 'free': 3},
+            {'level': 2, 'zone': 'A', 'spots': 2, 'occupied': 1, 'free': 1},
+            {'level': 2, 'zone': 'B', 'spots': 3, 'occupied': 1, 'free': 2},
+        ],
+    }
+    assert occupancy.describe(9) == {'spot': 9, 'level': 2, 'zone': 'B'}
+
+
+@pytest.mark.parametrize('spots, levels, zones', [(0, 1, 1), (10, 0, 1), (10, 1, 27), (3, 2, 2)])
+def test_invalid_geometry_is_rejected(spots, levels, zones):
+    with pytest.raises(ValueError):
+        OccupancyModel(spots, levels, zones)
@@ -0,0 +1,91 @@
+import random
+import statistics
+
+import pytest
+
+from sensor_analytics import RollingStats, SensorAnalytics
+
+
+def brute_force(items, now, span_ms):
+    """Підсумок вікна, перерахований з нуля"""
+    window = [value for timestamp, value in items if timestamp > now - span_ms]
+    return {
+        'count': len(window),
+        'mean': statistics.fmean(window),
+        'variance': statistics.variance(window) if len(window) > 1 else 0.0,
+        'min': min(window),
+        'max': max(window),
+    }
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_rolling_stats_match_brute_force_across_expiry(seed):
+    rng = random.Random(seed)
+    stats = RollingStats(span_ms=10_000)
+    items = []
+    timestamp = 0
+    for _ in range(500):
+        # Нерівні кроки: за тік з вікна виходить від нуля до кількох значень
+        timestamp += rng.choice([100, 500, 1000, 3000])
+        value = round(rng.uniform(-50, 50), 2) if rng.random() > 0.2 else rng.choice([0.0, 10.0])
+        stats.add(timestamp, value)
+        items.append((timestamp, value))
+        expected = brute_force(items, timestamp, stats.span_ms)
+        assert stats.count == expected['count']
+        assert stats.mean == pytest.approx(expected['mean'], abs=1e-9)
+        assert stats.variance == pytest.approx(expected['variance'], rel=1e-6, abs=1e-6)
+        summary = stats.summary()
+        assert (summary['min'], summary['max']) == (expected['min'], expected['max'])
+
+
+def test_rolling_stats_expire_empties_window():
+    stats = RollingStats(span_ms=1000)
+    for timestamp, value in [(0, 5.0), (500, 7.0)]:
+        stats.add(timestamp, value)
+    stats.expire(1200)
+    assert stats.summary()['count'] == 1
+    assert stats.summary()['min'] == stats.summary()['max'] == 7.0
+    stats.expire(1500)
+    assert stats.summary() == {'count': 0, 'mean': None, 'std': None, 'variance': None,
+                               'min': None, 'max': None}
+    stats.add(2000, 3.0)
+    assert (stats.count, stats.mean, stats.variance) == (1, 3.0, 0.0)
+
+
+def test_anomaly_fires_only_after_min_samples():
+    analytics = SensorAnalytics(windows=(('1m', 60),), metrics=('co_level',), baseline='1m',
+                                min_samples=5, z_threshold=3.0)
+    # Значення, що відхиляється від вікна, поки зразків менше min_samples - не аномалія
+    for second, value in enumerate([10.0, 11.0, 10.0, 11.0]):
+        assert analytics.update({'timestamp': second * 1000, 'co_level': value}) == []
+    assert analytics.update({'timestamp': 4000, 'co_level': 100.0}) == []
+
+    analytics = SensorAnalytics(windows=(('1m', 60),), metrics=('co_level',), baseline='1m',
+                                min_samples=5, z_threshold=3.0)
+    for second, value in enumerate([10.0, 11.0, 10.0, 11.0, 10.0]):
+        assert analytics.update({'timestamp': second * 1000, 'co_level': value}) == []
+    anomaly, = analytics.update({'timestamp': 5000, 'co_level': 100.0})
+    assert anomaly['metric'] == 'co_level'
+    assert anomaly['value'] == 100.0
+    assert anomaly['mean'] == 10.4
+    assert anomaly['z_score'] >= 3.0
+    assert analytics.stats()['anomalies'] == [anomaly]
+
+
+def test_stats_expire_windows_and_skip_missing_metrics():
+    analytics = SensorAnalytics(windows=(('1m', 60), ('15m', 900)), metrics=('co_level', 'temperature'),
+                                baseline='15m', min_samples=1)
+    analytics.update({'timestamp': 0, 'co_level': 10.0, 'temperature': 20.0})
+    analytics.update({'timestamp': 120_000, 'co_level': 20.0})
+    stats = analytics.stats(anomalies=False)
+    assert 'anomalies' not in stats
+    assert stats['timestamp'] == 120_000
+    assert stats['windows']['1m']['co_level']['count'] == 1
+    assert stats['windows']['1m']['temperature']['count'] == 0
+    assert stats['windows']['15m']['co_level']['mean'] == 15.0
+    assert list(analytics.stats(windows=['1m'])['windows']) == ['1m']
+
+
+def test_unknown_baseline_window_is_rejected():
+    with pytest.raises(ValueError):
+        SensorAnalytics(baseline='5m')
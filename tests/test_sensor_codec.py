@@ -0,0 +1,136 @@
+import json
+import random
+
+import pytest
+
+from sensor_codec import (CodecError, StreamDecoder, decode_bitmap, encode_bitmap, encode_delta,
+                          pack_spots, unpack_spots)
+from sse_hub import SensorBroadcastHub
+
+
+def snapshots(count, spots=100, seed=1):
+    """Знімки, у яких між тіками змінюється кілька місць і скалярні поля"""
+    rng = random.Random(seed)
+    sensors = [rng.randint(0, 1) for _ in range(spots)]
+    result = []
+    for tick in range(count):
+        for index in rng.sample(range(spots), rng.randint(0, 5)):
+            sensors[index] ^= 1
+        result.append({
+            'timestamp': 1000 * (tick + 1),
+            'free_spots': spots - sum(sensors),
+            'co_level': round(rng.uniform(5, 50), 2),
+            'temperature': 20.0 if tick % 3 else 21.5,
+            'parking_sensors': list(sensors),
+        })
+    return result
+
+
+def parse_event(raw):
+    """bytes події SSE → (id, тип, дані)"""
+    fields = {}
+    for line in raw.decode('utf-8').strip().split('\n'):
+        name, _, value = line.partition(': ')
+        fields[name] = value
+    return fields.get('id'), fields.get('event'), json.loads(fields['data'])
+
+
+def make_hub(items, buffer_size=120, keyframe_interval=4):
+    hub = SensorBroadcastHub(lambda: None, interval=0.05, buffer_size=buffer_size,
+                             keyframe_interval=keyframe_interval, epoch='run1')
+    for snapshot in items:
+        hub.publish(snapshot, tick=snapshot['timestamp'] // 1000)
+    return hub
+
+
+def read_events(hub, count, last_event_id=None):
+    stream = hub.subscribe(last_event_id, 'delta')
+    try:
+        return [parse_event(next(stream)) for _ in range(count)]
+    finally:
+        stream.close()
+
+
+@pytest.mark.parametrize('spots', [0, 1, 7, 8, 9, 1000])
+def test_bitmap_round_trip(spots):
+    sensors = [random.Random(spots).randint(0, 1) for _ in range(spots)]
+    snapshot = {'timestamp': 1, 'free_spots': spots - sum(sensors), 'parking_sensors': sensors}
+    encoded = encode_bitmap(snapshot)
+    assert encoded['spots'] == spots
+    assert 'parking_sensors' not in encoded
+    assert unpack_spots(pack_spots(sensors), spots) == sensors
+    assert decode_bitmap(json.loads(json.dumps(encoded))) == snapshot
+
+
+def test_bitmap_is_least_significant_bit_first():
+    assert pack_spots([1, 0, 0, 0, 0, 0, 0, 0, 0, 1]) == 'AQI='
+
+
+def test_delta_falls_back_to_keyframe_when_most_spots_change():
+    previous = {'timestamp': 1, 'parking_sensors': [0] * 16}
+    assert encode_delta(previous, {'timestamp': 2, 'parking_sensors': [1] * 16}) is None
+    assert encode_delta(previous, {'timestamp': 2, 'parking_sensors': [0] * 17}) is None
+
+
+def test_delta_stream_decodes_across_keyframes():
+    items = snapshots(13)
+    hub = make_hub(items)
+    decoder = StreamDecoder()
+    events = read_events(hub, len(items), 'run1-0')
+    kinds = [kind for _, kind, _ in events]
+    assert kinds[0] == 'keyframe'
+    # Періодичні ключові кадри (seq кратний keyframe_interval) посеред дельт
+    assert kinds.count('keyframe') >= 3
+    assert 'delta' in kinds
+    for (event_id, _, data), snapshot in zip(events, items):
+        assert event_id == f"run1-{snapshot['timestamp'] // 1000}"
+        assert decoder.feed(data) == snapshot
+
+
+def test_delta_without_keyframe_is_rejected():
+    items = snapshots(3)
+    delta = encode_delta(items[0], items[1])
+    with pytest.raises(CodecError):
+        StreamDecoder().feed(delta)
+    decoder = StreamDecoder()
+    decoder.feed({'type': 'keyframe', **encode_bitmap(items[0])})
+    with pytest.raises(CodecError):
+        # Пропущено подію: base не збігається з останнім знімком
+        decoder.feed(encode_delta(items[1], items[2]))
+
+
+def test_new_client_mid_stream_starts_with_keyframe():
+    items = snapshots(6)
+    hub = make_hub(items, keyframe_interval=100)
+    (event_id, kind, data), = read_events(hub, 1)
+    assert (event_id, kind) == ('run1-6', 'keyframe')
+    assert StreamDecoder().feed(data) == items[-1]
+
+
+def test_reconnect_mid_stream_resumes_with_deltas():
+    items = snapshots(10)
+    hub = make_hub(items[:5], keyframe_interval=100)
+    decoder = StreamDecoder()
+    for _, _, data in read_events(hub, 5, 'run1-0'):
+        decoder.feed(data)
+    for snapshot in items[5:]:
+        hub.publish(snapshot, tick=snapshot['timestamp'] // 1000)
+
+    # Клієнт має знімок тіку 5: пропущені події приходять дельтами
+    events = read_events(hub, 5, 'run1-5')
+    assert [kind for _, kind, _ in events] == ['delta'] * 5
+    for (_, _, data), snapshot in zip(events, items[5:]):
+        assert decoder.feed(data) == snapshot
+
+
+def test_reconnect_after_buffer_overflow_starts_with_keyframe():
+    items = snapshots(10)
+    hub = make_hub(items, buffer_size=4, keyframe_interval=100)
+    decoder = StreamDecoder()
+    decoder.feed({'type': 'keyframe', **encode_bitmap(items[1])})
+
+    # Події після тіку 2 вже витіснено з буфера: дельта до них неможлива
+    events = read_events(hub, 4, 'run1-2')
+    assert [kind for _, kind, _ in events] == ['keyframe', 'delta', 'delta', 'delta']
+    for (_, _, data), snapshot in zip(events, items[6:]):
+        assert decoder.feed(data) == snapshot
@@ -0,0 +1,65 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from sensor_export import CSV_COLUMNS, NPZ_COLUMNS, csv_chunks, iter_ticks, ndjson_chunks, npz_chunks
+from sensor_simulator import SPOTS
+
+
+def export(chunks):
+    return b''.join(chunks)
+
+
+def parse_ndjson(data):
+    return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+
+def test_same_seed_gives_identical_output():
+    for exporter in (ndjson_chunks, csv_chunks, npz_chunks):
+        first = export(exporter(50, seed=7, start=1000))
+        assert export(exporter(50, seed=7, start=1000)) == first
+        # Розмір частини не впливає на результат
+        assert export(exporter(50, seed=7, start=1000, chunk_size=3)) == first
+        assert export(exporter(50, seed=8, start=1000)) != first
+
+
+def test_ndjson_rows():
+    rows = parse_ndjson(export(ndjson_chunks(20, seed=1, start=1000, interval_ms=5000)))
+    assert [row['timestamp'] for row in rows] == [1000 + 5000 * i for i in range(20)]
+    for row in rows:
+        assert len(row['parking_sensors']) == SPOTS
+        assert row['free_spots'] == row['parking_sensors'].count(0)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_npz_columns_match_ndjson(chunk_size):
+    rows = parse_ndjson(export(ndjson_chunks(30, seed=3, start=1000)))
+    with np.load(io.BytesIO(export(npz_chunks(30, seed=3, start=1000, chunk_size=chunk_size)))) as npz:
+        assert sorted(npz.files) == sorted(name for name, _ in NPZ_COLUMNS)
+        for name, dtype in NPZ_COLUMNS:
+            column = npz[name]
+            assert column.dtype == np.dtype(dtype)
+            assert column.tolist() == [row[name] for row in rows]
+        assert npz['parking_sensors'].shape == (30, SPOTS)
+
+
+def test_csv_matches_ndjson():
+    rows = parse_ndjson(export(ndjson_chunks(10, seed=5)))
+    lines = export(csv_chunks(10, seed=5)).decode('utf-8').splitlines()
+    assert lines[0].split(',') == CSV_COLUMNS
+    for line, row in zip(lines[1:], rows):
+        values = line.split(',')
+        assert int(values[0]) == row['timestamp']
+        assert float(values[3]) == row['co_level']
+        assert [int(bit) for bit in values[-1]] == row['parking_sensors']
+    assert len(lines) == 11
+
+
+def test_scalar_columns_do_not_depend_on_spot_generation():
+    with_spots = list(iter_ticks(10, seed=9))
+    without = list(iter_ticks(10, seed=9, with_spots=False))
+    for full, scalar in zip(with_spots, without):
+        assert 'parking_sensors' not in scalar
+        assert {name: full[name] for name in scalar} == scalar
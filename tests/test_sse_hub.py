@@ -0,0 +1,65 @@
+import pytest
+
+from sse_hub import SensorBroadcastHub
+
+
+def make_hub(ticks):
+    hub = SensorBroadcastHub(lambda: None, interval=0.05, epoch='run1')
+    for tick in ticks:
+        hub.publish({'timestamp': tick, 'parking_sensors': [0, 1]}, tick=tick)
+    return hub
+
+
+def first_event(hub, last_event_id, encoding='json'):
+    stream = hub.subscribe(last_event_id, encoding)
+    try:
+        return next(stream)
+    finally:
+        stream.close()
+
+
+def test_event_id_contains_epoch_and_tick():
+    hub = make_hub([3, 7])
+    assert first_event(hub, None).startswith(b'id: run1-7\n')
+
+
+def test_resume_sends_only_missed_events():
+    hub = make_hub([3, 7, 9])
+    assert first_event(hub, 'run1-3').startswith(b'id: run1-7\n')
+
+
+def test_future_event_id_starts_from_latest_keyframe():
+    hub = make_hub([3, 7])
+    event = first_event(hub, 'run1-100', 'delta')
+    assert event.startswith(b'id: run1-7\nevent: keyframe\n')
+
+
+def test_event_id_from_other_run_is_unknown():
+    hub = make_hub([3, 7])
+    assert first_event(hub, 'run0-3').startswith(b'id: run1-7\n')
+    assert first_event(hub, '3').startswith(b'id: run1-7\n')
+
+
+def test_missing_tick_resumes_with_keyframe():
+    hub = make_hub([3, 7, 9])
+    # tick 5 не потрапив у буфер цього процесу: наступна подія - ключовий кадр
+    event = first_event(hub, 'run1-5', 'delta')
+    assert event.startswith(b'id: run1-7\nevent: keyframe\n')
+    assert first_event(hub, 'run1-7', 'delta').startswith(b'id: run1-9\nevent: delta\n')
+
+
+@pytest.mark.parametrize('keyframe_interval', [0, -1])
+def test_keyframe_interval_must_be_positive(keyframe_interval):
+    with pytest.raises(ValueError):
+        SensorBroadcastHub(lambda: None, keyframe_interval=keyframe_interval)
+
+
+def test_keyframe_interval_one_sends_only_keyframes():
+    hub = SensorBroadcastHub(lambda: None, interval=0.05, keyframe_interval=1, epoch='run1')
+    for tick in [3, 7, 9]:
+        hub.publish({'timestamp': tick, 'parking_sensors': [0, 1]}, tick=tick)
+    stream = hub.subscribe('run1-3', 'delta')
+    try:
+        assert [next(stream).split(b'\n')[1] for _ in range(2)] == [b'event: keyframe'] * 2
+    finally:
+        stream.close()
@@ -0,0 +1,119 @@
+"""Спільний стан воркерів: версії пристроїв, мітка запуску і номери синхронізації"""
+
+import multiprocessing
+import os
+
+import pytest
+
+from device_cache import DeviceStateCache
+from device_registry import build_inventory
+from state_backend import FCNTL_AVAILABLE, SharedStateBackend
+
+pytestmark = pytest.mark.skipif(not FCNTL_AVAILABLE, reason="спільний стан потребує fcntl")
+
+
+def new_state():
+    return {'free_spots': 100, 'co_level': 10.0, 'nox_level': 0.1, 'temperature': 20.0, 'time_counter': 0}
+
+
+def attach(path, cache=None):
+    devices = build_inventory()
+    backend = SharedStateBackend(path)
+
+    def changed(device_ids=None, local=True, version=None, device_versions=None):
+        if cache is not None:
+            cache.bump(device_ids, version, device_versions)
+
+    backend.attach(new_state(), devices, on_devices_changed=changed)
+    return backend, devices
+
+
+def worker_update(path, ready, done):
+    backend, devices = attach(path)
+    with backend.update_devices(['ventilation_1']):
+        devices['ventilation_1']['fan_speed'] = 3
+    sequence = backend.sync_sequence()
+    # Номер виділено, але ще не записано у Firestore
+    ready.put(sequence.allocate(1))
+    done.get()
+
+
+def test_workers_share_epoch_versions_and_sync_sequence(tmp_path):
+    path = str(tmp_path / 'state')
+    backend, devices = attach(path)
+    cache = DeviceStateCache(devices, lambda payload, media_type: b'')
+    cache.adopt(backend.epoch, backend.device_versions())
+    backend._on_devices_changed = lambda device_ids=None, local=True, version=None, device_versions=None: (
+        cache.bump(device_ids, version, device_versions)
+    )
+    etag = cache.etag()
+
+    context = multiprocessing.get_context('fork')
+    ready, done = context.Queue(), context.Queue()
+    worker = context.Process(target=worker_update, args=(path, ready, done))
+    worker.start()
+    seq = ready.get(timeout=10)
+
+    # Воркер бачить ту саму мітку і версію, що записав інший процес
+    assert backend.refresh_devices() == ['ventilation_1']
+    assert devices['ventilation_1']['fan_speed'] == 3
+    assert cache.version == backend.device_versions()[0] == 1
+    assert cache.etag() != etag
+    assert cache.etag().startswith(f'"{backend.epoch}-')
+    assert cache.changes_since(0) == (1, ['ventilation_1'])
+
+    sequence = backend.sync_sequence()
+    assert sequence.committed(0) == seq - 1
+    # Номери не перетинаються з номерами інших воркерів
+    assert sequence.allocate(1) == seq + 1
+    sequence.report(0)
+    assert sequence.committed(0) == seq - 1
+
+    done.put(None)
+    worker.join()
+    # Слот процесу, що завершився, звільняється
+    assert sequence.committed(0) == seq + 1
+
+
+def test_cache_bump_with_version_gap_keeps_change_log():
+    devices = build_inventory()
+    cache = DeviceStateCache(devices, lambda payload, media_type: b'')
+    cache.adopt('e', (4, dict.fromkeys(devices, 4)))
+    # Зміни кількох версій іншого воркера підтягнуто разом
+    cache.bump(['heating_1', 'ventilation_1'], version=7,
+               device_versions={'heating_1': 6, 'ventilation_1': 7})
+    assert cache.version == 7
+    assert cache.device_version('heating_1') == 6
+    assert cache.etag('ventilation_1') == '"e-d7-ventilation_1"'
+    assert cache.changes_since(4) == (7, ['ventilation_1', 'heating_1'])
+    assert cache.changes_since(5) == (7, ['ventilation_1', 'heating_1'])
+    assert cache.changes_since(3) == (7, None)
+
+
+def test_state_of_previous_run_is_not_reused(tmp_path):
+    path = str(tmp_path / 'state')
+    backend, devices = attach(path)
+    with backend.update_devices(['ventilation_1']):
+        devices['ventilation_1']['fan_speed'] = 3
+    epoch = backend.epoch
+
+    # Перезапуск: файлом більше не користується жоден інший живий процес
+    restarted, devices = attach(path)
+    assert restarted.epoch != epoch
+    assert restarted.device_versions()[0] == 0
+    assert devices['ventilation_1']['fan_speed'] == build_inventory()['ventilation_1']['fan_speed']
+
+
+def test_layout_change_replaces_file_instead_of_resizing(tmp_path):
+    path = str(tmp_path / 'state')
+    backend, _ = attach(path)
+    inode = os.stat(path).st_ino
+
+    other = SharedStateBackend(path, snapshot_capacity=backend.snapshot_capacity * 2)
+    other.attach(new_state(), build_inventory())
+    assert os.stat(path).st_ino != inode
+    assert os.path.getsize(path) > len(backend._mmap)
+    # Процес зі старою розміткою і далі читає свій (підмінений) файл без SIGBUS
+    assert backend._header['magic'] == SharedStateBackend.MAGIC
+    assert backend.refresh_devices() == []
+    assert os.listdir(tmp_path) == ['state']
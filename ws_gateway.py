@@ -0,0 +1,366 @@
+"""
+Мультиплексований WebSocket /api/ws: дані сенсорів, зміни пристроїв і команди
+
+Одне з'єднання замість SSE-потоку і окремого PUT на кожну команду.
+Повідомлення - JSON-об'єкти (id - довільне значення, повертається в ack).
+
+Клієнт → сервер:
+  {"id": 1, "type": "subscribe", "lots": ["main", "lot_2"], "devices": ["VENTILATION", "heating_1"]}
+  {"id": 2, "type": "unsubscribe", "lots": ["lot_2"]}
+  {"id": 3, "type": "command", "device_id": "ventilation_1", "set": {"enabled": true, "fan_speed": 3}}
+  {"id": 4, "type": "ping"}
+
+Сервер → клієнт:
+  {"type": "ack", "id": 3, "ok": true, "result": {...}} або {"type": "ack", "id": 3, "ok": false, "error": "..."}
+  {"type": "sensor", "lot": "main", "data": {...}}
+  {"type": "devices", "version": 42, "full": false, "devices": [...]}
+
+Парковка "main" - основна симуляція (як /api/sensor-data/stream), решта - з
+рушія кількох парковок. Група пристроїв - "*", тип пристрою або його id;
+після підписки приходить повний знімок груп ("full": true).
+
+Зворотний тиск: знімки не буферизуються. Відправник бере стан тоді, коли
+з'єднання готове до запису: для кожної парковки - лише останній знімок
+(пропущені рахуються як dropped), для пристроїв - поточний стан змінених з
+останньої надісланої версії. Відповіді не губляться: поки в черзі
+max_pending_acks відповідей, нові повідомлення клієнта не читаються.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+
+from sensor_codec import dumps as compact_dumps
+
+logger = logging.getLogger(__name__)
+
+MAIN_LOT = 'main'
+MAX_PENDING_ACKS = 32
+
+
+def _names(message, key):
+    """Список рядків з поля повідомлення (відсутнє поле - порожній список)"""
+    value = message.get(key, [])
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise ValueError(f'"{key}" must be a list of strings')
+    return value
+
+
+class WebSocketGateway:
+    """Спільні джерела даних для всіх сесій і кеш серіалізованих знімків"""
+
+    def __init__(self, hub, lot_engine, device_cache, devices, device_types, command,
+                 main_lot=MAIN_LOT, max_pending_acks=MAX_PENDING_ACKS, on_drop=None):
+        self.hub = hub
+        self.lot_engine = lot_engine
+        self.device_cache = device_cache
+        self.devices = devices
+        self.device_types = frozenset(device_types)
+        # command(device_id, data) -> dict; LookupError/ValueError - помилка в ack
+        self.command = command
+        self.main_lot = main_lot
+        self.max_pending_acks = max_pending_acks
+        self._on_drop = on_drop
+        self._lock = threading.Lock()
+        # lot_id -> (крок рушія, текст повідомлення)
+        self._lot_messages = {}
+        self._lot_tick = None
+        self.sessions = 0
+
+    def session(self):
+        return WebSocketSession(self)
+
+    def attach(self, notify):
+        """notify() після кожного тіку і зміни пристроїв"""
+        self.hub.start()
+        self.hub.add_listener(notify)
+        self.device_cache.add_listener(notify)
+        with self._lock:
+            self.sessions += 1
+
+    def detach(self, notify):
+        self.hub.remove_listener(notify)
+        self.device_cache.remove_listener(notify)
+        with self._lock:
+            self.sessions -= 1
+
+    def dropped(self, count):
+        if count > 0 and self._on_drop is not None:
+            self._on_drop(count)
+
+    def is_lot(self, lot_id):
+        return lot_id == self.main_lot or lot_id in self.lot_engine
+
+    def is_device_group(self, group):
+        return group == '*' or group in self.device_types or group in self.devices
+
+    def main_message(self, item):
+        """Повідомлення sensor для тіку хаба (серіалізується один раз для всіх сесій)"""
+        cache = item[3]
+        message = cache.get('ws')
+        if message is None:
+            message = cache['ws'] = compact_dumps({'type': 'sensor', 'lot': self.main_lot, 'data': item[1]})
+        return message
+
+    def step_lots(self):
+        """
+        Крок рушія парковок раз на тік хаба.
+
+        Тік настає трохи раніше, ніж через interval після попереднього кроку,
+        тому maybe_step() з повним інтервалом пропускав би кожен другий тік.
+        """
+        tick = self.hub.last_id
+        with self._lock:
+            due, self._lot_tick = tick != self._lot_tick, tick
+        if due:
+            self.lot_engine.maybe_step(self.lot_engine.interval / 2)
+        return self.lot_engine.time_counter
+
+    def lot_messages(self, lot_ids, step):
+        """Повідомлення sensor для парковок рушія (кожна серіалізується один раз на крок)"""
+        with self._lock:
+            cached = {lot_id: self._lot_messages.get(lot_id) for lot_id in lot_ids}
+        missing = [lot_id for lot_id, entry in cached.items() if entry is None or entry[0] != step]
+        if missing:
+            fresh = {
+                snapshot['lot_id']: (step, compact_dumps({'type': 'sensor', 'lot': snapshot['lot_id'], 'data': snapshot}))
+                for snapshot in self.lot_engine.snapshots(missing)
+            }
+            with self._lock:
+                self._lot_messages.update(fresh)
+            cached.update(fresh)
+        return [cached[lot_id][1] for lot_id in lot_ids]
+
+
+class WebSocketSession:
+    """Одне з'єднання: підписки, черга відповідей і останні надіслані версії"""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.lots = set()
+        self.device_groups = set()
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._acks = deque()
+        # Нові підписки: наступний запис надсилає поточний стан незалежно від версій
+        self._lots_added = False
+        self._devices_added = False
+        # Поля нижче змінює лише відправник
+        self._main_cursor = None
+        self._lot_step = None
+        self._device_version = gateway.device_cache.version
+
+    @property
+    def acks_pending(self):
+        return len(self._acks)
+
+    # ---------- Повідомлення клієнта ----------
+
+    def handle(self, text):
+        """Обробляє повідомлення клієнта і ставить відповідь у чергу"""
+        request_id = None
+        try:
+            message = json.loads(text)
+            if not isinstance(message, dict):
+                raise ValueError('Message must be a JSON object')
+            request_id = message.get('id')
+            handler = self._handlers.get(message.get('type'))
+            if handler is None:
+                raise ValueError(f"Unknown message type: {message.get('type')}")
+            ack = {'type': 'ack', 'id': request_id, 'ok': True, 'result': handler(self, message)}
+        except (LookupError, ValueError) as e:
+            ack = {'type': 'ack', 'id': request_id, 'ok': False, 'error': str(e)}
+        except Exception as e:
+            logger.error(f"❌ Помилка обробки повідомлення WebSocket: {e}")
+            ack = {'type': 'ack', 'id': request_id, 'ok': False, 'error': 'Internal error'}
+        with self._lock:
+            self._acks.append(compact_dumps(ack))
+
+    def _subscriptions(self):
+        return {'lots': sorted(self.lots), 'devices': sorted(self.device_groups)}
+
+    def _subscribe(self, message):
+        lots, groups = _names(message, 'lots'), _names(message, 'devices')
+        unknown = [lot_id for lot_id in lots if not self.gateway.is_lot(lot_id)]
+        if unknown:
+            raise LookupError(f"Unknown lots: {', '.join(unknown)}")
+        unknown = [group for group in groups if not self.gateway.is_device_group(group)]
+        if unknown:
+            raise LookupError(f"Unknown device groups: {', '.join(unknown)}")
+        with self._lock:
+            self._lots_added |= not self.lots.issuperset(lots)
+            self._devices_added |= not self.device_groups.issuperset(groups)
+            self.lots.update(lots)
+            self.device_groups.update(groups)
+            return self._subscriptions()
+
+    def _unsubscribe(self, message):
+        lots, groups = _names(message, 'lots'), _names(message, 'devices')
+        with self._lock:
+            self.lots.difference_update(lots)
+            self.device_groups.difference_update(groups)
+            return self._subscriptions()
+
+    def _command(self, message):
+        device_id = message.get('device_id')
+        if not isinstance(device_id, str):
+            raise ValueError('"device_id" is required')
+        return self.gateway.command(device_id, message.get('set', {}))
+
+    def _ping(self, message):
+        return None
+
+    _handlers = {'subscribe': _subscribe, 'unsubscribe': _unsubscribe, 'command': _command, 'ping': _ping}
+
+    # ---------- Повідомлення сервера ----------
+
+    def pending_messages(self):
+        """Що надіслати зараз: відповіді, зміни пристроїв і останні знімки підписаних парковок"""
+        with self._lock:
+            messages = list(self._acks)
+            self._acks.clear()
+            lots, groups = list(self.lots), set(self.device_groups)
+            lots_added, self._lots_added = self._lots_added, False
+            devices_added, self._devices_added = self._devices_added, False
+        messages.extend(self._device_messages(groups, devices_added))
+        messages.extend(self._sensor_messages(lots, lots_added))
+        return messages
+
+    def _device_messages(self, groups, full):
+        version, changed = self.gateway.device_cache.changes_since(self._device_version)
+        self._device_version = version
+        if not groups or (changed == [] and not full):
+            return []
+        # None - журнал змін уже не містить версії сесії
+        full = full or changed is None
+        devices = self.gateway.devices
+        selected = [
+            devices[device_id] for device_id in (devices if full else changed)
+            if '*' in groups or device_id in groups or devices[device_id]['device_type'] in groups
+        ]
+        if not selected and not full:
+            return []
+        return [compact_dumps({'type': 'devices', 'version': version, 'full': full, 'devices': selected})]
+
+    def _sensor_messages(self, lots, added):
+        gateway = self.gateway
+        messages = []
+        if gateway.main_lot in lots:
+            item = gateway.hub.latest()
+            if item is not None and (added or self._main_cursor is None or item[0] > self._main_cursor):
+                if self._main_cursor is not None and not added:
+                    self._count_dropped(item[0] - self._main_cursor - 1)
+                self._main_cursor = item[0]
+                messages.append(gateway.main_message(item))
+        lot_ids = [lot_id for lot_id in lots if lot_id != gateway.main_lot]
+        if lot_ids:
+            step = gateway.step_lots()
+            if added or step != self._lot_step:
+                if self._lot_step is not None and not added:
+                    self._count_dropped((step - self._lot_step - 1) * len(lot_ids))
+                self._lot_step = step
+                messages.extend(gateway.lot_messages(lot_ids, step))
+        return messages
+
+    def _count_dropped(self, count):
+        if count > 0:
+            self.dropped += count
+            self.gateway.dropped(count)
+
+    # ---------- Обслуговування з'єднання ----------
+
+    async def run_async(self, receive, send):
+        """
+        Обслуговує з'єднання в asyncio (ASGI).
+
+        receive() -> текст/bytes або None (з'єднання закрито); send(текст).
+        Обробка команд (блокування стану, черга Firebase) і збирання повідомлень
+        (крок рушія парковок) виконуються в пулі потоків, не на циклі подій.
+        """
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        drained = asyncio.Event()
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                # Цикл подій уже закрито
+                pass
+
+        async def reader():
+            while True:
+                text = await receive()
+                if text is None:
+                    return
+                await loop.run_in_executor(None, self.handle, text)
+                wake.set()
+                while self.acks_pending >= self.gateway.max_pending_acks:
+                    drained.clear()
+                    await drained.wait()
+
+        async def writer():
+            while True:
+                wake.clear()
+                for message in await loop.run_in_executor(None, self.pending_messages):
+                    await send(message)
+                drained.set()
+                await wake.wait()
+
+        self.gateway.attach(notify)
+        tasks = [asyncio.ensure_future(reader()), asyncio.ensure_future(writer())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    logger.debug("🔌 WebSocket закрито: %s", task.exception())
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.gateway.detach(notify)
+            logger.debug("🔌 WebSocket відключено (пропущено знімків: %d)", self.dropped)
+
+    def run(self, receive, send):
+        """Синхронний варіант run_async() (flask-sock): повідомлення читає окремий потік"""
+        wake = threading.Event()
+        closed = threading.Event()
+        drained = threading.Condition()
+        notify = wake.set
+
+        def reader():
+            try:
+                while not closed.is_set():
+                    text = receive()
+                    if text is None:
+                        break
+                    self.handle(text)
+                    wake.set()
+                    with drained:
+                        while self.acks_pending >= self.gateway.max_pending_acks and not closed.is_set():
+                            drained.wait(timeout=1.0)
+            except Exception as e:
+                logger.debug("🔌 WebSocket закрито: %s", e)
+            finally:
+                closed.set()
+                wake.set()
+
+        self.gateway.attach(notify)
+        threading.Thread(target=reader, name='ws-reader', daemon=True).start()
+        try:
+            while not closed.is_set():
+                wake.clear()
+                for message in self.pending_messages():
+                    send(message)
+                with drained:
+                    drained.notify_all()
+                wake.wait()
+        except Exception as e:
+            logger.debug("🔌 WebSocket закрито: %s", e)
+        finally:
+            closed.set()
+            self.gateway.detach(notify)
+            logger.debug("🔌 WebSocket відключено (пропущено знімків: %d)", self.dropped)